@@ -1,5 +1,25 @@
 __version__ = "0.1.0"
 
-from .cl200a import CL200A
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+if TYPE_CHECKING:
+    from .cl200a import CL200A
 
 __all__ = ["CL200A"]
+
+# public name -> submodule. Submodules are imported on first access (PEP 562),
+# so "import cl200a_controller" does not load pyserial or set anything up.
+_lazy_attributes = {"CL200A": ".cl200a"}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _lazy_attributes:
+        value = getattr(importlib.import_module(_lazy_attributes[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> List[str]:
+    return sorted(list(globals()) + list(_lazy_attributes))
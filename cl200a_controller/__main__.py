@@ -0,0 +1,5 @@
+import sys
+
+from cl200a_controller.cli import main
+
+sys.exit(main())
@@ -0,0 +1,96 @@
+import math
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Deque, List, Optional
+
+
+class AdaptiveTimeout:
+    """
+    Read deadline that follows the observed reply latency of one meter.
+
+    The timeout is the chosen percentile of the recent latencies times a safety factor,
+    clamped to [floor, ceiling]. Until min_observations replies were seen, the initial
+    timeout is used. Every consecutive timeout doubles the deadline (up to the ceiling),
+    so a slower but healthy link is learned again instead of failing forever.
+    """
+
+    def __init__(
+        self,
+        floor: float = 0.02,
+        ceiling: float = 3.0,
+        percentile: float = 0.99,
+        safety_factor: float = 2.0,
+        window: int = 256,
+        min_observations: int = 10,
+        initial: Optional[float] = None,
+    ) -> None:
+        """__init__
+
+        Args:
+            floor (float, optional): minimum timeout in seconds. Defaults to 0.02.
+            ceiling (float, optional): maximum timeout in seconds. Defaults to 3.0.
+            percentile (float, optional): latency percentile, 0 to 1. Defaults to 0.99.
+            safety_factor (float, optional): multiplier of the percentile. Defaults to 2.0.
+            window (int, optional): number of recent latencies kept. Defaults to 256.
+            min_observations (int, optional): latencies needed before adapting.
+            Defaults to 10.
+            initial (Optional[float], optional): timeout before adapting.
+            Defaults to None (the ceiling).
+        """
+        if not 0 < floor <= ceiling:
+            raise ValueError("0 < floor <= ceiling is required")
+        if not 0 < percentile <= 1:
+            raise ValueError("0 < percentile <= 1 is required")
+        self.floor = floor
+        self.ceiling = ceiling
+        self.percentile = percentile
+        self.safety_factor = safety_factor
+        self.min_observations = min_observations
+        self.initial = ceiling if initial is None else initial
+        self.timeouts = 0
+        self._latencies: Deque[float] = deque(maxlen=window)
+        # the same latencies in ascending order, for the percentile
+        self._ordered: List[float] = []
+        self._consecutive_timeouts = 0
+
+    def observe(self, latency: float) -> None:
+        """observe
+        Record the latency of a reply that arrived.
+
+        Args:
+            latency (float): seconds from the request to the complete reply
+        """
+        if len(self._latencies) == self._latencies.maxlen:
+            del self._ordered[bisect_left(self._ordered, self._latencies[0])]
+        self._latencies.append(latency)
+        insort(self._ordered, latency)
+        self._consecutive_timeouts = 0
+
+    def timed_out(self) -> None:
+        """timed_out
+        Record a read that hit the deadline.
+        """
+        self.timeouts += 1
+        self._consecutive_timeouts += 1
+
+    def latency_percentile(self) -> float:
+        """latency_percentile
+        The configured percentile of the recent latencies (nearest rank).
+
+        Returns:
+            float: latency in seconds. nan without observations.
+        """
+        if not self._ordered:
+            return math.nan
+        rank = max(math.ceil(self.percentile * len(self._ordered)) - 1, 0)
+        return self._ordered[rank]
+
+    @property
+    def timeout(self) -> float:
+        """current read deadline in seconds"""
+        if len(self._latencies) < self.min_observations:
+            timeout = self.initial
+        else:
+            timeout = self.latency_percentile() * self.safety_factor
+        timeout *= 2**self._consecutive_timeouts
+        return min(max(timeout, self.floor), self.ceiling)
@@ -0,0 +1,381 @@
+"""
+Time alignment of CL-200A samples with each other and with other instruments.
+
+Every Sample carries the wall-clock time its measurement was triggered (trigger_ns)
+and the time its reply was received (receive_ns). ``LatencyEstimator`` turns these into
+an estimate of the acquisition instant, ``align`` resamples several streams to one
+time grid with vectorized interpolation (requires numpy) and ``FleetSynchronizer``
+triggers several meters at the same instant:
+
+    with FleetSynchronizer({"left": left_meter, "right": right_meter}) as fleet:
+        cycles = [fleet.measure() for _ in range(100)]
+    grid_ns, values = align(
+        {
+            "left": [cycle["left"][0] for cycle in cycles],
+            "right": [cycle["right"][0] for cycle in cycles],
+            "power": (power_times_ns, power_watts),
+        },
+        period=0.5,
+    )
+"""
+
+import threading
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from cl200a_controller.cl200a import CL200A, Sample
+from cl200a_controller.cl200a_utils import (
+    CL200Utils,
+    LowBatteryError,
+    LowLuminanceError,
+    MeasurementValueOverError,
+    ValueOutOfRangeError,
+)
+from cl200a_controller.running_stats import RunningStats
+
+# a stream is a sequence of samples or (times in ns, values) of any other instrument
+Stream = Union[Sequence[Sample], Tuple[Any, Any]]
+
+
+def _numpy() -> Any:
+    try:
+        import numpy  # pylint: disable=import-outside-toplevel
+    except ImportError as exc:
+        raise ImportError("Resampling requires numpy: pip install numpy") from exc
+    return numpy
+
+
+def trigger_transmission_time(baudrate: int = 9600) -> float:
+    """trigger_transmission_time
+    Seconds to transmit the broadcast trigger frame (7E1, 10 bits per character).
+    The meter measures after the complete frame arrived.
+    """
+    frame = CL200Utils.cmd_formatter(CL200Utils.cl200a_cmd_dict["command_40r"])
+    return len(frame) * 10 / baudrate
+
+
+class LatencyEstimator:
+    """
+    Estimates when the light of a sample was actually measured.
+
+    The acquisition instant is the trigger time plus a fixed acquisition offset. Samples
+    without a trigger time are placed at their receive time minus the mean reply latency
+    seen so far, and samples without either keep measured_time. Used as a pipeline
+    stage, it replaces measured_time by the estimated acquisition instant.
+    """
+
+    def __init__(self, acquisition_offset: Optional[float] = None) -> None:
+        """__init__
+
+        Args:
+            acquisition_offset (Optional[float], optional): seconds from writing the trigger
+            to the measurement. Defaults to None (trigger_transmission_time()).
+        """
+        if acquisition_offset is None:
+            acquisition_offset = trigger_transmission_time()
+        self.acquisition_offset_ns = round(acquisition_offset * 1e9)
+        # seconds from the trigger to the reply
+        self.reply_latency = RunningStats()
+
+    def observe(self, sample: Sample) -> None:
+        """observe
+        Learn the reply latency of a sample with trigger and receive time.
+        """
+        if sample.trigger_ns and sample.receive_ns:
+            self.reply_latency.add((sample.receive_ns - sample.trigger_ns) / 1e9)
+
+    def acquisition_ns(self, sample: Sample) -> int:
+        """acquisition_ns
+        Estimated acquisition instant of a sample.
+
+        Args:
+            sample (Sample): sample
+
+        Returns:
+            int: wall-clock time in ns since the epoch
+        """
+        if sample.trigger_ns:
+            return sample.trigger_ns + self.acquisition_offset_ns
+        if sample.receive_ns and self.reply_latency.count:
+            latency_ns = round(self.reply_latency.mean * 1e9)
+            return sample.receive_ns - latency_ns + self.acquisition_offset_ns
+        return round(sample.measured_time.timestamp() * 1e9)
+
+    def __call__(self, samples: Iterable[Sample]) -> Iterator[Sample]:
+        for sample in samples:
+            self.observe(sample)
+            acquired = datetime.fromtimestamp(self.acquisition_ns(sample) / 1e9)
+            yield sample._replace(measured_time=acquired)
+
+
+def to_arrays(
+    samples: Sequence[Sample], estimator: Optional[LatencyEstimator] = None
+) -> Tuple[Any, Any]:
+    """to_arrays
+    Acquisition times and values of samples as numpy arrays.
+
+    Args:
+        samples (Sequence[Sample]): samples of one format and head
+        estimator (Optional[LatencyEstimator], optional): estimator of the acquisition
+        instants. Defaults to None (a new LatencyEstimator).
+
+    Returns:
+        Tuple[Any, Any]: times in ns (int64, shape (n,)) and values (float, shape (n, 3))
+    """
+    numpy = _numpy()
+    estimator = estimator or LatencyEstimator()
+    for sample in samples:
+        estimator.observe(sample)
+    times_ns = numpy.fromiter(
+        (estimator.acquisition_ns(sample) for sample in samples), numpy.int64, len(samples)
+    )
+    values = numpy.array([sample.values for sample in samples], dtype=float).reshape(-1, 3)
+    return times_ns, values
+
+
+def resample(times_ns: Any, values: Any, grid_ns: Any) -> Any:
+    """resample
+    Linear interpolation of a stream onto a time grid. Grid points outside the stream and
+    nan values are nan; nan values are skipped per column.
+
+    Args:
+        times_ns (Any): times in ns, shape (n,)
+        values (Any): values, shape (n,) or (n, k)
+        grid_ns (Any): grid in ns, shape (m,)
+
+    Returns:
+        Any: values on the grid, shape (m,) or (m, k)
+    """
+    numpy = _numpy()
+    times_ns = numpy.asarray(times_ns, dtype=numpy.int64)
+    values = numpy.asarray(values, dtype=float)
+    order = numpy.argsort(times_ns, kind="stable")
+    times_ns, values = times_ns[order], values[order]
+
+    # interpolate relative to the first grid point to keep the precision of float64
+    origin = grid_ns[0] if len(grid_ns) else 0
+    times = (times_ns - origin).astype(float)
+    grid = (numpy.asarray(grid_ns, dtype=numpy.int64) - origin).astype(float)
+
+    columns = values.reshape(len(values), -1)
+    result = numpy.full((len(grid), columns.shape[1]), numpy.nan)
+    for column in range(columns.shape[1]):
+        valid = ~numpy.isnan(columns[:, column])
+        if valid.any():
+            result[:, column] = numpy.interp(
+                grid, times[valid], columns[valid, column], left=numpy.nan, right=numpy.nan
+            )
+    return result.reshape((len(grid),) + values.shape[1:])
+
+
+def common_grid(times: Iterable[Any], period: float) -> Any:
+    """common_grid
+    Grid of period seconds over the time span covered by all streams, aligned to
+    multiples of the period since the epoch.
+
+    Args:
+        times (Iterable[Any]): times in ns of every stream
+        period (float): grid period in seconds
+
+    Returns:
+        Any: grid in ns (int64). Empty when the streams do not overlap.
+    """
+    numpy = _numpy()
+    period_ns = round(period * 1e9)
+    if period_ns <= 0:
+        raise ValueError("period must be positive")
+    spans = [(int(numpy.min(stream)), int(numpy.max(stream))) for stream in times if len(stream)]
+    if not spans:
+        return numpy.empty(0, dtype=numpy.int64)
+    start = max(span[0] for span in spans)
+    end = min(span[1] for span in spans)
+    first = -(-start // period_ns) * period_ns
+    return numpy.arange(first, end + 1, period_ns, dtype=numpy.int64)
+
+
+def align(
+    streams: Dict[str, Stream],
+    period: float,
+    estimator: Optional[LatencyEstimator] = None,
+) -> Tuple[Any, Dict[str, Any]]:
+    """align
+    Resample several streams to one time grid.
+
+    Args:
+        streams (Dict[str, Stream]): streams by name, samples of a CL-200A or
+        (times in ns, values) of any other instrument
+        period (float): grid period in seconds
+        estimator (Optional[LatencyEstimator], optional): estimator of the acquisition
+        instants of samples. Defaults to None (one LatencyEstimator per stream).
+
+    Returns:
+        Tuple[Any, Dict[str, Any]]: grid in ns and the resampled values of every stream
+    """
+    arrays = {}
+    for name, stream in streams.items():
+        if isinstance(stream, tuple) and len(stream) == 2 and not isinstance(stream[0], Sample):
+            arrays[name] = stream
+        else:
+            arrays[name] = to_arrays(stream, estimator)  # type: ignore[arg-type]
+
+    grid_ns = common_grid((times_ns for times_ns, _ in arrays.values()), period)
+    return grid_ns, {
+        name: resample(times_ns, values, grid_ns) for name, (times_ns, values) in arrays.items()
+    }
+
+
+class _Crew:
+    """
+    Worker threads of a FleetSynchronizer, one per meter, with the barriers and the
+    results of the current cycle. A crew whose barriers broke is replaced as a whole, so
+    a worker that is still reading writes into its own crew only.
+    """
+
+    def __init__(self, names: Sequence[str], measure: Callable[[str], List[Sample]]) -> None:
+        self.start = threading.Barrier(len(names) + 1)
+        self.done = threading.Barrier(len(names) + 1)
+        self.results: Dict[str, List[Sample]] = {}
+        self.errors: Dict[str, BaseException] = {}
+        self.stopping = False
+        self.threads = [
+            threading.Thread(
+                target=self._work, args=(name, measure), name=f"fleet-{name}", daemon=True
+            )
+            for name in names
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def _work(self, name: str, measure: Callable[[str], List[Sample]]) -> None:
+        while True:
+            try:
+                self.start.wait()
+            except threading.BrokenBarrierError:
+                return
+            if self.stopping:
+                return
+            try:
+                self.results[name] = measure(name)
+            # pylint: disable=broad-except
+            # the measurement errors are BaseException; any failure is reported by measure
+            # instead of killing the worker and breaking the barriers of the fleet
+            except (
+                Exception,
+                MeasurementValueOverError,
+                LowLuminanceError,
+                LowBatteryError,
+                ValueOutOfRangeError,
+            ) as exc:
+                self.errors[name] = exc
+            finally:
+                try:
+                    self.done.wait()
+                    broken = False
+                except threading.BrokenBarrierError:
+                    broken = True
+            if broken:
+                return
+
+    def stop(self) -> None:
+        """release the workers; they return once their current measurement is done"""
+        self.stopping = True
+        self.start.abort()
+        self.done.abort()
+
+
+class FleetSynchronizer:
+    """
+    Triggers several meters at the same instant.
+
+    Every meter has a worker thread. measure() releases all workers through one
+    threading.Barrier, so the triggers are only apart by the thread wake-up jitter, and
+    waits until every meter was read. When a cycle times out, the workers are replaced,
+    so the next measure starts a fresh cycle.
+    """
+
+    def __init__(
+        self,
+        meters: Dict[str, CL200A],
+        measurement_formats: Sequence[str] = ("ev_x_y",),
+        heads: Sequence[int] = (0,),
+        timeout: Optional[float] = 30.0,
+        raise_errors: bool = True,
+    ) -> None:
+        """__init__
+
+        Args:
+            meters (Dict[str, CL200A]): meters by name
+            measurement_formats (Sequence[str], optional): formats read every cycle.
+            Defaults to ("ev_x_y",).
+            heads (Sequence[int], optional): receptor heads read every cycle.
+            Defaults to (0,).
+            timeout (Optional[float], optional): seconds a cycle may take.
+            Defaults to 30.0.
+            raise_errors (bool, optional): raise the first error of a meter. When False,
+            measure returns the meters that succeeded and the errors are in last_errors.
+            Defaults to True.
+        """
+        self.meters = meters
+        self.measurement_formats = tuple(measurement_formats)
+        self.heads = tuple(heads)
+        self.timeout = timeout
+        self.raise_errors = raise_errors
+        self._crew = _Crew(list(meters), self._measure_meter)
+
+    def _measure_meter(self, name: str) -> List[Sample]:
+        return self.meters[name].measure(self.measurement_formats, self.heads)
+
+    @property
+    def last_errors(self) -> Dict[str, BaseException]:
+        """errors of the meters in the last cycle"""
+        return dict(self._crew.errors)
+
+    @property
+    def last_skew_ns(self) -> int:
+        """spread of the trigger times of the last cycle"""
+        trigger_times = [
+            sample.trigger_ns for samples in self._crew.results.values() for sample in samples
+        ]
+        return max(trigger_times) - min(trigger_times) if trigger_times else 0
+
+    def measure(self) -> Dict[str, List[Sample]]:
+        """measure
+        Trigger all meters at once and read them.
+
+        Raises:
+            Exception: the first error of a meter, with raise_errors.
+            threading.BrokenBarrierError: when the cycle took longer than timeout. The
+            workers are replaced, a meter that is still being read finishes first.
+
+        Returns:
+            Dict[str, List[Sample]]: samples of every meter, see CL200A.measure
+        """
+        crew = self._crew
+        crew.results = {}
+        crew.errors = {}
+        try:
+            crew.start.wait(self.timeout)
+            crew.done.wait(self.timeout)
+        except threading.BrokenBarrierError:
+            crew.stop()
+            self._crew = _Crew(list(self.meters), self._measure_meter)
+            raise
+
+        if self.raise_errors:
+            for exc in crew.errors.values():
+                raise exc
+        return dict(crew.results)
+
+    def close(self) -> None:
+        """close
+        Stop the worker threads. The meters stay open.
+        """
+        self._crew.stop()
+        for thread in self._crew.threads:
+            thread.join()
+
+    def __enter__(self) -> "FleetSynchronizer":
+        return self
+
+    def __exit__(self, *_exc_info: Any) -> None:
+        self.close()
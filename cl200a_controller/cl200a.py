@@ -1,12 +1,63 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
+from functools import partial
 from pathlib import Path
-from typing import Tuple
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
 
 from serial import PARITY_EVEN, SEVENBITS, SerialException
 
-from cl200a_controller.cl200a_utils import CL200Utils
+from cl200a_controller.adaptive_timeout import AdaptiveTimeout
+from cl200a_controller.cl200a_utils import (
+    CL200Utils,
+    LowLuminanceError,
+    MeasurementStatus,
+    RawValue,
+)
+from cl200a_controller.connection_registry import ConnectionRegistry, SharedConnection
 from cl200a_controller.logger import Logger
+from cl200a_controller.running_stats import RunningStats
 from cl200a_controller.serial_utils import SerialUtils
+from cl200a_controller.settle_profile import DEFAULT_SETTLE_TIMES, calibrate_settle_times
+from cl200a_controller.wire_log import WireRecorder
+
+
+class Sample(NamedTuple):
+    """one measurement in one format, with its status flags"""
+
+    measurement_format: str
+    values: Tuple[float, float, float]
+    measured_time: datetime
+    status: MeasurementStatus = MeasurementStatus.OK
+    head: int = 0
+    trigger_ns: int = 0  # time.time_ns() when the measurement was triggered, 0 if unknown
+    receive_ns: int = 0  # time.time_ns() when the reply was received, 0 if unknown
+    # values as sent by the meter, see CL200Utils.extract_raw. None if unknown
+    raw: Optional[Tuple[RawValue, RawValue, RawValue]] = None
+
+
+class AveragedMeasurement(NamedTuple):
+    """result of CL200A.measure_averaged"""
+
+    values: Tuple[float, float, float]
+    variances: Tuple[float, float, float]
+    samples: int  # accepted samples
+    rejected: int
+    measured_time: datetime
+
+
+class _LastMeasurement(threading.local):
+    """
+    trigger time, receive time, reply and status of the last measurement of the current
+    thread
+    """
+
+    trigger_ns = 0
+    receive_ns = 0
+    result = ""
+    status = MeasurementStatus.OK
 
 
 class CL200A:
@@ -22,6 +73,16 @@ class CL200A:
         self,
         log_file_path: Path = Path("./cl200a_controller.log"),
         debug: bool = False,
+        async_logging: bool = False,
+        port: Optional[str] = None,
+        transport: Optional[Any] = None,
+        record_path: Optional[Path] = None,
+        raise_on_error: bool = True,
+        read_timeout: Optional[AdaptiveTimeout] = None,
+        settle_times: Optional[Dict[str, float]] = None,
+        shared: bool = False,
+        log_max_bytes: int = 0,
+        log_backup_count: int = 0,
     ) -> None:
         """__init__
 
@@ -30,6 +91,37 @@ class CL200A:
             skip_check (bool, optional):
             Check whether the response from the CL-200A is correct. Defaults to True.
             debug (bool, optional): _description_. Defaults to False.
+            async_logging (bool, optional): write the log from a background thread
+            (QueueHandler/QueueListener) so measurements never wait on log I/O.
+            Only effective when the logger is created. Defaults to False.
+            port (Optional[str], optional): serial port, e.g. "/dev/ttyUSB0", or a pyserial
+            URL, e.g. "socket://192.168.0.10:4001". The first FTDI port is used when
+            omitted. Defaults to None.
+            transport (Optional[Any], optional): already opened serial-like object,
+            e.g. a VirtualCL200A or a ReplaySerial. Port discovery and connection are
+            skipped. Defaults to None.
+            record_path (Optional[Path], optional): record all serial traffic into
+            this wire log (see wire_log). Defaults to None.
+            raise_on_error (bool, optional): raise MeasurementValueOverError, LowLuminanceError,
+            ValueOutOfRangeError and LowBatteryError. When False the errors are only decoded
+            into status flags (see read_sample and last_status) and the measurement goes on;
+            flagged values that can not be decoded are NaN.
+            Device errors that need a power cycle are always raised. Defaults to True.
+            read_timeout (Optional[AdaptiveTimeout], optional): read measurement replies with
+            read_until and a deadline that adapts to the observed reply latency, so a hung
+            link is detected quickly. The deadline stays set on the port between reads.
+            Defaults to None (the fixed timeout of the port).
+            settle_times (Optional[Dict[str, float]], optional): settle times of this meter
+            keyed by step, e.g. loaded from a SettleProfileStore (see settle_profile).
+            Missing steps use DEFAULT_SETTLE_TIMES. Defaults to None.
+            shared (bool, optional): use the open, initialized connection of the port that
+            other instances of this process share (see connection_registry) and skip the
+            handshake when there is one. Without port, the first shared port is used.
+            Ignored with transport. Defaults to False.
+            log_max_bytes (int, optional): rotate the log file when it reaches this size.
+            0 disables rotation. Only effective when the logger is created. Defaults to 0.
+            log_backup_count (int, optional): number of rotated log files to keep.
+            Defaults to 0.
 
         Raises:
             exc: SerialException when the CL-200A is not found.
@@ -37,28 +129,122 @@ class CL200A:
         """
         self.log_file_path = log_file_path
 
-        self.logger = Logger.logger(show_debug_message=debug, log_file_path=log_file_path)
+        self.logger = Logger.logger(
+            show_debug_message=debug,
+            log_file_path=log_file_path,
+            use_queue=async_logging,
+            max_bytes=log_max_bytes,
+            backup_count=log_backup_count,
+        )
 
         self.cmd_dict = CL200Utils.cl200a_cmd_dict
+        self.raise_on_error = raise_on_error
+        self.read_timeout = read_timeout
+        self.settle_times = {**DEFAULT_SETTLE_TIMES, **(settle_times or {})}
+        # serialises the trigger/read sequences of threads sharing this instance
+        self._lock = threading.RLock()
+        # (format, head) -> (monotonic time, latest sample), see max_age of the getters
+        self._latest: Dict[Tuple[str, int], Tuple[float, Sample]] = {}
+        self._last = _LastMeasurement()
+        self._shared: Optional[SharedConnection] = None
+        initialize = True
+
+        if transport is not None:
+            self.port = getattr(transport, "port", None)
+            self.ser = transport
+        else:
+            try:
+                shared_ports = ConnectionRegistry.ports() if shared else []
+                port = port or (shared_ports or SerialUtils.find_all_luxmeters("FTDI"))[0]
+                self.port = port
+            except SerialException as exc:
+                self.logger.error("Error: Serial port not found")
+                raise exc
 
-        try:
-            self.port = SerialUtils.find_all_luxmeters("FTDI")[0]
-        except SerialException as exc:
-            self.logger.error("Error: Serial port not found")
-            raise exc
+            try:
+                if shared:
+                    self._shared, initialize = ConnectionRegistry.acquire(
+                        port, partial(self._open_port, port)
+                    )
+                    self.ser = self._shared.ser
+                    self._lock = self._shared.lock
+                else:
+                    self.ser = self._open_port(port)
+            except SerialException as exc:
+                self.logger.error("Error: Could not connect to Lux Meter")
+                raise exc
 
-        try:
-            self.ser = CL200Utils.connect_serial_port(
-                self.port, parity=PARITY_EVEN, bytesize=SEVENBITS
-            )
-        except SerialException as exc:
-            self.logger.error("Error: Could not connect to Lux Meter")
-            raise exc
+        if record_path is not None:
+            self.ser = WireRecorder(self.ser, record_path)
+        # read_timeout leaves its deadline on the port; the handshake uses this timeout
+        self._port_timeout = getattr(self.ser, "timeout", None)
 
         self.is_connected: bool = False
-        self._connection()
-        self._hold_mode()
-        self._ext_mode()
+        if not initialize:
+            self.is_connected = True
+            return
+        try:
+            self._connection()
+            self._hold_mode()
+            self._ext_mode()
+        except BaseException:
+            if self._shared is not None:
+                ConnectionRegistry.invalidate(self._shared)
+            raise
+        finally:
+            if self._shared is not None:
+                # acquire returned the new connection locked until it is initialized
+                self._shared.lock.release()
+
+    @staticmethod
+    def _open_port(port: str) -> Any:
+        return CL200Utils.connect_serial_port(port, parity=PARITY_EVEN, bytesize=SEVENBITS)
+
+    def close(self) -> None:
+        """close
+        Close the serial port. A shared connection stays open for other instances.
+        """
+        if self._shared is not None:
+            if isinstance(self.ser, WireRecorder):
+                self.ser.close_log()
+            if self.is_connected:
+                ConnectionRegistry.release(self._shared)
+        else:
+            self.ser.close()
+        self.is_connected = False
+
+    def calibrate_settle_times(self, **kwargs: Any) -> Dict[str, float]:
+        """calibrate_settle_times
+        Find the shortest reliable settle times of this meter and use them from now on.
+        The meter is set to hold and EXT mode again afterwards.
+
+        Args:
+            **kwargs: options of settle_profile.calibrate_settle_times
+
+        Returns:
+            Dict[str, float]: settle times keyed by step, e.g. for SettleProfileStore.save
+        """
+        with self._lock, self._handshake_timeout():
+            settle_times = calibrate_settle_times(self.ser, **kwargs)
+            self.settle_times.update(settle_times)
+            self._hold_mode()
+            self._ext_mode()
+        self.logger.info("Calibrated settle times: %s", settle_times)
+        return settle_times
+
+    @contextmanager
+    def _handshake_timeout(self) -> Iterator[None]:
+        """_handshake_timeout (internal use)
+        Use the timeout of the port instead of the read deadline while the block runs.
+        """
+        deadline = self.ser.timeout
+        if deadline != self._port_timeout:
+            self.ser.timeout = self._port_timeout
+        try:
+            yield
+        finally:
+            if deadline != self._port_timeout:
+                self.ser.timeout = deadline
 
     def _connection(self) -> None:
         """__connection
@@ -72,7 +258,7 @@ class CL200A:
 
         self.logger.info("Setting CL-200A to PC connection mode")
         try:
-            CL200Utils.connect_luxmeter(ser=self.ser)
+            CL200Utils.connect_luxmeter(ser=self.ser, sleep_time=self.settle_times["connect"])
             self.is_connected = True
 
         except SerialException as exc:
@@ -88,7 +274,9 @@ class CL200A:
         self.ser.reset_input_buffer()
         self.ser.reset_output_buffer()
         try:
-            CL200Utils.write_serial_port(ser=self.ser, cmd=cmd, sleep_time=0.5)
+            CL200Utils.write_serial_port(
+                ser=self.ser, cmd=cmd, sleep_time=self.settle_times["hold"]
+            )
         except SerialException as exc:
             raise exc
 
@@ -110,7 +298,9 @@ class CL200A:
         for _ in range(2):
             # set CL-200A to EXT mode
             try:
-                CL200Utils.write_serial_port(ser=self.ser, cmd=cmd, sleep_time=0.125)
+                CL200Utils.write_serial_port(
+                    ser=self.ser, cmd=cmd, sleep_time=self.settle_times["ext"]
+                )
             except SerialException as exc:
                 raise exc
             ext_mode_err = self.ser.readline().decode("ascii")
@@ -144,38 +334,111 @@ class CL200A:
             datetime: time of measurement
         """
 
-        self.ser.reset_input_buffer()
-        self.ser.reset_output_buffer()
+        with self._lock:
+            self.ser.reset_input_buffer()
+            self.ser.reset_output_buffer()
+
+            # Perform measurement
+            self._trigger()
+            # read data
+            return self._read(CL200Utils.cmd_formatter(read_cmd))
 
-        # Perform measurement
+    def _trigger(self) -> None:
+        """_trigger (internal use)
+        Take a measurement on all receptor heads. (command 40, broadcast)
+        """
         cmd_ext = CL200Utils.cmd_formatter(self.cmd_dict["command_40r"])
-        cmd_read = CL200Utils.cmd_formatter(read_cmd)
-        CL200Utils.write_serial_port(ser=self.ser, cmd=cmd_ext, sleep_time=0.5)
-        # read data
+        self._last.trigger_ns = time.time_ns()
+        CL200Utils.write_serial_port(
+            ser=self.ser, cmd=cmd_ext, sleep_time=self.settle_times["trigger"]
+        )
+
+    def _read(self, cmd_read: str) -> Tuple[str, datetime]:
+        """_read (internal use)
+        Read the data of the last measurement with a formatted read command.
+
+        Args:
+            cmd_read (str): formatted read command
+
+        Raises:
+            ConnectionAbortedError: when the connection to Luxmeter was lost.
+
+        Returns:
+            str: result from the CL-200A
+            datetime: time of measurement
+        """
         CL200Utils.write_serial_port(ser=self.ser, cmd=cmd_read, sleep_time=0)
         measured_time = datetime.now()
         try:
-            serial_ret = self.ser.readline()
+            if self.read_timeout is None:
+                serial_ret = self.ser.readline()
+            else:
+                serial_ret = self._read_with_deadline(self.read_timeout)
             if len(serial_ret) == 0:
                 raise SerialException("No data received from CL-200A")
 
+            self._last.receive_ns = time.time_ns()
             result = serial_ret.decode("ascii")
         except SerialException as exc:
+            if self._shared is not None:
+                ConnectionRegistry.invalidate(self._shared)
             raise ConnectionAbortedError("Connection to Luxmeter was lost.") from exc
 
-        CL200Utils.check_measurement(result)
+        self._last.result = result
+        self._last.status = CL200Utils.decode_status(result)
+        if self.raise_on_error or self._last.status & MeasurementStatus.DEVICE_ERROR:
+            CL200Utils.check_measurement(result)
 
-        self.logger.debug(f"Got raw data: {result.rstrip()}")
+        self.logger.debug("Got raw data: %s", result.rstrip())
 
         return result, measured_time
 
+    def _read_with_deadline(self, read_timeout: AdaptiveTimeout) -> bytes:
+        """_read_with_deadline (internal use)
+        Read one reply with read_until and the adaptive deadline, and learn its latency.
+
+        Args:
+            read_timeout (AdaptiveTimeout): deadline of this meter
+
+        Raises:
+            SerialException: when no complete reply arrived before the deadline.
+
+        Returns:
+            bytes: reply
+        """
+        timeout = round(read_timeout.timeout, 3)
+        current = self.ser.timeout
+        # reconfiguring a real port costs a system call, so the deadline stays on the port
+        # between reads and is only shortened when it dropped by more than a quarter
+        if current is None or timeout > current or timeout < 0.75 * current:
+            self.ser.timeout = timeout
+        else:
+            timeout = current
+        started = time.perf_counter()
+        try:
+            serial_ret = self.ser.read_until(b"\r\n")
+        finally:
+            # other users of a shared connection expect the timeout of the port
+            if self._shared is not None:
+                self.ser.timeout = self._port_timeout
+        if not serial_ret.endswith(b"\n"):
+            read_timeout.timed_out()
+            raise SerialException(f"No complete reply from CL-200A within {timeout} s")
+        read_timeout.observe(time.perf_counter() - started)
+        return serial_ret
+
     # pylint: disable=invalid-name
     # the names ev, y, z are used in the documentation
-    def get_ev_x_y(self) -> Tuple[float, float, float, datetime]:
+    def get_ev_x_y(self, max_age: Optional[float] = None) -> Tuple[float, float, float, datetime]:
         """get_ev_x_y
         read the most recent measurement data from the CL-200A to the PC in terms of Ev, x, y
         (command 02)
 
+        Args:
+            max_age (Optional[float], optional): return the latest result of this format
+            if it is at most max_age seconds old instead of measuring again.
+            Defaults to None (always measure).
+
         Raises:
             ValueError: returned value from luxmeter is not valid
 
@@ -183,71 +446,469 @@ class CL200A:
             float: measured value
         """
 
+        cached = self._latest_values("ev_x_y", max_age)
+        if cached is not None:
+            return cached
+
         result, measured_time = self._perform_measurement(self.cmd_dict["command_02"])
         # Convert Measurement
-        ev, x, y = CL200Utils.extract_ev_x_y(result)
+        ev, x, y = self._decode(result, "ev_x_y")
+
+        self.logger.debug("Returning %s luxes, x: %s, y: %s", ev, x, y)
 
-        self.logger.debug(f"Returning {ev} luxes, x: {x}, y: {y}")
+        self._remember(self._new_sample("ev_x_y", (ev, x, y), measured_time))
 
         return ev, x, y, measured_time
 
     # pylint: disable=invalid-name
     # the names x, y, z are used in the documentation
-    def get_x_y_z(self) -> Tuple[float, float, float, datetime]:
+    def get_x_y_z(self, max_age: Optional[float] = None) -> Tuple[float, float, float, datetime]:
         """get_x_y_z
         read the most recent measurement data from the CL-200A to the PC in terms of X, Y, Z.
         (command 01)
 
+        Args:
+            max_age (Optional[float], optional): see get_ev_x_y. Defaults to None.
+
         Raises:
             ValueError: returned value from luxmeter is not valid
 
         Returns:
             float: measured value
         """
+        cached = self._latest_values("x_y_z", max_age)
+        if cached is not None:
+            return cached
+
         result, measured_time = self._perform_measurement(self.cmd_dict["command_01"])
-        x, y, z = CL200Utils.extract_x_y_z(result)
+        x, y, z = self._decode(result, "x_y_z")
+
+        self.logger.debug("X: %s, Y: %s, Z: %s", x, y, z)
 
-        self.logger.debug(f"X: {x}, Y: {y}, Z: {z}")
+        self._remember(self._new_sample("x_y_z", (x, y, z), measured_time))
 
         return x, y, z, measured_time
 
     # pylint: disable=invalid-name
     # the names ev, u, v are used in the documentation
-    def get_ev_u_v(self) -> Tuple[float, float, float, datetime]:
+    def get_ev_u_v(self, max_age: Optional[float] = None) -> Tuple[float, float, float, datetime]:
         """get_ev_tcp_delta_uv
         To read the most recent measurement data from the CL-200A to the PC in terms of Ev, u', v'.
         (command 03)
 
+        Args:
+            max_age (Optional[float], optional): see get_ev_x_y. Defaults to None.
+
         Raises:
             ValueError: returned value from luxmeter is not valid
 
         Returns:
             float: measured value
         """
+        cached = self._latest_values("ev_u_v", max_age)
+        if cached is not None:
+            return cached
+
         result, measured_time = self._perform_measurement(self.cmd_dict["command_03"])
-        ev, u, v = CL200Utils.extract_ev_u_v(result)
+        ev, u, v = self._decode(result, "ev_u_v")
+
+        self.logger.debug("Illuminance: %s lux, u: %s, v: %s", ev, u, v)
 
-        self.logger.debug(f"Illuminance: {ev} lux, u: {u}, v: {v}")
+        self._remember(self._new_sample("ev_u_v", (ev, u, v), measured_time))
 
         return ev, u, v, measured_time
 
     # pylint: disable=invalid-name
     # the names ev, tcp, delta_uv are used in the documentation
-    def get_ev_tcp_delta_uv(self) -> Tuple[float, float, float, datetime]:
+    def get_ev_tcp_delta_uv(
+        self, max_age: Optional[float] = None
+    ) -> Tuple[float, float, float, datetime]:
         """get_ev_tcp_delta_uv
         To read the most recent measurement data
         from the CL-200A to the PC in terms of EV, TCP, Δuv.
         (command 08)
 
+        Args:
+            max_age (Optional[float], optional): see get_ev_x_y. Defaults to None.
+
         Raises:
             ValueError: returned value from luxmeter is not valid
 
         Returns:
             float: measured value
         """
+        cached = self._latest_values("ev_tcp_delta_uv", max_age)
+        if cached is not None:
+            return cached
+
         result, measured_time = self._perform_measurement(self.cmd_dict["command_08"])
-        ev, tcp, delta_uv = CL200Utils.extract_ev_tcp_delta_uv(result)
+        ev, tcp, delta_uv = self._decode(result, "ev_tcp_delta_uv")
 
-        self.logger.debug(f"Illuminance: {ev} lux, TCP: {tcp}, DeltaUV: {delta_uv}")
+        self.logger.debug("Illuminance: %s lux, TCP: %s, DeltaUV: %s", ev, tcp, delta_uv)
+
+        self._remember(self._new_sample("ev_tcp_delta_uv", (ev, tcp, delta_uv), measured_time))
 
         return ev, tcp, delta_uv, measured_time
+
+    def get_measurement(
+        self, measurement_format: str, max_age: Optional[float] = None
+    ) -> Tuple[float, float, float, datetime]:
+        """get_measurement
+        read the most recent measurement data in any format of
+        CL200Utils.measurement_format_dict, e.g. "ev_x_y".
+
+        Args:
+            measurement_format (str): measurement format
+            max_age (Optional[float], optional): see get_ev_x_y. Defaults to None.
+
+        Raises:
+            ValueError: the format is unknown or the returned value is not valid
+
+        Returns:
+            Tuple[float, float, float, datetime]: measured values and time of measurement
+        """
+        if measurement_format not in CL200Utils.measurement_format_dict:
+            raise ValueError(f"Unknown measurement format: {measurement_format}")
+        cached = self._latest_values(measurement_format, max_age)
+        if cached is not None:
+            return cached
+
+        read_cmd = self.cmd_dict[CL200Utils.measurement_format_dict[measurement_format]]
+        result, measured_time = self._perform_measurement(read_cmd)
+        value1, value2, value3 = self._decode(result, measurement_format)
+        self._remember(
+            self._new_sample(measurement_format, (value1, value2, value3), measured_time)
+        )
+
+        self.logger.debug("%s: %s, %s, %s", measurement_format, value1, value2, value3)
+
+        return value1, value2, value3, measured_time
+
+    def read_sample(self, measurement_format: str, max_age: Optional[float] = None) -> Sample:
+        """read_sample
+        read the most recent measurement data in any format as a Sample.
+        With raise_on_error=False, flagged values that can not be decoded are NaN.
+
+        Args:
+            measurement_format (str): measurement format, e.g. "ev_x_y"
+            max_age (Optional[float], optional): see get_ev_x_y. Defaults to None.
+
+        Raises:
+            ValueError: the format is unknown or the returned value is not valid
+
+        Returns:
+            Sample: measured values, time of measurement and status flags
+        """
+        if measurement_format not in CL200Utils.measurement_format_dict:
+            raise ValueError(f"Unknown measurement format: {measurement_format}")
+        cached = self._latest_sample(measurement_format, 0, max_age)
+        if cached is not None:
+            return cached
+
+        read_cmd = self.cmd_dict[CL200Utils.measurement_format_dict[measurement_format]]
+        result, measured_time = self._perform_measurement(read_cmd)
+        return self._remember(self._to_sample(result, measured_time, measurement_format))
+
+    def measure(
+        self,
+        measurement_formats: Sequence[str] = ("ev_x_y",),
+        heads: Sequence[int] = (0,),
+        max_age: Optional[float] = None,
+    ) -> List[Sample]:
+        """measure
+        Take one measurement and read it in several formats from several receptor heads.
+        The measurement is triggered once, so reading n formats costs one settle time
+        instead of n.
+
+        Args:
+            measurement_formats (Sequence[str], optional): measurement formats.
+            Defaults to ("ev_x_y",).
+            heads (Sequence[int], optional): receptor head numbers. Defaults to (0,).
+            max_age (Optional[float], optional): serve the formats and heads whose latest
+            sample is at most max_age seconds old from memory and only measure the missing
+            ones. Defaults to None (always measure).
+
+        Raises:
+            ValueError: a format or head is invalid or a returned value is not valid
+
+        Returns:
+            List[Sample]: one sample per head and format, ordered by head then format
+        """
+        samples: List[Optional[Sample]] = []
+        missing = []
+        for head in heads:
+            for measurement_format in measurement_formats:
+                frame = CL200Utils.read_frame(measurement_format, head)
+                sample = self._latest_sample(measurement_format, head, max_age)
+                if sample is None:
+                    missing.append((len(samples), head, measurement_format, frame))
+                samples.append(sample)
+
+        if missing:
+            with self._lock:
+                self.ser.reset_input_buffer()
+                self.ser.reset_output_buffer()
+                self._trigger()
+
+                for index, head, measurement_format, frame in missing:
+                    result, measured_time = self._read(frame)
+                    samples[index] = self._remember(
+                        self._to_sample(result, measured_time, measurement_format, head)
+                    )
+        return samples  # type: ignore[return-value]
+
+    def _remember(self, sample: Sample) -> Sample:
+        """_remember (internal use)
+        Keep a sample as the latest one of its format and head.
+        """
+        self._latest[(sample.measurement_format, sample.head)] = (time.monotonic(), sample)
+        return sample
+
+    def _latest_sample(
+        self, measurement_format: str, head: int, max_age: Optional[float]
+    ) -> Optional[Sample]:
+        """_latest_sample (internal use)
+        The latest sample of a format and head if it is at most max_age seconds old.
+        """
+        if max_age is None:
+            return None
+        latest = self._latest.get((measurement_format, head))
+        if latest is None or time.monotonic() - latest[0] > max_age:
+            return None
+        return latest[1]
+
+    def _latest_values(
+        self, measurement_format: str, max_age: Optional[float]
+    ) -> Optional[Tuple[float, float, float, datetime]]:
+        sample = self._latest_sample(measurement_format, 0, max_age)
+        if sample is None:
+            return None
+        value1, value2, value3 = sample.values
+        return value1, value2, value3, sample.measured_time
+
+    @property
+    def last_status(self) -> MeasurementStatus:
+        """status flags of the last measurement of the calling thread"""
+        return self._last.status
+
+    def _decode(self, result: str, measurement_format: str) -> Tuple[float, float, float]:
+        """_decode (internal use)
+        Decode the values of a result. With raise_on_error=False, flagged values that
+        can not be decoded are NaN.
+        """
+        try:
+            return CL200Utils.extract_values(result, measurement_format)
+        except ValueError:
+            if self._last.status == MeasurementStatus.OK:
+                raise
+            return (math.nan, math.nan, math.nan)
+
+    def _to_sample(
+        self, result: str, measured_time: datetime, measurement_format: str, head: int = 0
+    ) -> Sample:
+        """_to_sample (internal use)
+        Decode a result into a Sample, see _decode.
+        """
+        values = self._decode(result, measurement_format)
+        return self._new_sample(measurement_format, values, measured_time, head)
+
+    def _new_sample(
+        self,
+        measurement_format: str,
+        values: Tuple[float, float, float],
+        measured_time: datetime,
+        head: int = 0,
+    ) -> Sample:
+        """_new_sample (internal use)
+        Sample with the status, trigger and receive time and raw values of the last
+        measurement.
+        """
+        return Sample(
+            measurement_format,
+            values,
+            measured_time,
+            self._last.status,
+            head,
+            self._last.trigger_ns,
+            self._last.receive_ns,
+            CL200Utils.extract_raw(self._last.result),
+        )
+
+    def stream(
+        self,
+        measurement_format: str = "ev_x_y",
+        period: float = 0.0,
+        count: Optional[int] = None,
+        duration: Optional[float] = None,
+    ) -> Iterator[Sample]:
+        """stream
+        Acquisition loop. Yields samples until count samples were taken or duration elapsed.
+        Stages of cl200a_controller.pipeline can be chained on the returned iterator.
+
+        Args:
+            measurement_format (str, optional): measurement format. Defaults to "ev_x_y".
+            period (float, optional): target period between samples in seconds.
+            0 measures as fast as possible. Defaults to 0.0.
+            count (Optional[int], optional): number of samples. Defaults to None (endless).
+            duration (Optional[float], optional): seconds to run. Defaults to None (endless).
+
+        Yields:
+            Sample: measured samples
+        """
+        started = time.monotonic()
+        next_at = started
+        taken = 0
+        while (count is None or taken < count) and (
+            duration is None or time.monotonic() - started < duration
+        ):
+            yield self.read_sample(measurement_format)
+            taken += 1
+
+            next_at += period
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def stream_interleaved(
+        self,
+        rates: Dict[str, float],
+        heads: Sequence[int] = (0,),
+        count: Optional[int] = None,
+        duration: Optional[float] = None,
+        max_extra_reads: int = 1,
+    ) -> Iterator[Sample]:
+        """stream_interleaved
+        Acquisition loop for formats at different rates on one port. Every cycle triggers
+        one measurement and reads the formats that are due from it (see measure), so a
+        slower format costs one read command in some cycles instead of a loop of its own.
+        The formats with the highest rate are read every cycle. Of the slower formats that
+        are due, only the max_extra_reads most overdue are read, so their reads are spread
+        over the cycles and the fast rate is kept.
+
+        Args:
+            rates (Dict[str, float]): target samples per second by format, e.g.
+            {"ev_x_y": math.inf, "x_y_z": 0.2}. math.inf reads as fast as possible.
+            heads (Sequence[int], optional): receptor head numbers. Defaults to (0,).
+            count (Optional[int], optional): number of cycles. Defaults to None (endless).
+            duration (Optional[float], optional): seconds to run. Defaults to None (endless).
+            max_extra_reads (int, optional): reads of slower formats per cycle.
+            Defaults to 1.
+
+        Raises:
+            ValueError: a format is unknown or a rate is not positive
+
+        Yields:
+            Sample: samples of all formats, in acquisition order
+        """
+        if not rates:
+            raise ValueError("At least one measurement format is required")
+        for measurement_format, rate in rates.items():
+            if measurement_format not in CL200Utils.measurement_format_dict:
+                raise ValueError(f"Unknown measurement format: {measurement_format}")
+            if not rate > 0:
+                raise ValueError(f"Rate of {measurement_format} must be positive")
+
+        fastest = max(rates.values())
+        every_cycle = [fmt for fmt, rate in rates.items() if rate == fastest]
+        # slower format -> (seconds between reads, monotonic time it is due)
+        started = time.monotonic()
+        slower = {fmt: [1 / rate, started] for fmt, rate in rates.items() if rate < fastest}
+        period = 1 / fastest
+
+        next_at = started
+        cycles = 0
+        while (count is None or cycles < count) and (
+            duration is None or time.monotonic() - started < duration
+        ):
+            now = time.monotonic()
+            due = sorted(
+                (fmt for fmt in slower if slower[fmt][1] <= now), key=lambda f: slower[f][1]
+            )
+            extra = due[:max_extra_reads]
+            for measurement_format in extra:
+                interval, due_at = slower[measurement_format]
+                # keep the schedule, but do not catch up on reads missed by far
+                due_at += interval
+                slower[measurement_format][1] = due_at if due_at > now else now + interval
+
+            yield from self.measure(every_cycle + extra, heads)
+            cycles += 1
+
+            next_at += period
+            delay = next_at - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    def measure_averaged(
+        self,
+        measurement_format: str = "ev_x_y",
+        max_samples: int = 32,
+        target_rel_stderr: float = 0.01,
+        min_samples: int = 3,
+        check_values: Sequence[int] = (0, 1, 2),
+    ) -> AveragedMeasurement:
+        """measure_averaged
+        Average repeated measurements and stop as soon as the relative standard error
+        of every checked value is at most target_rel_stderr.
+        Samples rejected with LowLuminanceError, flagged with any status but LOW_BATTERY
+        (see raise_on_error) or with values that can not be decoded are skipped.
+
+        Args:
+            measurement_format (str, optional): measurement format. Defaults to "ev_x_y".
+            max_samples (int, optional): maximum number of measurements. Defaults to 32.
+            target_rel_stderr (float, optional): stop when stderr / |mean| reaches this.
+            Defaults to 0.01.
+            min_samples (int, optional): minimum number of accepted samples before stopping.
+            Defaults to 3.
+            check_values (Sequence[int], optional): indices of the values the target applies
+            to, e.g. (0,) for Ev only. Defaults to (0, 1, 2).
+
+        Raises:
+            LowLuminanceError: when every sample was rejected.
+
+        Returns:
+            AveragedMeasurement: means, variances, accepted and rejected sample counts,
+            and the time of the last measurement
+        """
+        stats = (RunningStats(), RunningStats(), RunningStats())
+        rejected = 0
+        measured_time = datetime.now()
+        for _ in range(max_samples):
+            try:
+                *values, measured_time = self.get_measurement(measurement_format)
+            except LowLuminanceError:
+                rejected += 1
+                continue
+            # one nan would turn the means into nan for the rest of the run
+            if self.last_status not in (
+                MeasurementStatus.OK,
+                MeasurementStatus.LOW_BATTERY,
+            ) or not all(math.isfinite(value) for value in values):
+                rejected += 1
+                continue
+
+            for stat, value in zip(stats, values):
+                stat.add(value)
+
+            if stats[0].count >= min_samples and all(
+                stats[index].rel_stderr <= target_rel_stderr for index in check_values
+            ):
+                break
+
+        if stats[0].count == 0:
+            raise LowLuminanceError(f"All {rejected} samples were rejected")
+
+        self.logger.debug(
+            "Averaged %d samples (%d rejected): %s",
+            stats[0].count,
+            rejected,
+            [stat.mean for stat in stats],
+        )
+
+        return AveragedMeasurement(
+            values=(stats[0].mean, stats[1].mean, stats[2].mean),
+            variances=(stats[0].variance, stats[1].variance, stats[2].variance),
+            samples=stats[0].count,
+            rejected=rejected,
+            measured_time=measured_time,
+        )
@@ -13,10 +13,16 @@
  Set Hold status                                   55
 """
 
+from enum import IntFlag
 from time import sleep
-from typing import List, Tuple, Union
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Union
 
-from serial import EIGHTBITS, PARITY_NONE, STOPBITS_ONE, Serial, SerialException
+# pyserial is imported by the port helpers that use it, so the parsers load without it
+if TYPE_CHECKING:
+    from serial import Serial, SerialBase
+
+# signed mantissa and exponent of a value as sent by the CL-200A: mantissa * 10**exponent
+RawValue = Tuple[int, int]
 
 
 class MeasurementValueOverError(BaseException):
@@ -35,6 +41,17 @@ class ValueOutOfRangeError(BaseException):
     pass
 
 
+class MeasurementStatus(IntFlag):
+    """status flags decoded from the ERR and battery bytes of a measurement"""
+
+    OK = 0
+    DEVICE_ERROR = 1  # ERR "1", "2", "3": switch the CL-200A off and on again
+    VALUE_OVER = 2  # ERR "5"
+    LOW_LUMINANCE = 4  # ERR "6"
+    OUT_OF_RANGE = 8  # ERR "7": TCP, Δuv out of range
+    LOW_BATTERY = 16  # battery byte "1"
+
+
 class CL200Utils:
     skip_connection_check = False
 
@@ -58,8 +75,17 @@ class CL200Utils:
         "command_55": "99551  0",
     }
 
+    # measurement format -> read command. The format names match the extract_* methods.
+    measurement_format_dict = {
+        "x_y_z": "command_01",
+        "ev_x_y": "command_02",
+        "ev_u_v": "command_03",
+        "ev_tcp_delta_uv": "command_08",
+    }
+    _read_frame_cache: Dict[Tuple[str, int], str] = {}
+
     @classmethod
-    def connect_luxmeter(cls, ser: Serial) -> bool:
+    def connect_luxmeter(cls, ser: "Serial", sleep_time: float = 0.5) -> bool:
         """connect_luxmeter
         Switch the CL-200A to PC connection mode. (Command "54").
         In order to perform communication with a PC,
@@ -67,6 +93,7 @@ class CL200Utils:
 
         Args:
             ser (Serial): serial object
+            sleep_time (float, optional): settle time after the command. Defaults to 0.5.
 
         Raises:
             SerialException: when the CL-200A has an error.
@@ -74,11 +101,13 @@ class CL200Utils:
         Returns:
             bool: True if success, False if fail.
         """
+        from serial import SerialException  # pylint: disable=import-outside-toplevel
+
         cmd_request: str = chr(2) + "00541   " + chr(3) + "13\r\n"
         is_connected: bool = True
 
         for _ in range(2):
-            cls.write_serial_port(ser=ser, cmd=cmd_request, sleep_time=0.5)
+            cls.write_serial_port(ser=ser, cmd=cmd_request, sleep_time=sleep_time)
             try:
                 _ = ser.readline().decode("ascii")
             except SerialException:
@@ -99,25 +128,41 @@ class CL200Utils:
         cls,
         port: str,
         baudrate: int = 9600,
-        parity: str = PARITY_NONE,
-        stopbits: float = STOPBITS_ONE,
-        bytesize: int = EIGHTBITS,
+        parity: str = "N",
+        stopbits: float = 1,
+        bytesize: int = 8,
         timeout: float = 3,
-    ) -> Serial:
+    ) -> "SerialBase":
         """connect_serial_port
-        Perform serial connection
+        Perform serial connection.
+        A port containing "://" is opened with serial.serial_for_url, e.g.
+        "socket://192.168.0.10:4001" for a terminal server or "loop://".
 
         Args:
-            port (str): containing the COM port.
+            port (str): containing the COM port or a pyserial URL.
             baudrate (int, optional): Baudrate. Defaults to 9600.
-            parity (str, optional): Parity bit. Defaults to PARITY_NONE.
-            stopbits (float, optional): Stop Bit. Defaults to STOPBITS_ONE.
-            bytesize (int, optional): Byte size. Defaults to EIGHTBITS.
+            parity (str, optional): Parity bit. Defaults to "N" (serial.PARITY_NONE).
+            stopbits (float, optional): Stop Bit. Defaults to 1 (serial.STOPBITS_ONE).
+            bytesize (int, optional): Byte size. Defaults to 8 (serial.EIGHTBITS).
             timeout (float, optional): Timeout to perform the connection.. Defaults to 3.
 
         Returns:
-            Serial: connected serial port
+            SerialBase: connected serial port
         """
+        # pylint: disable=import-outside-toplevel
+        from serial import Serial, serial_for_url
+
+        if "://" in port:
+            # URL handlers are opened once; reopening would reconnect e.g. a TCP socket
+            return serial_for_url(
+                port,
+                baudrate=baudrate,
+                parity=parity,
+                stopbits=stopbits,
+                bytesize=bytesize,
+                timeout=timeout,
+            )
+
         ser = Serial(
             port=port,
             baudrate=baudrate,
@@ -151,7 +196,35 @@ class CL200Utils:
         return stx + cmd + etx + bcc + delimiter
 
     @classmethod
-    def write_serial_port(cls, ser: Serial, cmd: str, sleep_time: float) -> None:
+    def read_frame(cls, measurement_format: str, head: int = 0) -> str:
+        """read_frame
+        Formatted read command of a measurement format for one receptor head.
+        Frames are computed once and cached.
+
+        Args:
+            measurement_format (str): one of measurement_format_dict, e.g. "ev_x_y"
+            head (int, optional): receptor head number, 0 to 29. Defaults to 0.
+
+        Raises:
+            ValueError: raise if the format or the head is invalid.
+
+        Returns:
+            str: formatted command
+        """
+        key = (measurement_format, head)
+        frame = cls._read_frame_cache.get(key)
+        if frame is None:
+            if measurement_format not in cls.measurement_format_dict:
+                raise ValueError(f"Unknown measurement format: {measurement_format}")
+            if not 0 <= head <= 29:
+                raise ValueError(f"Invalid receptor head: {head}")
+            cmd = cls.cl200a_cmd_dict[cls.measurement_format_dict[measurement_format]]
+            frame = cls.cmd_formatter(f"{head:02d}{cmd[2:]}")
+            cls._read_frame_cache[key] = frame
+        return frame
+
+    @classmethod
+    def write_serial_port(cls, ser: "Serial", cmd: str, sleep_time: float) -> None:
         """write_serial_port
         Writes into the serial port.
 
@@ -160,6 +233,8 @@ class CL200Utils:
             cmd (str): String containing the command
             sleep_time (float): sleep time after write command.
         """
+        from serial import SerialException  # pylint: disable=import-outside-toplevel
+
         try:
             ser.write(cmd.encode())
         except SerialException as exc:
@@ -213,6 +288,31 @@ class CL200Utils:
             )
             raise LowBatteryError(err)
 
+    @classmethod
+    def decode_status(cls, result: str) -> MeasurementStatus:
+        """decode_status
+        decode the ERR and battery bytes into status flags instead of raising.
+
+        Args:
+            result (str): returned str data from the Luxmeter
+
+        Returns:
+            MeasurementStatus: status flags. MeasurementStatus.OK when there is no error.
+        """
+        status = MeasurementStatus.OK
+        err = result[6]
+        if err in ("1", "2", "3"):
+            status |= MeasurementStatus.DEVICE_ERROR
+        elif err == "5":
+            status |= MeasurementStatus.VALUE_OVER
+        elif err == "6":
+            status |= MeasurementStatus.LOW_LUMINANCE
+        elif err == "7":
+            status |= MeasurementStatus.OUT_OF_RANGE
+        if result[8] == "1":
+            status |= MeasurementStatus.LOW_BATTERY
+        return status
+
     @classmethod
     def _extract_one_data_from_result(cls, result: str, start_index: int) -> float:
         """extract_one_data_from_result
@@ -235,6 +335,30 @@ class CL200Utils:
         value = round(float(signal * value_num * (10**value_exp)), 3)
         return value
 
+    @classmethod
+    def extract_raw(cls, result: str) -> Optional[Tuple[RawValue, RawValue, RawValue]]:
+        """extract_raw
+        extract the three values as the CL-200A sent them, without rounding.
+
+        Args:
+            result (str): returned str data from the Luxmeter
+
+        Returns:
+            Optional[Tuple[RawValue, RawValue, RawValue]]: (signed mantissa, exponent) of
+            each value, i.e. value = mantissa * 10**exponent.
+            None when a value is not a number, e.g. after an error.
+        """
+        raw = []
+        for start_index in (9, 15, 21):
+            field = result[start_index : start_index + 6]
+            # short mantissas are padded with spaces, e.g. "+   00"
+            digits = field[1:5].lstrip(" ") or "0"
+            if len(field) != 6 or field[0] not in "+-" or not (digits + field[5]).isdigit():
+                return None
+            mantissa = int(digits)
+            raw.append((-mantissa if field[0] == "-" else mantissa, int(field[5]) - 4))
+        return raw[0], raw[1], raw[2]
+
     @classmethod
     def _extract_three_data_from_result(cls, result: str) -> Tuple[float, float, float]:
         """extract_three_data_from_result
@@ -334,6 +458,26 @@ class CL200Utils:
         ev, tcp, delta_uv = cls._extract_three_data_from_result(result)
         return ev, tcp, delta_uv
 
+    @classmethod
+    def extract_values(cls, result: str, measurement_format: str) -> Tuple[float, float, float]:
+        """extract_values
+        extract the three values of any measurement format.
+
+        Args:
+            result (str): returned str data from the Luxmeter
+            measurement_format (str): one of measurement_format_dict, e.g. "ev_x_y"
+
+        Raises:
+            ValueError: raise if the format is unknown
+            or the command is not correct for the extraction sequence.
+
+        Returns:
+            Tuple[float, float, float]: extracted values
+        """
+        if measurement_format not in cls.measurement_format_dict:
+            raise ValueError(f"Unknown measurement format: {measurement_format}")
+        return getattr(cls, f"extract_{measurement_format}")(result)
+
     @classmethod
     def _check_command_num(cls, result: str, command_num: Union[str, List[str]]):
         """_check_command_num
@@ -355,7 +499,7 @@ class CL200Utils:
                 raise ValueError("Invalid command number")
 
     @classmethod
-    def _clean_obj_port(cls, obj_port: Serial) -> None:
+    def _clean_obj_port(cls, obj_port: "Serial") -> None:
         """_clean_obj_port
         Perform object buffer cleaning
 
@@ -0,0 +1,240 @@
+"""
+Command line acquisition.
+
+    cl200a --formats ev_x_y x_y_z --period 1 --duration 60 > readings.jsonl
+    cl200a --port socket://192.168.0.10:4001 --output-format csv | other_tool
+    cl200a --count 100 --output-format parquet --output readings.parquet
+
+Each cycle takes one measurement and reads every format and head from it (see
+CL200A.measure). Measurement errors are written as status flags instead of
+stopping the run; values that can not be decoded are null in JSON lines.
+"""
+
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import IO, Any, Dict, Iterator, List, Optional, Sequence
+
+from serial import SerialException
+
+from cl200a_controller.cl200a import CL200A, Sample
+from cl200a_controller.cl200a_utils import CL200Utils
+from cl200a_controller.serial_utils import SerialUtils
+
+COLUMNS = ("measured_time", "head", "format", "value1", "value2", "value3", "status")
+# rows buffered before the parquet output writes them as one row group
+PARQUET_ROW_GROUP_SIZE = 10000
+
+
+def _row(sample: Sample) -> list:
+    value1, value2, value3 = sample.values
+    return [
+        sample.measured_time.isoformat(),
+        sample.head,
+        sample.measurement_format,
+        value1,
+        value2,
+        value3,
+        int(sample.status),
+    ]
+
+
+class _JsonLinesWriter:
+    def __init__(self, file: IO[str]) -> None:
+        self.file = file
+
+    def write(self, samples: List[Sample]) -> None:
+        for sample in samples:
+            # JSON has no nan: undecodable values are null
+            row = [
+                None if isinstance(value, float) and not math.isfinite(value) else value
+                for value in _row(sample)
+            ]
+            self.file.write(json.dumps(dict(zip(COLUMNS, row)), allow_nan=False) + "\n")
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.flush()
+
+
+class _CsvWriter:
+    def __init__(self, file: IO[str]) -> None:
+        self.file = file
+        self.writer = csv.writer(file)
+        self.writer.writerow(COLUMNS)
+
+    def write(self, samples: List[Sample]) -> None:
+        self.writer.writerows(_row(sample) for sample in samples)
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.flush()
+
+
+class _ParquetWriter:
+    def __init__(self, path: Path) -> None:
+        try:
+            # pylint: disable=import-outside-toplevel
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as exc:
+            raise ImportError("Parquet output requires pyarrow: pip install pyarrow") from exc
+
+        self._pyarrow = pyarrow
+        self.row_group_size = PARQUET_ROW_GROUP_SIZE
+        self.schema = pyarrow.schema(
+            [
+                ("measured_time", pyarrow.string()),
+                ("head", pyarrow.int64()),
+                ("format", pyarrow.string()),
+                ("value1", pyarrow.float64()),
+                ("value2", pyarrow.float64()),
+                ("value3", pyarrow.float64()),
+                ("status", pyarrow.int64()),
+            ]
+        )
+        self._writer = pyarrow.parquet.ParquetWriter(str(path), self.schema)
+        self.columns: Dict[str, list] = {column: [] for column in COLUMNS}
+        self._buffered = 0
+
+    def write(self, samples: List[Sample]) -> None:
+        for sample in samples:
+            for column, value in zip(COLUMNS, _row(sample)):
+                self.columns[column].append(value)
+        self._buffered += len(samples)
+        if self._buffered >= self.row_group_size:
+            self._write_row_group()
+
+    def _write_row_group(self) -> None:
+        self._writer.write_table(self._pyarrow.table(self.columns, schema=self.schema))
+        for values in self.columns.values():
+            values.clear()
+        self._buffered = 0
+
+    def close(self) -> None:
+        if self._buffered:
+            self._write_row_group()
+        self._writer.close()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="cl200a", description="Acquire CL-200A measurements and stream them."
+    )
+    meter = parser.add_mutually_exclusive_group()
+    meter.add_argument("--port", help='serial port or pyserial URL, e.g. "socket://host:4001"')
+    meter.add_argument(
+        "--meter", type=int, default=0, help="index of the meter among the FTDI ports"
+    )
+    parser.add_argument(
+        "--formats",
+        nargs="+",
+        default=["ev_x_y"],
+        choices=sorted(CL200Utils.measurement_format_dict),
+        help="measurement formats. default: ev_x_y",
+    )
+    parser.add_argument("--heads", nargs="+", type=int, default=[0], help="receptor heads")
+    parser.add_argument(
+        "--period", type=float, default=0.0, help="seconds between cycles. 0: fastest"
+    )
+    parser.add_argument("--duration", type=float, help="seconds to run")
+    parser.add_argument("--count", type=int, help="number of cycles")
+    parser.add_argument("--output-format", choices=("jsonl", "csv", "parquet"), default="jsonl")
+    parser.add_argument("--output", type=Path, help="output file. default: stdout")
+    parser.add_argument(
+        "--log-file", type=Path, default=Path("./cl200a_controller.log"), help="log file"
+    )
+    parser.add_argument("--list-ports", action="store_true", help="list serial ports and exit")
+    return parser
+
+
+@contextmanager
+def _open_writer(args: argparse.Namespace) -> Iterator[Any]:
+    """writer of the output format, closed with its output file"""
+    with ExitStack() as stack:
+        if args.output_format == "parquet":
+            writer: Any = _ParquetWriter(args.output)
+        else:
+            file = (
+                sys.stdout
+                if args.output is None
+                else stack.enter_context(open(args.output, "w", encoding="utf-8"))
+            )
+            writer = _JsonLinesWriter(file) if args.output_format == "jsonl" else _CsvWriter(file)
+        try:
+            yield writer
+        finally:
+            writer.close()
+
+
+def _find_port(meter: int) -> str:
+    try:
+        ports = SerialUtils.find_all_luxmeters("FTDI")
+    except SerialException as exc:
+        raise SystemExit(f"No CL-200A found: {exc}") from exc
+    if meter >= len(ports):
+        raise SystemExit(f"No CL-200A with index {meter}: {len(ports)} found")
+    return ports[meter]
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """main
+    Entry point of the cl200a command.
+
+    Args:
+        argv (Optional[Sequence[str]], optional): arguments. Defaults to sys.argv[1:].
+
+    Returns:
+        int: exit status
+    """
+    args = build_parser().parse_args(argv)
+
+    if args.list_ports:
+        for port in SerialUtils.list_ports():
+            print(port["device"], port.get("manufacturer") or "")
+        return 0
+
+    for head in args.heads:
+        if not 0 <= head <= 29:
+            raise SystemExit(f"Invalid receptor head: {head}")
+    if args.output_format == "parquet" and args.output is None:
+        raise SystemExit("--output is required for parquet output")
+
+    port = args.port or _find_port(args.meter)
+    luxmeter = CL200A(log_file_path=args.log_file, port=port, raise_on_error=False)
+
+    started = time.monotonic()
+    next_at = started
+    cycles = 0
+    try:
+        with _open_writer(args) as writer:
+            try:
+                while (args.count is None or cycles < args.count) and (
+                    args.duration is None or time.monotonic() - started < args.duration
+                ):
+                    writer.write(luxmeter.measure(args.formats, args.heads))
+                    cycles += 1
+
+                    next_at += args.period
+                    delay = next_at - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+            except KeyboardInterrupt:
+                pass
+            except BrokenPipeError:
+                # the reading end of the pipe was closed, e.g. by "head".
+                # stdout is pointed at devnull so that the final flush does not fail again.
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    finally:
+        luxmeter.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,260 @@
+"""
+Lossless compact encoding of samples at device precision.
+
+The CL-200A sends every value as sign + 4 digit mantissa + exponent digit. A block keeps
+exactly that (int16 signed mantissa, int8 exponent) together with the format, head and
+status of each sample and its measured time as microsecond deltas, in columns:
+
+    header   magic "CL2C", version, flags, sample count, time of the first sample (us)
+    times    int32 deltas to the previous sample in us (int64 with FLAG_WIDE_DELTAS)
+    formats  uint8 index into FORMATS
+    heads    uint8
+    status   uint8 MeasurementStatus flags
+    mantissa int16, 3 per sample
+    exponent int8, 3 per sample; MISSING_EXPONENT marks a value that is not a number
+
+That is 16 bytes per sample, several times less than CSV or JSON lines. ``decode``
+restores the samples; ``decode_arrays`` decodes a block into numpy arrays at once.
+Trigger and receive times are not stored.
+"""
+
+import math
+import struct
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Any, Dict, List, Sequence, Tuple
+
+from cl200a_controller.cl200a import Sample
+from cl200a_controller.cl200a_utils import CL200Utils, MeasurementStatus, RawValue
+
+MAGIC = b"CL2C"
+VERSION = 1
+FLAG_WIDE_DELTAS = 1
+
+# magic, version, flags, reserved, sample count, time of the first sample in us
+BLOCK_HEADER = struct.Struct("<4sBBHIq")
+BYTES_PER_SAMPLE = 4 + 1 + 1 + 1 + 3 * 2 + 3 * 1
+MISSING_EXPONENT = -128
+
+FORMATS = tuple(CL200Utils.measurement_format_dict)
+_FORMAT_CODES = {measurement_format: code for code, measurement_format in enumerate(FORMATS)}
+_INT32 = (-(2**31), 2**31 - 1)
+
+
+def to_raw(value: float) -> RawValue:
+    """to_raw
+    Representation of a value in the format of the CL-200A. Exact for values decoded from
+    a reply; other values are rounded to 4 significant digits.
+
+    Args:
+        value (float): value
+
+    Returns:
+        RawValue: signed mantissa and exponent. MISSING_EXPONENT for nan.
+    """
+    if math.isnan(value):
+        return 0, MISSING_EXPONENT
+    magnitude = abs(value)
+    for exponent in range(-4, 6):
+        scaled = magnitude * 10 ** (-exponent) if exponent < 0 else magnitude / 10**exponent
+        mantissa = round(scaled)
+        if mantissa <= 9999:
+            return (-mantissa if value < 0 else mantissa), exponent
+    return (-9999 if value < 0 else 9999), 5
+
+
+def from_raw(mantissa: int, exponent: int) -> float:
+    """from_raw
+    Value of a mantissa and exponent, correctly rounded to the nearest float.
+    """
+    if exponent == MISSING_EXPONENT:
+        return math.nan
+    if exponent < 0:
+        return mantissa / 10 ** (-exponent)
+    return float(mantissa * 10**exponent)
+
+
+def to_microseconds(measured_time: datetime) -> int:
+    """microseconds since the epoch"""
+    return round(measured_time.timestamp() * 1e6)
+
+
+def from_microseconds(microseconds: int) -> datetime:
+    """local time of microseconds since the epoch"""
+    seconds, remainder = divmod(microseconds, 10**6)
+    return datetime.fromtimestamp(seconds) + timedelta(microseconds=remainder)
+
+
+def encode(samples: Sequence[Sample]) -> bytes:
+    """encode
+    Encode samples into one block.
+
+    Args:
+        samples (Sequence[Sample]): samples
+
+    Returns:
+        bytes: block
+    """
+    count = len(samples)
+    times = [to_microseconds(sample.measured_time) for sample in samples]
+    first = times[0] if times else 0
+    deltas = [0] + [later - earlier for earlier, later in zip(times, times[1:])]
+    wide = any(not _INT32[0] <= delta <= _INT32[1] for delta in deltas)
+
+    mantissas: List[int] = []
+    exponents: List[int] = []
+    for sample in samples:
+        raw = sample.raw
+        if raw is None:
+            raw = tuple(to_raw(value) for value in sample.values)  # type: ignore[assignment]
+        for mantissa, exponent in raw:  # type: ignore[union-attr]
+            mantissas.append(mantissa)
+            exponents.append(exponent)
+
+    return b"".join(
+        (
+            BLOCK_HEADER.pack(MAGIC, VERSION, FLAG_WIDE_DELTAS if wide else 0, 0, count, first),
+            struct.pack(f"<{count}{'q' if wide else 'i'}", *deltas[:count]),
+            bytes(_FORMAT_CODES[sample.measurement_format] for sample in samples),
+            bytes(sample.head for sample in samples),
+            bytes(int(sample.status) for sample in samples),
+            struct.pack(f"<{3 * count}h", *mantissas),
+            struct.pack(f"<{3 * count}b", *exponents),
+        )
+    )
+
+
+def _layout(data: Any, offset: int = 0) -> Tuple[int, int, bool, Dict[str, int]]:
+    """sample count, first time, wide deltas and the offsets of the columns of a block"""
+    magic, version, flags, _, count, first = BLOCK_HEADER.unpack_from(data, offset)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a compact sample block")
+    wide = bool(flags & FLAG_WIDE_DELTAS)
+    offsets = {"times": offset + BLOCK_HEADER.size}
+    offsets["formats"] = offsets["times"] + count * (8 if wide else 4)
+    offsets["heads"] = offsets["formats"] + count
+    offsets["status"] = offsets["heads"] + count
+    offsets["mantissas"] = offsets["status"] + count
+    offsets["exponents"] = offsets["mantissas"] + 6 * count
+    offsets["end"] = offsets["exponents"] + 3 * count
+    return count, first, wide, offsets
+
+
+def block_size(data: Any, offset: int = 0) -> int:
+    """block_size
+    Size in bytes of the block that starts at offset.
+    """
+    _, _, _, offsets = _layout(data, offset)
+    return offsets["end"] - offset
+
+
+def _raw_values(
+    data: Any, count: int, offsets: Dict[str, int]
+) -> List[Tuple[RawValue, RawValue, RawValue]]:
+    """(mantissa, exponent) of the three values of every sample of a block"""
+    pairs = list(
+        zip(
+            struct.unpack_from(f"<{3 * count}h", data, offsets["mantissas"]),
+            struct.unpack_from(f"<{3 * count}b", data, offsets["exponents"]),
+        )
+    )
+    return [(pairs[index], pairs[index + 1], pairs[index + 2]) for index in range(0, 3 * count, 3)]
+
+
+def decode(data: Any, offset: int = 0) -> List[Sample]:
+    """decode
+    Decode one block into samples, with their raw values.
+
+    Args:
+        data (Any): bytes-like object
+        offset (int, optional): position of the block. Defaults to 0.
+
+    Raises:
+        ValueError: when there is no block at offset.
+
+    Returns:
+        List[Sample]: samples
+    """
+    count, first, wide, offsets = _layout(data, offset)
+    deltas = struct.unpack_from(f"<{count}{'q' if wide else 'i'}", data, offsets["times"])
+    columns = zip(
+        accumulate(deltas),
+        bytes(data[offsets["formats"] : offsets["formats"] + count]),
+        bytes(data[offsets["heads"] : offsets["heads"] + count]),
+        bytes(data[offsets["status"] : offsets["status"] + count]),
+        _raw_values(data, count, offsets),
+    )
+
+    samples = []
+    for elapsed, format_code, head, status, raw in columns:
+        missing = any(exponent == MISSING_EXPONENT for _, exponent in raw)
+        samples.append(
+            Sample(
+                FORMATS[format_code],
+                (from_raw(*raw[0]), from_raw(*raw[1]), from_raw(*raw[2])),
+                from_microseconds(first + elapsed),
+                MeasurementStatus(status),
+                head,
+                raw=None if missing else raw,
+            )
+        )
+    return samples
+
+
+def decode_arrays(data: Any, offset: int = 0) -> Dict[str, Any]:
+    """decode_arrays
+    Decode one block into numpy arrays without a Python loop over the samples.
+    Requires numpy.
+
+    Args:
+        data (Any): bytes-like object
+        offset (int, optional): position of the block. Defaults to 0.
+
+    Raises:
+        ImportError: when numpy is not installed.
+        ValueError: when there is no block at offset.
+
+    Returns:
+        Dict[str, Any]: "time_us" (int64), "format", "head", "status" (uint8),
+        "mantissa" (int16, shape (n, 3)), "exponent" (int8, shape (n, 3)) and
+        "values" (float, shape (n, 3), nan where the meter sent no number)
+    """
+    try:
+        import numpy  # pylint: disable=import-outside-toplevel
+    except ImportError as exc:
+        raise ImportError("Vectorized decoding requires numpy: pip install numpy") from exc
+
+    count, first, wide, offsets = _layout(data, offset)
+    deltas = numpy.frombuffer(
+        data, numpy.dtype("<i8" if wide else "<i4"), count, offsets["times"]
+    ).astype(numpy.int64)
+    times = numpy.cumsum(deltas) + first
+    mantissa = numpy.frombuffer(data, numpy.dtype("<i2"), 3 * count, offsets["mantissas"])
+    exponent = numpy.frombuffer(data, numpy.int8, 3 * count, offsets["exponents"])
+
+    missing = exponent == MISSING_EXPONENT
+    powers = numpy.power(10.0, numpy.abs(numpy.where(missing, 0, exponent)))
+    # dividing by an exact power of ten rounds like from_raw
+    values = numpy.where(exponent < 0, mantissa / powers, mantissa * powers)
+    values[missing] = numpy.nan
+    return {
+        "time_us": times,
+        "format": numpy.frombuffer(data, numpy.uint8, count, offsets["formats"]),
+        "head": numpy.frombuffer(data, numpy.uint8, count, offsets["heads"]),
+        "status": numpy.frombuffer(data, numpy.uint8, count, offsets["status"]),
+        "mantissa": mantissa.reshape(count, 3),
+        "exponent": exponent.reshape(count, 3),
+        "values": values.reshape(count, 3),
+    }
+
+
+def decode_all(data: Any) -> List[Sample]:
+    """decode_all
+    Decode consecutive blocks, e.g. a file written block by block.
+    """
+    samples: List[Sample] = []
+    offset = 0
+    while offset < len(data):
+        samples.extend(decode(data, offset))
+        offset += block_size(data, offset)
+    return samples
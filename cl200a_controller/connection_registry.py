@@ -0,0 +1,225 @@
+"""
+Process-wide registry of open, initialized CL-200A connections.
+
+Opening a meter costs port discovery, opening (and re-opening) the port and the
+connection/hold/EXT handshake, i.e. seconds. With ``CL200A(shared=True)`` all instances
+of a process use one connection per port, so creating another instance is nearly free:
+
+    first = CL200A(port="/dev/ttyUSB0", shared=True)  # opens and initializes the meter
+    second = CL200A(port="/dev/ttyUSB0", shared=True)  # reuses the connection
+    second.close()  # the connection stays open for the next instance
+
+Connections are reference counted and stay open when the last instance closes them,
+until ``ConnectionRegistry.close_all`` (also called at exit). A connection handed out
+again after it was idle for ``health_check_interval`` seconds is probed first; a
+connection that was closed or does not answer is opened and initialized again.
+"""
+
+import atexit
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from serial import SerialException
+
+from cl200a_controller.cl200a_utils import CL200Utils
+
+
+class SharedConnection:
+    """
+    One open serial connection and the lock that serialises its users.
+    """
+
+    def __init__(self, port: str, ser: Any = None) -> None:
+        """__init__
+
+        Args:
+            port (str): port name or URL
+            ser (Any, optional): open serial port. Defaults to None (still being opened).
+        """
+        self.port = port
+        self.ser = ser
+        # set once the port was opened, or failed to open
+        self.opened = threading.Event()
+        if ser is not None:
+            self.opened.set()
+        # shared by all CL200A instances of this connection (see CL200A._lock)
+        self.lock = threading.RLock()
+        self.references = 0
+        self.released_at = time.monotonic()
+
+
+class ConnectionRegistry:
+    """
+    Keeps one SharedConnection per port for the whole process.
+    """
+
+    health_check_interval = 5.0
+    _connections: Dict[str, SharedConnection] = {}
+    _lock = threading.Lock()
+    _atexit_registered = False
+
+    @classmethod
+    def acquire(cls, port: str, open_port: Callable[[], Any]) -> Tuple[SharedConnection, bool]:
+        """acquire
+        Take a reference to the connection of a port, opening it when needed.
+
+        A new connection is returned with its lock held by the calling thread, so other
+        instances wait until the caller initialized the meter and released the lock
+        (or called invalidate when that failed).
+
+        Args:
+            port (str): port name or URL
+            open_port (Callable[[], Any]): opens the port, e.g. with
+            CL200Utils.connect_serial_port
+
+        Raises:
+            SerialException: when the port can not be opened.
+
+        Returns:
+            Tuple[SharedConnection, bool]: connection and whether it was opened now and
+            must be initialized
+        """
+        while True:
+            with cls._lock:
+                connection = cls._connections.get(port)
+                if connection is not None and not getattr(connection.ser, "is_open", True):
+                    cls._close(connection)
+                    connection = None
+
+                if connection is None:
+                    connection = cls._reserve(port)
+                    break
+                opening = not connection.opened.is_set()
+                if not opening:
+                    # the reference keeps the connection registered while it is probed
+                    connection.references += 1
+                    if not cls._needs_probe(connection):
+                        return connection, False
+                    if not connection.lock.acquire(blocking=False):
+                        # in use by a thread that keeps no reference, e.g. a finishing
+                        # measurement
+                        return connection, False
+
+            if opening:
+                # another thread opens the port; take its connection or open it after a failure
+                connection.opened.wait()
+                continue
+            # probed outside the registry lock, so a silent meter only blocks its own port
+            try:
+                healthy = cls._probe(connection.ser)
+            finally:
+                connection.lock.release()
+            if healthy:
+                return connection, False
+            with cls._lock:
+                connection.references -= 1
+                if cls._connections.get(port) is connection:
+                    cls._close(connection)
+
+        # opened outside the registry lock, so a slow port only blocks its own users
+        cls._open(connection, open_port)
+        return connection, True
+
+    @classmethod
+    def _reserve(cls, port: str) -> SharedConnection:
+        """register a connection that is not opened yet, locked by the calling thread"""
+        connection = SharedConnection(port)
+        # pylint: disable=consider-using-with
+        # held until the caller initialized the meter, see acquire
+        connection.lock.acquire()
+        connection.references = 1
+        cls._connections[port] = connection
+        if not cls._atexit_registered:
+            atexit.register(cls.close_all)
+            cls._atexit_registered = True
+        return connection
+
+    @classmethod
+    def _open(cls, connection: SharedConnection, open_port: Callable[[], Any]) -> None:
+        """open the port of a reserved connection; a failed one is unregistered and unlocked"""
+        try:
+            connection.ser = open_port()
+        except BaseException:
+            with cls._lock:
+                if cls._connections.get(connection.port) is connection:
+                    del cls._connections[connection.port]
+            connection.lock.release()
+            raise
+        finally:
+            connection.opened.set()
+
+    @classmethod
+    def release(cls, connection: SharedConnection) -> None:
+        """release
+        Drop a reference. The connection stays open for later instances.
+        """
+        with cls._lock:
+            connection.references = max(connection.references - 1, 0)
+            connection.released_at = time.monotonic()
+
+    @classmethod
+    def invalidate(cls, connection: SharedConnection) -> None:
+        """invalidate
+        Close a connection that failed and remove it, so the next instance opens the
+        port again.
+        """
+        with cls._lock:
+            if cls._connections.get(connection.port) is connection:
+                cls._close(connection)
+
+    @classmethod
+    def close_all(cls) -> None:
+        """close_all
+        Close every connection, including the ones still referenced.
+        """
+        with cls._lock:
+            for connection in list(cls._connections.values()):
+                cls._close(connection)
+
+    @classmethod
+    def ports(cls) -> List[str]:
+        """ports
+        Ports with an open connection, oldest first.
+        """
+        with cls._lock:
+            return list(cls._connections)
+
+    @classmethod
+    def get(cls, port: str) -> Optional[SharedConnection]:
+        """get
+        The open connection of a port, None when there is none.
+        """
+        with cls._lock:
+            return cls._connections.get(port)
+
+    @classmethod
+    def _close(cls, connection: SharedConnection) -> None:
+        del cls._connections[connection.port]
+        if connection.ser is None:
+            # still being opened; the port stays with the thread that opens it
+            return
+        try:
+            connection.ser.close()
+        except SerialException:
+            pass
+
+    @classmethod
+    def _needs_probe(cls, connection: SharedConnection) -> bool:
+        """the connection was idle for a while and nobody else uses it"""
+        return (
+            connection.references == 1
+            and time.monotonic() - connection.released_at >= cls.health_check_interval
+        )
+
+    @classmethod
+    def _probe(cls, ser: Any) -> bool:
+        """read the last measurement without triggering a new one"""
+        frame = CL200Utils.read_frame("ev_x_y").encode("ascii")
+        try:
+            ser.reset_input_buffer()
+            ser.write(frame)
+            reply = ser.readline()
+        except SerialException:
+            return False
+        return reply[1:5] == frame[1:5]
@@ -0,0 +1,323 @@
+"""
+Closed-loop control on CL-200A readings, e.g. servoing a LED driver to a target
+illuminance.
+
+``ControlLoop`` runs the shortest trigger/read sequence the meter allows and calls a
+callback with every new reading:
+
+    def servo(reading):
+        driver.set_level(controller.update(target_lux - reading.value1))
+
+    loop = ControlLoop(luxmeter, servo, budget=0.25, on_overrun=alert)
+    loop.run(duration=60)
+    print(loop.stats.overruns, loop.latency_percentile(0.99))
+
+The frames are encoded once, replies are parsed from the received bytes with lookup
+tables and every cycle fills the same ``ControlReading``, so a cycle does not log, does
+not reset the port buffers and does not raise for a bad reply (it is counted in missed).
+The settle time after the trigger remains: it is the time the meter takes to measure
+(see settle_profile).
+"""
+
+import math
+import time
+from array import array
+from typing import Any, Callable, Optional
+
+from serial import SerialException
+
+from cl200a_controller.cl200a import CL200A
+from cl200a_controller.cl200a_utils import CL200Utils, MeasurementStatus
+
+_TERMINATOR = b"\r\n"
+# measurement trigger of every head, without a reply
+_TRIGGER_FRAME = bytes(
+    CL200Utils.cmd_formatter(CL200Utils.cl200a_cmd_dict["command_40r"]), "ascii"
+)
+_REPLY_LENGTH = 27 + 1 + 2  # STX, header and three values, ETX, BCC
+_NAN = math.nan
+# byte -> digit of a mantissa; the meter pads short mantissas with spaces
+_DIGITS = tuple(
+    code - 48 if 48 <= code <= 57 else (0 if code == 32 else -1) for code in range(256)
+)
+# exponent byte -> 10 ** |exponent|, 0 for a byte that is not a digit. Exponents below 0
+# (bytes below "4") divide, as dividing by an exact power of ten rounds correctly.
+_POWERS = tuple(10.0 ** abs(code - 52) if 48 <= code <= 57 else 0.0 for code in range(256))
+# ERR byte * 2 + low battery -> status
+_STATUS = tuple(
+    CL200Utils.decode_status(f"{' ' * 6}{chr(code >> 1)} {'1' if code & 1 else '0'}")
+    for code in range(512)
+)
+
+
+# pylint: disable=too-many-instance-attributes
+# a record whose fields are filled in place, like Sample
+class ControlReading:
+    """
+    Latest reading of a ControlLoop. The same object is filled in every cycle, so copy
+    the fields that are kept beyond the callback.
+    """
+
+    __slots__ = (
+        "sequence",
+        "value1",
+        "value2",
+        "value3",
+        "status",
+        "trigger_ns",
+        "receive_ns",
+        "reply_latency",
+        "latency",
+    )
+
+    def __init__(self) -> None:
+        self.sequence = 0  # number of the reading
+        self.value1 = 0.0
+        self.value2 = 0.0
+        self.value3 = 0.0
+        self.status = MeasurementStatus.OK
+        self.trigger_ns = 0  # time.time_ns() when the measurement was triggered
+        self.receive_ns = 0  # time.time_ns() when the reply was received
+        self.reply_latency = 0.0  # seconds from the trigger to the reply
+        # seconds from the trigger to the return of the callback; known after the callback
+        self.latency = 0.0
+
+
+class ControlStats:
+    """
+    Latency and budget bookkeeping of a ControlLoop.
+    """
+
+    def __init__(
+        self,
+        budget: float,
+        on_overrun: Optional[Callable[[ControlReading], None]],
+        window: int,
+    ) -> None:
+        self.budget = budget
+        self.on_overrun = on_overrun
+        self.readings = 0
+        self.overruns = 0
+        self.missed = 0  # cycles without a valid reply
+        self.worst_latency = 0.0
+        self._latencies = array("d", bytes(8 * window))
+
+    def record(self, reading: ControlReading, latency: float) -> None:
+        """record
+        Account the end-to-end latency of a reading against the budget.
+
+        Args:
+            reading (ControlReading): reading, its latency is set
+            latency (float): seconds from the trigger to the return of the callback
+        """
+        reading.latency = latency
+        self._latencies[self.readings % len(self._latencies)] = latency
+        self.readings += 1
+        self.worst_latency = max(self.worst_latency, latency)
+        if latency > self.budget:
+            self.overruns += 1
+            if self.on_overrun is not None:
+                self.on_overrun(reading)
+
+    def latency_percentile(self, percentile: float) -> float:
+        """latency_percentile
+        Percentile of the recent end-to-end latencies (nearest rank).
+
+        Args:
+            percentile (float): 0 to 1
+
+        Returns:
+            float: seconds. nan before the first reading.
+        """
+        kept = min(self.readings, len(self._latencies))
+        if kept == 0:
+            return math.nan
+        ordered = sorted(self._latencies[:kept])
+        return ordered[max(math.ceil(percentile * kept) - 1, 0)]
+
+
+class _Exchange:
+    """
+    Read frame of one format and head, and the parser of its replies.
+    """
+
+    def __init__(self, measurement_format: str, head: int, read_timeout: float) -> None:
+        self.read_frame = CL200Utils.read_frame(measurement_format, head).encode("ascii")
+        # head and command number the reply must echo
+        self.header = self.read_frame[1:5]
+        self.read_timeout = read_timeout
+
+    @staticmethod
+    def _value(reply: bytes, offset: int) -> float:
+        """value of the field at offset, nan when it is not a number"""
+        mantissa = 0
+        for position in range(offset + 1, offset + 5):
+            digit = _DIGITS[reply[position]]
+            if digit < 0:
+                return _NAN
+            mantissa = mantissa * 10 + digit
+        exponent = reply[offset + 5]
+        power = _POWERS[exponent]
+        if power == 0.0:
+            return _NAN
+        value = mantissa / power if exponent < 52 else mantissa * power
+        return -value if reply[offset] == 45 else value
+
+    def parse(self, reply: bytes, reading: ControlReading) -> bool:
+        """fill the reading from a reply, False when it is not a valid reply"""
+        if len(reply) < _REPLY_LENGTH:
+            return False
+        header = self.header
+        if (
+            reply[1] != header[0]
+            or reply[2] != header[1]
+            or reply[3] != header[2]
+            or reply[4] != header[3]
+        ):
+            return False
+        value1 = self._value(reply, 9)
+        value2 = self._value(reply, 15)
+        value3 = self._value(reply, 21)
+        # nan is the only value that differs from itself
+        # pylint: disable=comparison-with-itself
+        if value1 != value1 or value2 != value2 or value3 != value3:
+            return False
+        reading.value1 = value1
+        reading.value2 = value2
+        reading.value3 = value3
+        reading.status = _STATUS[(reply[6] << 1) | (reply[8] == 49)]
+        return True
+
+
+class ControlLoop:
+    """
+    Calls a callback with each new reading of one format and head and tracks the
+    latency from the trigger to the return of the callback against a budget
+    (see stats).
+    """
+
+    def __init__(
+        self,
+        luxmeter: CL200A,
+        callback: Callable[[ControlReading], None],
+        measurement_format: str = "ev_x_y",
+        head: int = 0,
+        budget: float = 0.5,
+        on_overrun: Optional[Callable[[ControlReading], None]] = None,
+        period: float = 0.0,
+        read_timeout: Optional[float] = None,
+        window: int = 1024,
+    ) -> None:
+        """__init__
+
+        Args:
+            luxmeter (CL200A): meter. It is used exclusively while the loop runs.
+            callback (Callable[[ControlReading], None]): called with every reading
+            measurement_format (str, optional): measurement format. Defaults to "ev_x_y".
+            head (int, optional): receptor head number. Defaults to 0.
+            budget (float, optional): seconds from the trigger to the return of the
+            callback. Defaults to 0.5.
+            on_overrun (Optional[Callable[[ControlReading], None]], optional): called after
+            a cycle that exceeded the budget. Defaults to None.
+            period (float, optional): target period between triggers in seconds.
+            0 runs as fast as possible. Defaults to 0.0.
+            read_timeout (Optional[float], optional): seconds to wait for a reply.
+            Defaults to None (the budget).
+            window (int, optional): number of recent latencies kept for
+            latency_percentile. Defaults to 1024.
+
+        Raises:
+            ValueError: the format or the head is invalid
+        """
+        self.luxmeter = luxmeter
+        self.callback = callback
+        self.period = period
+        self.reading = ControlReading()
+        self.stats = ControlStats(budget, on_overrun, window)
+        self._exchange = _Exchange(
+            measurement_format, head, budget if read_timeout is None else read_timeout
+        )
+        self._stopping = False
+
+    def _cycle(self, ser: Any, settle_time: float) -> None:
+        """trigger, read and hand one reading to the callback"""
+        reading = self.reading
+        triggered = time.perf_counter_ns()
+        reading.trigger_ns = time.time_ns()
+        ser.write(_TRIGGER_FRAME)
+        if settle_time > 0:
+            time.sleep(settle_time)
+        ser.write(self._exchange.read_frame)
+        reply = ser.read_until(_TERMINATOR)
+        received = time.perf_counter_ns()
+
+        if not self._exchange.parse(reply, reading):
+            self.stats.missed += 1
+            # a late reply must not be taken for the next one
+            ser.reset_input_buffer()
+            return
+        reading.sequence += 1
+        reading.receive_ns = time.time_ns()
+        reading.reply_latency = (received - triggered) / 1e9
+        self.callback(reading)
+        self.stats.record(reading, (time.perf_counter_ns() - triggered) / 1e9)
+
+    def run(self, count: Optional[int] = None, duration: Optional[float] = None) -> int:
+        """run
+        Run the loop in the calling thread until count readings were taken, duration
+        elapsed or stop was called.
+
+        Args:
+            count (Optional[int], optional): number of cycles. Defaults to None (endless).
+            duration (Optional[float], optional): seconds to run. Defaults to None (endless).
+
+        Raises:
+            ConnectionAbortedError: when the connection to Luxmeter was lost.
+
+        Returns:
+            int: number of cycles run
+        """
+        ser = self.luxmeter.ser
+        settle_time = self.luxmeter.settle_times["trigger"]
+        period_ns = int(self.period * 1e9)
+
+        self._stopping = False
+        cycles = 0
+        # pylint: disable=protected-access
+        # the loop bypasses the public getters and must not interleave with other threads
+        with self.luxmeter._lock:
+            previous_timeout = ser.timeout
+            ser.timeout = self._exchange.read_timeout
+            ser.reset_input_buffer()
+            next_at = time.perf_counter_ns()
+            end = None if duration is None else next_at + int(duration * 1e9)
+            try:
+                while not self._stopping and (count is None or cycles < count):
+                    if end is not None and time.perf_counter_ns() >= end:
+                        break
+                    self._cycle(ser, settle_time)
+                    cycles += 1
+
+                    if period_ns:
+                        next_at += period_ns
+                        delay = next_at - time.perf_counter_ns()
+                        if delay > 0:
+                            time.sleep(delay / 1e9)
+            except SerialException as exc:
+                raise ConnectionAbortedError("Connection to Luxmeter was lost.") from exc
+            finally:
+                ser.timeout = previous_timeout
+        return cycles
+
+    def stop(self) -> None:
+        """stop
+        Let run return after the current cycle. Can be called from the callback or from
+        another thread.
+        """
+        self._stopping = True
+
+    def latency_percentile(self, percentile: float) -> float:
+        """latency_percentile
+        Percentile of the recent end-to-end latencies, see ControlStats.
+        """
+        return self.stats.latency_percentile(percentile)
@@ -0,0 +1,310 @@
+"""
+Measurement-sharing daemon.
+
+Only one process can own the serial port of a CL-200A. ``MeasurementServer`` owns
+one or more ``CL200A`` instances and answers requests from many clients over a
+Unix socket or TCP. ``MeasurementClient`` offers the same getter API as ``CL200A``.
+
+Requests and replies are JSON lines:
+
+    -> {"meter": "default", "method": "get_ev_x_y", "timeout": 10}
+    <- {"values": [27.3, 0.455, 0.45], "measured_time": "2022-08-01T12:00:00.000000"}
+    <- {"error": "LowLuminanceError", "message": "..."}
+
+Requests for the same meter and method that arrive within ``window`` seconds of
+each other are answered from a single device read. A request that waits longer than
+its ``timeout`` for its meter is answered with a TimeoutError.
+"""
+
+import json
+import socket
+import socketserver
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple, Union, cast
+
+from cl200a_controller.cl200a import CL200A
+from cl200a_controller.cl200a_utils import (
+    LowBatteryError,
+    LowLuminanceError,
+    MeasurementValueOverError,
+    ValueOutOfRangeError,
+)
+
+Address = Union[str, Path, Tuple[str, int]]
+
+GETTER_NAMES = ("get_ev_x_y", "get_x_y_z", "get_ev_u_v", "get_ev_tcp_delta_uv")
+# seconds a read may take once the meter is free: the trigger settle time and the 3 s
+# timeout of the port, with slack. The client waits this long beyond the request timeout.
+REPLY_MARGIN = 5.0
+
+
+class DaemonError(Exception):
+    """raised on the client side when the daemon reports an error."""
+
+
+class _SharedMeter:
+    """_SharedMeter
+    Serialises access to one ``CL200A`` and coalesces concurrent requests.
+    """
+
+    def __init__(self, luxmeter: CL200A, window: float) -> None:
+        self.luxmeter = luxmeter
+        self.window = window
+        self._lock = threading.Lock()
+        # method name -> (monotonic time the read finished, getter result)
+        self._last_results: Dict[str, Tuple[float, tuple]] = {}
+
+    def call(self, method: str, timeout: Optional[float] = None) -> tuple:
+        """call
+        Run a getter on the meter, or reuse a result that finished within the window.
+
+        Args:
+            method (str): getter name, e.g. "get_ev_x_y"
+            timeout (Optional[float], optional): seconds to wait for the meter.
+            Defaults to None (no limit).
+
+        Raises:
+            TimeoutError: when the meter was busy for longer than timeout.
+
+        Returns:
+            tuple: the getter result
+        """
+        requested_at = time.monotonic()
+        with self._locked(timeout):
+            cached = self._last_results.get(method)
+            if cached is not None and cached[0] >= requested_at - self.window:
+                return cached[1]
+
+            result = getattr(self.luxmeter, method)()
+            self._last_results[method] = (time.monotonic(), result)
+            return result
+
+    @contextmanager
+    def _locked(self, timeout: Optional[float]) -> Iterator[None]:
+        """hold the lock of the meter, waiting at most timeout seconds for it"""
+        if not self._lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise TimeoutError(f"The meter was busy for more than {timeout} s")
+        try:
+            yield
+        finally:
+            self._lock.release()
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        measurement_server = cast(_ThreadingServerMixin, self.server).measurement_server
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            reply = measurement_server.dispatch(line)
+            self.wfile.write(json.dumps(reply).encode() + b"\n")
+            self.wfile.flush()
+
+
+class _ThreadingServerMixin(socketserver.ThreadingMixIn):
+    daemon_threads = True
+    allow_reuse_address = True
+    measurement_server: "MeasurementServer"
+
+
+class _TCPServer(_ThreadingServerMixin, socketserver.TCPServer):
+    pass
+
+
+def _unix_server(path: str) -> socketserver.BaseServer:
+    """server on a Unix socket. The class is only defined where Unix sockets exist."""
+
+    class _UnixServer(_ThreadingServerMixin, socketserver.UnixStreamServer):
+        pass
+
+    return _UnixServer(path, _RequestHandler)
+
+
+class MeasurementServer:
+    """
+    Local daemon that owns CL-200A meters and shares their readings.
+
+    Example:
+        server = MeasurementServer({"default": CL200A()}, address="/tmp/cl200a.sock")
+        server.serve_forever()
+    """
+
+    def __init__(
+        self,
+        meters: Union[CL200A, Dict[str, CL200A]],
+        address: Address = ("127.0.0.1", 50200),
+        window: float = 0.5,
+    ) -> None:
+        """__init__
+
+        Args:
+            meters (Union[CL200A, Dict[str, CL200A]]): meter, or meters keyed by name.
+            A single meter is registered as "default".
+            address (Address, optional): Unix socket path or (host, port).
+            Defaults to ("127.0.0.1", 50200).
+            window (float, optional): requests within this many seconds share one read.
+            Defaults to 0.5.
+        """
+        if isinstance(meters, CL200A):
+            meters = {"default": meters}
+        self.meters = {name: _SharedMeter(meter, window) for name, meter in meters.items()}
+
+        if isinstance(address, (str, Path)):
+            path = Path(address)
+            if path.exists():
+                path.unlink()
+            self._server: socketserver.BaseServer = _unix_server(str(path))
+            self.address: Address = str(path)
+        else:
+            tcp_server = _TCPServer(address, _RequestHandler)
+            # the bound port, when port 0 was requested
+            host, port = tcp_server.server_address[:2]
+            self._server = tcp_server
+            self.address = (str(host), port)
+        self._server.measurement_server = self  # type: ignore[attr-defined]
+        self._thread: Optional[threading.Thread] = None
+
+    def dispatch(self, line: bytes) -> dict:
+        """dispatch
+        Answer one JSON request line.
+
+        Args:
+            line (bytes): request
+
+        Returns:
+            dict: reply
+        """
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise TypeError("A request must be a JSON object")
+            meter_name = request.get("meter", "default")
+            method = request["method"]
+            if method == "list_meters":
+                return {"meters": sorted(self.meters)}
+            if method not in GETTER_NAMES:
+                raise ValueError(f"Unknown method: {method}")
+            meter = self.meters[meter_name]
+            timeout = request.get("timeout")
+            if timeout is not None:
+                timeout = float(timeout)
+        except (ValueError, KeyError, TypeError) as exc:
+            return {"error": type(exc).__name__, "message": str(exc)}
+
+        try:
+            *values, measured_time = meter.call(method, timeout)
+        # pylint: disable=broad-except
+        # any failure of the meter is reported to the client instead of killing the handler
+        except (
+            Exception,
+            MeasurementValueOverError,
+            LowLuminanceError,
+            LowBatteryError,
+            ValueOutOfRangeError,
+        ) as exc:
+            return {"error": type(exc).__name__, "message": str(exc)}
+
+        return {"values": values, "measured_time": measured_time.isoformat()}
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def start(self) -> None:
+        """start
+        Serve in a background thread.
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def shutdown(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if isinstance(self.address, str):
+            Path(self.address).unlink(missing_ok=True)
+
+
+class MeasurementClient:
+    """
+    Client of ``MeasurementServer`` with the getter API of ``CL200A``.
+    """
+
+    def __init__(
+        self,
+        address: Address = ("127.0.0.1", 50200),
+        meter: str = "default",
+        timeout: float = 10,
+    ) -> None:
+        """__init__
+
+        Args:
+            address (Address, optional): Unix socket path or (host, port).
+            Defaults to ("127.0.0.1", 50200).
+            meter (str, optional): name of the meter on the server. Defaults to "default".
+            timeout (float, optional): seconds a request may wait for the meter on the
+            server. The socket waits for the reply REPLY_MARGIN seconds longer, so a slow
+            measurement is answered instead of timing out. Defaults to 10.
+        """
+        self.meter = meter
+        self.timeout = timeout
+        socket_timeout = timeout + REPLY_MARGIN
+        if isinstance(address, (str, Path)):
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.settimeout(socket_timeout)
+            self._sock.connect(str(address))
+        else:
+            self._sock = socket.create_connection(address, timeout=socket_timeout)
+        self._file = self._sock.makefile("rwb")
+        self._lock = threading.Lock()
+
+    def _request(self, method: str) -> dict:
+        request = {"meter": self.meter, "method": method, "timeout": self.timeout}
+        with self._lock:
+            self._file.write(json.dumps(request).encode() + b"\n")
+            self._file.flush()
+            line = self._file.readline()
+        if not line:
+            raise ConnectionAbortedError("Connection to the measurement daemon was lost.")
+
+        reply = json.loads(line)
+        if "error" in reply:
+            raise DaemonError(f"{reply['error']}: {reply['message']}")
+        return reply
+
+    def _get(self, method: str) -> Tuple[float, float, float, datetime]:
+        reply = self._request(method)
+        value1, value2, value3 = reply["values"]
+        return value1, value2, value3, datetime.fromisoformat(reply["measured_time"])
+
+    def list_meters(self) -> list:
+        return self._request("list_meters")["meters"]
+
+    # pylint: disable=invalid-name
+    # the names ev, x, y, z, u, v, tcp, delta_uv are used in the documentation
+    def get_ev_x_y(self) -> Tuple[float, float, float, datetime]:
+        return self._get("get_ev_x_y")
+
+    def get_x_y_z(self) -> Tuple[float, float, float, datetime]:
+        return self._get("get_x_y_z")
+
+    def get_ev_u_v(self) -> Tuple[float, float, float, datetime]:
+        return self._get("get_ev_u_v")
+
+    def get_ev_tcp_delta_uv(self) -> Tuple[float, float, float, datetime]:
+        return self._get("get_ev_tcp_delta_uv")
+
+    def close(self) -> None:
+        self._file.close()
+        self._sock.close()
+
+    def __enter__(self) -> "MeasurementClient":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
@@ -0,0 +1,335 @@
+"""
+In-memory CL-200A stand-in.
+
+``VirtualCL200A`` is a serial-like object that answers the commands used by
+``CL200A`` the way the meter does, so it can be passed as ``transport``:
+
+    luxmeter = CL200A(transport=VirtualCL200A(ev=500, x=0.3127, y=0.3290))
+
+The simulated light can be changed at any time through ``set_light``.
+Replies arrive after the configured latency plus their transmission time at
+``baudrate``. Busy (settle) times per command, measurement noise and dropped
+replies make it usable for timing and fault tests. A read with no reply on the
+way returns b"" at once, unless ``faults.hang_on_empty`` is set, in which case it
+blocks for ``timeout`` like a real port. The timing of the replies is in ``timing``
+and the injected faults in ``faults``; both can be changed at any time:
+
+    emulator.faults.drop_rate = 1.0  # the meter stops answering
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+STX = 0x02
+ETX = 0x03
+
+
+def _encode_value(value: float) -> str:
+    """_encode_value
+    Encode a value as sign + 4 digit mantissa + exponent digit, as the CL-200A does.
+    """
+    sign = "+" if value >= 0 else "-"
+    magnitude = abs(value)
+    for exponent in range(10):
+        mantissa = round(magnitude / 10 ** (exponent - 4))
+        if mantissa <= 9999:
+            return f"{sign}{mantissa:4d}{exponent}"
+    return f"{sign}99999"
+
+
+def _bcc(body: str) -> str:
+    checksum = 0
+    for char in body + chr(ETX):
+        checksum ^= ord(char)
+    return f"{checksum:02X}"
+
+
+# pylint: disable=invalid-name
+# the names ev, x, y, u, v are used in the documentation
+def light_to_values(ev: float, x: float, y: float) -> Dict[str, Tuple[float, float, float]]:
+    """light_to_values
+    Compute the values of every read command for a light of illuminance ev and
+    chromaticity x, y.
+
+    Args:
+        ev (float): illuminance
+        x (float): chromaticity x
+        y (float): chromaticity y
+
+    Returns:
+        Dict[str, Tuple[float, float, float]]: values keyed by command number
+    """
+    X = x * ev / y
+    Z = (1 - x - y) * ev / y
+    denominator = -2 * x + 12 * y + 3
+    u = 4 * x / denominator
+    v = 9 * y / denominator
+    # McCamy's approximation of the correlated colour temperature
+    n = (x - 0.3320) / (0.1858 - y)
+    tcp = 449 * n**3 + 3525 * n**2 + 6823.3 * n + 5520.33
+    return {
+        "01": (X, ev, Z),
+        "02": (ev, x, y),
+        "03": (ev, u, v),
+        "08": (ev, tcp, 0.0),
+    }
+
+
+class EmulatorTiming:
+    """
+    When a VirtualCL200A replies and how long it is busy.
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        baudrate: int = 9600,
+        settle_times: Optional[Dict[str, float]] = None,
+        realtime: bool = True,
+    ) -> None:
+        """__init__
+
+        Args:
+            latency (float, optional): reply latency in seconds. Defaults to 0.0.
+            baudrate (int, optional): baudrate used for the transmission time of replies.
+            Defaults to 9600.
+            settle_times (Optional[Dict[str, float]], optional): seconds the meter is busy
+            after a command, keyed by command number. Defaults to None.
+            realtime (bool, optional): deliver replies after latency and transmission time.
+            Defaults to True.
+        """
+        self.latency = latency
+        self.baudrate = baudrate
+        self.settle_times = settle_times or {}
+        self.realtime = realtime
+
+
+class EmulatorFaults:
+    """
+    Faults a VirtualCL200A injects into its replies.
+    """
+
+    def __init__(self, noise: float = 0.0, drop_rate: float = 0.0, seed: Optional[int] = None):
+        """__init__
+
+        Args:
+            noise (float, optional): relative standard deviation of the measured
+            illuminance. Defaults to 0.0.
+            drop_rate (float, optional): probability that a command gets no reply.
+            Defaults to 0.0.
+            seed (Optional[int], optional): seed of the noise and drop generator.
+        """
+        self.noise = noise
+        self.drop_rate = drop_rate
+        # ERR and battery status bytes of every reply
+        self.error_byte = " "
+        self.battery_byte = "0"
+        # a read with no reply on the way blocks for the timeout of the port
+        self.hang_on_empty = False
+        self.random = random.Random(seed)
+
+
+# pylint: disable=too-many-instance-attributes
+# the attributes of a serial port, the meter state and the reply queue; the settings
+# are grouped in timing and faults
+class VirtualCL200A:
+    """
+    Serial-like CL-200A emulator.
+    """
+
+    read_commands = ("01", "02", "03", "08")
+
+    def __init__(
+        self,
+        ev: float = 500.0,
+        x: float = 0.3127,
+        y: float = 0.3290,
+        heads: int = 1,
+        latency: float = 0.0,
+        baudrate: int = 9600,
+        settle_times: Optional[Dict[str, float]] = None,
+        noise: float = 0.0,
+        drop_rate: float = 0.0,
+        seed: Optional[int] = None,
+        port: str = "virtual",
+        realtime: bool = True,
+    ) -> None:
+        """__init__
+
+        Args:
+            ev (float, optional): illuminance of the simulated light. Defaults to 500.0.
+            x (float, optional): chromaticity x of the simulated light. Defaults to 0.3127.
+            y (float, optional): chromaticity y of the simulated light. Defaults to 0.3290.
+            heads (int, optional): number of receptor heads. Defaults to 1.
+            latency (float, optional): reply latency in seconds. Defaults to 0.0.
+            baudrate (int, optional): baudrate used for the transmission time of replies.
+            Defaults to 9600.
+            settle_times (Optional[Dict[str, float]], optional): seconds the meter is busy
+            after a command, keyed by command number, e.g. {"40": 0.3}. Commands that arrive
+            while the meter is busy are ignored. Defaults to None.
+            noise (float, optional): relative standard deviation of the measured
+            illuminance. Defaults to 0.0.
+            drop_rate (float, optional): probability that a command gets no reply.
+            Defaults to 0.0.
+            seed (Optional[int], optional): seed of the noise and drop generator.
+            port (str, optional): port name reported to CL200A. Defaults to "virtual".
+            realtime (bool, optional): deliver replies after latency and transmission time.
+            When False, replies are available at once and an input buffer reset only
+            discards the replies to earlier commands, for accelerated tests.
+            Defaults to True.
+        """
+        self.port = port
+        self.timeout: Optional[float] = 3
+        self.is_open = True
+        self.heads = heads
+        self.timing = EmulatorTiming(latency, baudrate, settle_times, realtime)
+        self.faults = EmulatorFaults(noise, drop_rate, seed)
+        self.commands_received = 0
+        self.commands_ignored = 0
+
+        self._lock = threading.Lock()
+        self._light = (ev, x, y)
+        self._measured: Dict[str, Tuple[float, float, float]] = {}
+        self._busy_until = 0.0
+        # (monotonic time the reply is available, reply, number of its command)
+        self._replies: Deque[Tuple[float, bytes, int]] = deque()
+        self._pending = b""
+
+    # pylint: disable=invalid-name
+    # the names ev, x, y are used in the documentation
+    def set_light(self, ev: float, x: Optional[float] = None, y: Optional[float] = None) -> None:
+        """set_light
+        Change the simulated light. Chromaticity is kept when x or y is omitted.
+        """
+        _, old_x, old_y = self._light
+        self._light = (ev, old_x if x is None else x, old_y if y is None else y)
+
+    def _measure(self) -> None:
+        ev, x, y = self._light
+        if self.faults.noise > 0:
+            ev = ev * (1 + self.faults.random.gauss(0, self.faults.noise))
+        self._measured = light_to_values(ev, x, y)
+
+    def _reply(self, head: str, command: str, data: str = "") -> None:
+        body = f"{head}{command}1{self.faults.error_byte}1{self.faults.battery_byte}{data}"
+        frame = f"{chr(STX)}{body}{chr(ETX)}{_bcc(body)}\r\n".encode("ascii")
+        timing = self.timing
+        if timing.realtime:
+            available_at = time.monotonic() + timing.latency + len(frame) * 10 / timing.baudrate
+        else:
+            available_at = 0.0
+        self._replies.append((available_at, frame, self.commands_received))
+
+    def _handle(self, frame: bytes) -> None:
+        text = frame.decode("ascii", errors="replace")
+        start = text.find(chr(STX))
+        end = text.find(chr(ETX), start + 1)
+        if start < 0 or end < 0:
+            return
+        body = text[start + 1 : end]
+        head, command = body[0:2], body[2:4]
+
+        self.commands_received += 1
+        now = time.monotonic()
+        if now < self._busy_until:
+            self.commands_ignored += 1
+            return
+        self._busy_until = now + self.timing.settle_times.get(command, 0.0)
+        if self.faults.drop_rate > 0 and self.faults.random.random() < self.faults.drop_rate:
+            return
+
+        if command == "40":
+            self._measure()
+        if head == "99":
+            # broadcast commands have no reply
+            return
+        if not head.isdigit() or int(head) >= self.heads:
+            return
+
+        if command in self.read_commands:
+            if not self._measured:
+                self._measure()
+            values = self._measured[command]
+            self._reply(head, command, "".join(_encode_value(value) for value in values))
+        elif command in ("40", "54"):
+            self._reply(head, command, "  ")
+
+    def write(self, data: bytes) -> int:
+        with self._lock:
+            self._pending += bytes(data)
+            while b"\n" in self._pending:
+                frame, self._pending = self._pending.split(b"\n", 1)
+                self._handle(frame)
+        return len(data)
+
+    def readline(self, *_args, **_kwargs) -> bytes:
+        with self._lock:
+            if self._replies:
+                available_at, reply, _ = self._replies[0]
+                wait = available_at - time.monotonic()
+                if self.timeout is None or wait <= self.timeout:
+                    self._replies.popleft()
+                    if wait > 0:
+                        time.sleep(wait)
+                    return reply
+            elif not self.faults.hang_on_empty:
+                return b""
+        if self.timeout is not None:
+            time.sleep(self.timeout)
+        return b""
+
+    read_until = readline
+
+    def due_replies(self) -> List[bytes]:
+        """due_replies
+        Take the replies whose transmission has finished, e.g. to forward them to a pty.
+        """
+        with self._lock:
+            now = time.monotonic()
+            replies = []
+            while self._replies and self._replies[0][0] <= now:
+                replies.append(self._replies.popleft()[1])
+            return replies
+
+    @property
+    def next_reply_at(self) -> Optional[float]:
+        """monotonic time the next pending reply is available, None without replies"""
+        with self._lock:
+            return self._replies[0][0] if self._replies else None
+
+    @property
+    def in_waiting(self) -> int:
+        now = time.monotonic()
+        return sum(len(reply) for available_at, reply, _ in self._replies if available_at <= now)
+
+    def reset_input_buffer(self) -> None:
+        with self._lock:
+            if not self.timing.realtime:
+                while self._replies and self._replies[0][2] < self.commands_received:
+                    self._replies.popleft()
+                return
+            now = time.monotonic()
+            while self._replies and self._replies[0][0] <= now:
+                self._replies.popleft()
+
+    def reset_output_buffer(self) -> None:
+        pass
+
+    flushInput = reset_input_buffer
+    flushOutput = reset_output_buffer
+
+    def open(self) -> None:
+        self.is_open = True
+
+    def isOpen(self) -> bool:  # pylint: disable=invalid-name
+        return self.is_open
+
+    def close(self) -> None:
+        self.is_open = False
+
+    def __repr__(self) -> str:
+        ev, x, y = self._light
+        return f"VirtualCL200A(port={self.port!r}, ev={ev}, x={x}, y={y})"
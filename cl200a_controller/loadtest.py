@@ -0,0 +1,367 @@
+"""
+Scale test with many emulated meters on one Linux host.
+
+``EmulatorFleet`` serves VirtualCL200A emulators on localhost sockets or pseudo
+terminals, so every meter is a real pyserial port for CL200A. ``run_load_test`` opens a
+CL200A on every port, acquires with FleetSynchronizer for a while and reports
+throughput, reply latency percentiles, CPU use and memory growth:
+
+    report = run_load_test(meters=200, duration=60, latency=0.01, drop_rate=0.001)
+    print(report.format())
+
+Port discovery (SerialUtils.find_all_luxmeters) is not exercised: the emulated ports
+are not USB devices.
+"""
+
+import os
+import selectors
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from cl200a_controller.adaptive_timeout import AdaptiveTimeout
+from cl200a_controller.alignment import FleetSynchronizer
+from cl200a_controller.cl200a import CL200A, Sample
+from cl200a_controller.emulator import VirtualCL200A
+
+
+class EmulatorFleet:
+    """
+    VirtualCL200A emulators served as serial ports by one selector thread, either on
+    localhost TCP sockets (pyserial "socket://" URLs) or on pseudo terminals.
+    """
+
+    def __init__(self, count: int, transport: str = "socket", **emulator_options: Any) -> None:
+        """__init__
+
+        Args:
+            count (int): number of emulators
+            transport (str, optional): "socket" or "pty". Some kernels refuse the 7E1
+            line settings of the CL-200A on pseudo terminals. Defaults to "socket".
+            **emulator_options: options of every VirtualCL200A, e.g. latency
+        """
+        if transport not in ("socket", "pty"):
+            raise ValueError(f"Unknown transport: {transport}")
+        self.emulators: List[VirtualCL200A] = []
+        self.ports: List[str] = []
+        self._selector = selectors.DefaultSelector()
+        # per emulator: file descriptor or socket the replies are written to
+        self._outputs: List[Any] = []
+        # descriptors and sockets closed on close()
+        self._resources: List[Any] = []
+        for index in range(count):
+            if transport == "pty":
+                master, slave = os.openpty()
+                os.set_blocking(master, False)
+                port = os.ttyname(slave)
+                self._selector.register(master, selectors.EVENT_READ, index)
+                self._outputs.append(master)
+                # the slave end stays open, so the master does not fail while a client reopens
+                self._resources += [master, slave]
+            else:
+                listener = socket.create_server(("127.0.0.1", 0))
+                listener.setblocking(False)
+                port = f"socket://127.0.0.1:{listener.getsockname()[1]}"
+                self._selector.register(listener, selectors.EVENT_READ, index)
+                self._outputs.append(None)
+                self._resources.append(listener)
+            self.emulators.append(VirtualCL200A(port=port, seed=index, **emulator_options))
+            self.ports.append(port)
+
+        self._stopping = False
+        self._thread = threading.Thread(target=self._serve, name="emulator-fleet", daemon=True)
+        self._thread.start()
+
+    def _receive(self, key: selectors.SelectorKey) -> None:
+        index = key.data
+        if isinstance(key.fileobj, socket.socket):
+            if key.fileobj in self._resources:
+                # a client connects to the listening socket of this emulator
+                connection, _ = key.fileobj.accept()
+                connection.setblocking(False)
+                if self._outputs[index] is not None:
+                    self._selector.unregister(self._outputs[index])
+                    self._outputs[index].close()
+                self._outputs[index] = connection
+                self._selector.register(connection, selectors.EVENT_READ, index)
+                return
+            try:
+                data = key.fileobj.recv(4096)
+            except OSError:
+                data = b""
+            if not data:
+                self._selector.unregister(key.fileobj)
+                key.fileobj.close()
+                self._outputs[index] = None
+                return
+        else:
+            try:
+                data = os.read(key.fd, 4096)
+            except OSError:
+                return
+        self.emulators[index].write(data)
+
+    def _serve(self) -> None:
+        while not self._stopping:
+            now = time.monotonic()
+            next_reply = min(
+                (at for at in (e.next_reply_at for e in self.emulators) if at is not None),
+                default=now + 0.01,
+            )
+            for key, _ in self._selector.select(timeout=max(min(next_reply - now, 0.01), 0)):
+                self._receive(key)
+            for output, emulator in zip(self._outputs, self.emulators):
+                for reply in emulator.due_replies():
+                    try:
+                        if isinstance(output, socket.socket):
+                            output.sendall(reply)
+                        elif output is not None:
+                            os.write(output, reply)
+                    except OSError:
+                        pass
+
+    def close(self) -> None:
+        """close
+        Stop serving and close the ports.
+        """
+        self._stopping = True
+        self._thread.join()
+        self._selector.close()
+        for output in self._outputs:
+            if isinstance(output, socket.socket):
+                output.close()
+        for resource in self._resources:
+            if isinstance(resource, socket.socket):
+                resource.close()
+            else:
+                os.close(resource)
+
+    def __enter__(self) -> "EmulatorFleet":
+        return self
+
+    def __exit__(self, *_exc_info) -> None:
+        self.close()
+
+
+def _percentile(ordered: Sequence[float], percentile: float) -> float:
+    if not ordered:
+        return float("nan")
+    return ordered[min(max(round(percentile * len(ordered)) - 1, 0), len(ordered) - 1)]
+
+
+def resident_set_size() -> int:
+    """resident_set_size
+    Resident set size of this process in bytes (Linux), 0 when unknown.
+    """
+    try:
+        with open("/proc/self/statm", encoding="ascii") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class LoadTestReport(NamedTuple):
+    """result of run_load_test"""
+
+    meters: int
+    cycles: int
+    samples: int
+    errors: int
+    open_seconds: float  # time to open every meter
+    seconds: float  # acquisition time
+    samples_per_second: float
+    latency_p50: float  # seconds from the trigger to a reply
+    latency_p95: float
+    latency_p99: float
+    cycle_p50: float  # seconds per fleet cycle
+    cycle_p99: float
+    cpu_percent: float  # process CPU time per wall time during acquisition
+    rss_start: int  # bytes after the meters were opened
+    rss_end: int
+
+    def format(self) -> str:
+        """format
+        Human-readable report.
+        """
+        return "\n".join(
+            (
+                f"meters              {self.meters} (opened in {self.open_seconds:.2f} s)",
+                f"cycles              {self.cycles} in {self.seconds:.1f} s",
+                f"samples             {self.samples} ({self.samples_per_second:.1f}/s)",
+                f"errors              {self.errors}",
+                f"reply latency       p50 {self.latency_p50 * 1e3:.1f} ms, "
+                f"p95 {self.latency_p95 * 1e3:.1f} ms, p99 {self.latency_p99 * 1e3:.1f} ms",
+                f"cycle time          p50 {self.cycle_p50 * 1e3:.1f} ms, "
+                f"p99 {self.cycle_p99 * 1e3:.1f} ms",
+                f"cpu                 {self.cpu_percent:.0f} %",
+                f"rss                 {self.rss_start / 2**20:.1f} MiB -> "
+                f"{self.rss_end / 2**20:.1f} MiB",
+            )
+        )
+
+
+class _Acquisition(NamedTuple):
+    """measurements of the acquisition phase of run_load_test"""
+
+    latencies: List[float]  # of every sample, ascending
+    cycle_times: List[float]  # ascending
+    errors: int
+    seconds: float
+    cpu_seconds: float
+    rss_start: int
+    rss_end: int
+
+
+def _meter_opener(
+    log_file_path: Path, latency: float, settle_time: float
+) -> Callable[[str], CL200A]:
+    # the margin a calibration would add (see settle_profile)
+    settle_times = {"connect": 0.0, "hold": 0.0, "ext": 0.0, "trigger": 1.5 * settle_time}
+
+    def open_meter(port: str) -> CL200A:
+        return CL200A(
+            log_file_path=log_file_path,
+            port=port,
+            raise_on_error=False,
+            read_timeout=AdaptiveTimeout(
+                floor=max(4 * latency, 0.05), initial=max(10 * latency, 0.2)
+            ),
+            settle_times=settle_times,
+        )
+
+    return open_meter
+
+
+def _close_all(luxmeters: Iterable[CL200A]) -> None:
+    for luxmeter in luxmeters:
+        luxmeter.close()
+
+
+def _open_meters(
+    ports: Sequence[str], open_meter: Callable[[str], CL200A], workers: int
+) -> Tuple[Dict[str, CL200A], float]:
+    """open a meter on every port in parallel and time it. When one fails, the others
+    are closed."""
+    started = time.perf_counter()
+    with ThreadPoolExecutor(workers) as executor:
+        futures = [executor.submit(open_meter, port) for port in ports]
+
+    luxmeters = {
+        port: future.result() for port, future in zip(ports, futures) if future.exception() is None
+    }
+    errors = [future.exception() for future in futures if future.exception() is not None]
+    if errors:
+        _close_all(luxmeters.values())
+        raise errors[0]  # type: ignore[misc]
+    return luxmeters, time.perf_counter() - started
+
+
+def _acquire(
+    luxmeters: Dict[str, CL200A],
+    measurement_formats: Sequence[str],
+    duration: float,
+    sink: Optional[Callable[[Sample], None]],
+) -> _Acquisition:
+    """measure with every meter in lockstep for duration seconds, then close them"""
+    latencies: List[float] = []
+    cycle_times: List[float] = []
+    errors = 0
+    rss_start = resident_set_size()
+    cpu_started = time.process_time()
+    started = time.perf_counter()
+    try:
+        with FleetSynchronizer(luxmeters, measurement_formats, raise_errors=False) as synchronizer:
+            while time.perf_counter() - started < duration:
+                cycle_started = time.perf_counter()
+                results = synchronizer.measure()
+                cycle_times.append(time.perf_counter() - cycle_started)
+                errors += len(synchronizer.last_errors)
+                for meter_samples in results.values():
+                    for sample in meter_samples:
+                        latencies.append((sample.receive_ns - sample.trigger_ns) / 1e9)
+                        if sink is not None:
+                            sink(sample)
+    finally:
+        _close_all(luxmeters.values())
+    return _Acquisition(
+        latencies=sorted(latencies),
+        cycle_times=sorted(cycle_times),
+        errors=errors,
+        seconds=time.perf_counter() - started,
+        cpu_seconds=time.process_time() - cpu_started,
+        rss_start=rss_start,
+        rss_end=resident_set_size(),
+    )
+
+
+def _report(meters: int, open_seconds: float, acquisition: _Acquisition) -> LoadTestReport:
+    seconds = acquisition.seconds
+    return LoadTestReport(
+        meters=meters,
+        cycles=len(acquisition.cycle_times),
+        samples=len(acquisition.latencies),
+        errors=acquisition.errors,
+        open_seconds=open_seconds,
+        seconds=seconds,
+        samples_per_second=len(acquisition.latencies) / seconds if seconds else 0.0,
+        latency_p50=_percentile(acquisition.latencies, 0.50),
+        latency_p95=_percentile(acquisition.latencies, 0.95),
+        latency_p99=_percentile(acquisition.latencies, 0.99),
+        cycle_p50=_percentile(acquisition.cycle_times, 0.50),
+        cycle_p99=_percentile(acquisition.cycle_times, 0.99),
+        cpu_percent=100 * acquisition.cpu_seconds / seconds if seconds else 0.0,
+        rss_start=acquisition.rss_start,
+        rss_end=acquisition.rss_end,
+    )
+
+
+def run_load_test(
+    meters: int = 100,
+    duration: float = 10.0,
+    measurement_formats: Sequence[str] = ("ev_x_y",),
+    latency: float = 0.01,
+    settle_time: float = 0.02,
+    drop_rate: float = 0.0,
+    noise: float = 0.001,
+    sink: Optional[Callable[[Sample], None]] = None,
+    log_file_path: Path = Path("./cl200a_loadtest.log"),
+    open_workers: int = 32,
+) -> LoadTestReport:
+    """run_load_test
+    Acquire from many emulated meters and measure the cost.
+
+    Args:
+        meters (int, optional): number of meters. Defaults to 100.
+        duration (float, optional): seconds of acquisition. Defaults to 10.0.
+        measurement_formats (Sequence[str], optional): formats read every cycle.
+        Defaults to ("ev_x_y",).
+        latency (float, optional): reply latency of the emulators. Defaults to 0.01.
+        settle_time (float, optional): busy time of the emulators after a measurement;
+        CL200A waits that long after the trigger. Defaults to 0.02.
+        drop_rate (float, optional): probability that a command gets no reply during
+        acquisition. Defaults to 0.0.
+        noise (float, optional): relative noise of the emulated illuminance.
+        Defaults to 0.001.
+        sink (Optional[Callable[[Sample], None]], optional): called with every sample,
+        e.g. SqliteSink.write. Defaults to None.
+        log_file_path (Path, optional): log file of the meters.
+        Defaults to Path("./cl200a_loadtest.log").
+        open_workers (int, optional): meters opened in parallel. Defaults to 32.
+
+    Returns:
+        LoadTestReport: report
+    """
+    with EmulatorFleet(
+        meters, latency=latency, noise=noise, settle_times={"40": settle_time}
+    ) as fleet:
+        luxmeters, open_seconds = _open_meters(
+            fleet.ports, _meter_opener(log_file_path, latency, settle_time), open_workers
+        )
+        for emulator in fleet.emulators:
+            emulator.faults.drop_rate = drop_rate
+        acquisition = _acquire(luxmeters, measurement_formats, duration, sink)
+
+    return _report(meters, open_seconds, acquisition)
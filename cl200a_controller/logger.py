@@ -1,10 +1,15 @@
+import atexit
 import logging
+import logging.handlers
+import queue
 from pathlib import Path
 
 
 class Logger:
 
     logger_obj = None
+    listener_obj = None
+    _atexit_registered = False
 
     @classmethod
     def logger(
@@ -12,30 +17,61 @@ class Logger:
         logger_name="cl200a controller log",
         log_file_path=Path("./cl200a_controller.log"),
         show_debug_message=False,
+        use_queue=False,
+        max_bytes=0,
+        backup_count=0,
     ):
+        """logger
+        Create the logger on the first call and return it afterwards.
+
+        Args:
+            logger_name (str, optional): name of the logger.
+            log_file_path (Path, optional): log file path.
+            show_debug_message (bool, optional): log debug messages. Defaults to False.
+            use_queue (bool, optional): hand records to a QueueHandler and write them from
+            a QueueListener thread, so the caller never blocks on log I/O. Defaults to False.
+            max_bytes (int, optional): rotate the log file when it reaches this size.
+            0 disables rotation. Defaults to 0.
+            backup_count (int, optional): number of rotated files to keep. Defaults to 0.
+
+        Returns:
+            logging.Logger: logger
+        """
 
         if cls.logger_obj is None:
             cls.logger_obj = cls.__create_logger(
                 logger_name=logger_name,
                 log_file_path=log_file_path,
                 show_debug_message=show_debug_message,
+                use_queue=use_queue,
+                max_bytes=max_bytes,
+                backup_count=backup_count,
             )
         return cls.logger_obj
 
     @classmethod
-    def __create_logger(cls, logger_name, log_file_path, show_debug_message):
+    def __create_logger(
+        cls, logger_name, log_file_path, show_debug_message, use_queue, max_bytes, backup_count
+    ):
         logger = logging.getLogger(logger_name)
+        # handlers of a previous logger_obj (see reset_logger) would otherwise pile up
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
 
         if show_debug_message:
             logger.setLevel(logging.DEBUG)
         else:
             logger.setLevel(logging.INFO)
 
-        file_handler = logging.FileHandler(log_file_path)
-        logger.addHandler(file_handler)
+        if max_bytes > 0:
+            file_handler: logging.Handler = logging.handlers.RotatingFileHandler(
+                log_file_path, maxBytes=max_bytes, backupCount=backup_count
+            )
+        else:
+            file_handler = logging.FileHandler(log_file_path)
 
         stream_handler = logging.StreamHandler()
-        logger.addHandler(stream_handler)
 
         formatter = logging.Formatter(
             "%(asctime)s - %(name)s - %(filename)s - %(funcName)s"
@@ -43,8 +79,34 @@ class Logger:
         )
         file_handler.setFormatter(formatter)
         stream_handler.setFormatter(formatter)
+
+        if use_queue:
+            log_queue: queue.SimpleQueue = queue.SimpleQueue()
+            logger.addHandler(logging.handlers.QueueHandler(log_queue))
+            cls.listener_obj = logging.handlers.QueueListener(
+                log_queue, file_handler, stream_handler, respect_handler_level=True
+            )
+            cls.listener_obj.start()
+            if not cls._atexit_registered:
+                atexit.register(cls.stop_listener)
+                cls._atexit_registered = True
+        else:
+            logger.addHandler(file_handler)
+            logger.addHandler(stream_handler)
         return logger
 
+    @classmethod
+    def stop_listener(cls):
+        """stop_listener
+        Flush the queued records and stop the listener thread of the queue mode.
+        """
+        if cls.listener_obj is not None:
+            cls.listener_obj.stop()
+            for handler in cls.listener_obj.handlers:
+                handler.close()
+            cls.listener_obj = None
+
     @classmethod
     def reset_logger(cls):
+        cls.stop_listener()
         cls.logger_obj = None
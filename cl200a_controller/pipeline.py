@@ -0,0 +1,378 @@
+"""
+Stages of the acquisition pipeline.
+
+A stage takes an iterable of samples and returns an iterator, so stages chain on
+``CL200A.stream``:
+
+    deadband = DeadbandFilter(abs_deadband=(1.0, 0.001, 0.001), heartbeat=60)
+    for sample in deadband(luxmeter.stream("ev_x_y", period=1)):
+        store(sample)
+
+    capture = TriggeredCapture(LevelCrossing(100.0), pre_trigger=50, post_trigger=50)
+    for event in capture(luxmeter.stream("ev_x_y")):
+        store(event.samples)
+
+    for summary in WindowAggregator(window=60)(luxmeter.stream("ev_x_y", period=1)):
+        store(summary)
+"""
+
+import math
+from collections import deque
+from datetime import datetime, timedelta
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from cl200a_controller.cl200a import Sample
+from cl200a_controller.cl200a_utils import MeasurementStatus
+from cl200a_controller.running_stats import RunningStats
+
+Deadband = Union[float, Sequence[float]]
+
+
+def _per_value(deadband: Deadband) -> Tuple[float, float, float]:
+    if isinstance(deadband, (int, float)):
+        return (float(deadband),) * 3
+    value1, value2, value3 = deadband
+    return float(value1), float(value2), float(value3)
+
+
+class DeadbandFilter:
+    """
+    Change-detection compression.
+
+    A sample is emitted when any value moved away from the last emitted sample of its
+    format and head by more than the deadband, when its status flags changed, or when
+    heartbeat seconds passed since that sample. Everything else is dropped, so mixed
+    streams (see CL200A.measure and stream_interleaved) are filtered per format and head.
+    """
+
+    def __init__(
+        self,
+        abs_deadband: Deadband = 0.0,
+        rel_deadband: Deadband = 0.0,
+        heartbeat: Optional[float] = None,
+        keep_edges: bool = True,
+    ) -> None:
+        """__init__
+
+        Args:
+            abs_deadband (Deadband, optional): absolute deadband, one for all values or one
+            per value. Defaults to 0.0.
+            rel_deadband (Deadband, optional): deadband relative to the last emitted value,
+            one for all values or one per value. Defaults to 0.0.
+            The larger of the two deadbands applies.
+            heartbeat (Optional[float], optional): emit at least one sample per heartbeat
+            seconds. Defaults to None.
+            keep_edges (bool, optional): when a change is emitted, also emit the last dropped
+            sample before it, so the end of a constant stretch is kept. Defaults to True.
+        """
+        self.abs_deadband = _per_value(abs_deadband)
+        self.rel_deadband = _per_value(rel_deadband)
+        self.heartbeat = heartbeat
+        self.keep_edges = keep_edges
+        self.emitted = 0
+        self.dropped = 0
+        # (format, head) -> last emitted sample and last dropped sample
+        self._last: Dict[Tuple[str, int], Sample] = {}
+        self._held: Dict[Tuple[str, int], Sample] = {}
+
+    def changed(self, sample: Sample) -> bool:
+        """changed
+        Whether a sample differs from the last emitted sample of its format and head by
+        more than the deadband.
+
+        Args:
+            sample (Sample): new sample
+
+        Returns:
+            bool: True if the sample has to be emitted
+        """
+        last = self._last.get((sample.measurement_format, sample.head))
+        if last is None or sample.status != last.status:
+            return True
+        if (
+            self.heartbeat is not None
+            and (sample.measured_time - last.measured_time).total_seconds() >= self.heartbeat
+        ):
+            return True
+
+        for value, last_value, abs_band, rel_band in zip(
+            sample.values, last.values, self.abs_deadband, self.rel_deadband
+        ):
+            if math.isnan(value) or math.isnan(last_value):
+                if math.isnan(value) != math.isnan(last_value):
+                    return True
+                continue
+            if abs(value - last_value) > max(abs_band, rel_band * abs(last_value)):
+                return True
+        return False
+
+    def __call__(self, samples: Iterable[Sample]) -> Iterator[Sample]:
+        for sample in samples:
+            key = (sample.measurement_format, sample.head)
+            if not self.changed(sample):
+                self.dropped += 1
+                self._held[key] = sample
+                continue
+
+            held = self._held.pop(key, None)
+            if self.keep_edges and held is not None:
+                self.dropped -= 1
+                self.emitted += 1
+                yield held
+            self._last[key] = sample
+            self.emitted += 1
+            yield sample
+
+
+class LevelCrossing:
+    """
+    Trigger condition: a value crosses a level.
+    """
+
+    def __init__(self, level: float, index: int = 0, direction: str = "both") -> None:
+        """__init__
+
+        Args:
+            level (float): level to cross
+            index (int, optional): index of the value, e.g. 0 for Ev. Defaults to 0.
+            direction (str, optional): "rising", "falling" or "both". Defaults to "both".
+        """
+        if direction not in ("rising", "falling", "both"):
+            raise ValueError(f"Unknown direction: {direction}")
+        self.level = level
+        self.index = index
+        self.direction = direction
+        self._previous: Optional[float] = None
+
+    def __call__(self, sample: Sample) -> bool:
+        value = sample.values[self.index]
+        previous, self._previous = self._previous, value
+        if previous is None:
+            return False
+        rising = previous < self.level <= value
+        falling = previous >= self.level > value
+        if self.direction == "rising":
+            return rising
+        if self.direction == "falling":
+            return falling
+        return rising or falling
+
+
+class Drift:
+    """
+    Trigger condition: a value drifts from a reference by more than delta,
+    e.g. Drift(200, index=1) on "ev_tcp_delta_uv" samples for a TCP drift of 200 K.
+    The reference is the first value seen, or the value at the last trigger.
+    """
+
+    def __init__(self, delta: float, index: int = 0, reference: Optional[float] = None) -> None:
+        """__init__
+
+        Args:
+            delta (float): allowed drift
+            index (int, optional): index of the value. Defaults to 0.
+            reference (Optional[float], optional): fixed reference value. Defaults to None.
+        """
+        self.delta = delta
+        self.index = index
+        self.reference = reference
+
+    def __call__(self, sample: Sample) -> bool:
+        value = sample.values[self.index]
+        if self.reference is None:
+            self.reference = value
+            return False
+        if abs(value - self.reference) > self.delta:
+            self.reference = value
+            return True
+        return False
+
+
+class Capture(NamedTuple):
+    """samples around one trigger"""
+
+    trigger: Sample
+    samples: List[Sample]  # pre-trigger history, the trigger sample and the post-trigger window
+
+
+class TriggeredCapture:
+    """
+    Threshold-triggered capture with a pre-trigger buffer.
+
+    Keeps the last pre_trigger samples in a ring. When condition(sample) is True, the ring,
+    the trigger sample and the next post_trigger samples are emitted as one Capture.
+    Triggers inside the post-trigger window are part of that capture.
+    """
+
+    def __init__(
+        self,
+        condition: Callable[[Sample], bool],
+        pre_trigger: int = 100,
+        post_trigger: int = 100,
+    ) -> None:
+        """__init__
+
+        Args:
+            condition (Callable[[Sample], bool]): trigger condition, e.g. LevelCrossing
+            pre_trigger (int, optional): samples kept before the trigger. Defaults to 100.
+            post_trigger (int, optional): samples kept after the trigger. Defaults to 100.
+        """
+        self.condition = condition
+        self.post_trigger = post_trigger
+        self.captures = 0
+        self._ring: Deque[Sample] = deque(maxlen=pre_trigger)
+
+    def __call__(self, samples: Iterable[Sample]) -> Iterator[Capture]:
+        capture: Optional[Capture] = None
+        remaining = 0
+        for sample in samples:
+            # stateful conditions see every sample, also inside the post-trigger window
+            triggered = self.condition(sample)
+            if capture is not None:
+                capture.samples.append(sample)
+                remaining -= 1
+                if remaining == 0:
+                    self.captures += 1
+                    yield capture
+                    capture = None
+                continue
+
+            if triggered:
+                capture = Capture(sample, list(self._ring) + [sample])
+                self._ring.clear()
+                remaining = self.post_trigger
+                if remaining == 0:
+                    self.captures += 1
+                    yield capture
+                    capture = None
+                continue
+
+            self._ring.append(sample)
+
+        if capture is not None:
+            # the stream ended inside the post-trigger window
+            self.captures += 1
+            yield capture
+
+
+class WindowSummary(NamedTuple):
+    """statistics of the samples of one format and head within one window"""
+
+    measurement_format: str
+    head: int
+    start: datetime
+    end: datetime
+    sample_count: int  # samples in the window, also those with undecodable (nan) values
+    mean: Tuple[float, float, float]
+    min: Tuple[float, float, float]
+    max: Tuple[float, float, float]
+    std: Tuple[float, float, float]
+    status: MeasurementStatus  # status flags of all samples combined
+    samples: Optional[List[Sample]] = None  # raw samples, only with keep_raw
+
+
+class _Window:
+    __slots__ = ("start", "end", "count", "stats", "status", "samples")
+
+    def __init__(self, start: datetime, end: datetime, keep_raw: bool) -> None:
+        self.start = start
+        self.end = end
+        self.count = 0
+        self.stats = (RunningStats(), RunningStats(), RunningStats())
+        self.status = MeasurementStatus.OK
+        self.samples: Optional[List[Sample]] = [] if keep_raw else None
+
+    def add(self, sample: Sample) -> None:
+        self.count += 1
+        self.status |= sample.status
+        for stats, value in zip(self.stats, sample.values):
+            if not math.isnan(value):
+                stats.add(value)
+        if self.samples is not None:
+            self.samples.append(sample)
+
+    def summary(self, measurement_format: str, head: int) -> WindowSummary:
+        def per_value(statistic: Callable[[RunningStats], float]) -> Tuple[float, float, float]:
+            value1, value2, value3 = (
+                statistic(stats) if stats.count else math.nan for stats in self.stats
+            )
+            return value1, value2, value3
+
+        return WindowSummary(
+            measurement_format=measurement_format,
+            head=head,
+            start=self.start,
+            end=self.end,
+            sample_count=self.count,
+            mean=per_value(lambda stats: stats.mean),
+            min=per_value(lambda stats: stats.min),
+            max=per_value(lambda stats: stats.max),
+            std=per_value(lambda stats: stats.std),
+            status=self.status,
+            samples=self.samples,
+        )
+
+
+class WindowAggregator:
+    """
+    Downsampling into fixed, back-to-back time windows.
+
+    Every format and head is aggregated separately. A window keeps only running
+    statistics (O(1) memory) unless keep_raw is set. Windows are aligned to multiples of
+    the window length since the Unix epoch, so aggregators of different runs and meters
+    produce matching windows. A window is emitted as soon as a later sample shows that
+    it has ended, and the open windows are emitted when the stream ends. Windows without
+    samples are not emitted.
+    """
+
+    def __init__(self, window: float, keep_raw: bool = False) -> None:
+        """__init__
+
+        Args:
+            window (float): window length in seconds
+            keep_raw (bool, optional): keep the raw samples in WindowSummary.samples.
+            Defaults to False.
+        """
+        if window <= 0:
+            raise ValueError("window must be positive")
+        self.window = window
+        self.keep_raw = keep_raw
+        self._open: Dict[Tuple[str, int], _Window] = {}
+
+    def _new_window(self, measured_time: datetime) -> _Window:
+        timestamp = measured_time.timestamp()
+        offset = timestamp - math.floor(timestamp / self.window) * self.window
+        start = measured_time - timedelta(seconds=offset)
+        return _Window(start, start + timedelta(seconds=self.window), self.keep_raw)
+
+    def __call__(self, samples: Iterable[Sample]) -> Iterator[WindowSummary]:
+        open_windows = self._open
+        for sample in samples:
+            measured_time = sample.measured_time
+            # close every window that ended before this sample, of any format and head
+            for key in [
+                key for key, window in open_windows.items() if window.end <= measured_time
+            ]:
+                yield open_windows.pop(key).summary(*key)
+
+            key = (sample.measurement_format, sample.head)
+            window = open_windows.get(key)
+            if window is None:
+                window = open_windows[key] = self._new_window(measured_time)
+            window.add(sample)
+
+        for key in sorted(open_windows, key=lambda key: open_windows[key].start):
+            yield open_windows[key].summary(*key)
+        open_windows.clear()
@@ -0,0 +1,214 @@
+"""
+Declarative measurement plans.
+
+A plan is a list of steps, given as Python structures or YAML:
+
+    steps:
+      - {action: call, name: set_lamp, args: [50]}
+      - {action: wait, seconds: 2}
+      - {action: measure, label: lamp_50, formats: [ev_x_y, x_y_z], heads: [0, 1], samples: 5}
+      - action: repeat
+        times: 3
+        steps:
+          - {action: call, name: set_lamp, args: [100]}
+          - {action: measure, formats: [ev_tcp_delta_uv]}
+
+``PlanRunner`` compiles the plan once (repeats unrolled, consecutive waits merged,
+read frames precomputed) and runs it on a ``CL200A``. Every sample of a measure step
+takes one measurement and reads all of its formats and heads from it.
+"""
+
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from cl200a_controller.cl200a import CL200A, Sample
+from cl200a_controller.cl200a_utils import CL200Utils
+
+
+class PlanSample(NamedTuple):
+    """one sample of a plan run"""
+
+    label: str
+    repetition: int  # index of the sample within its measure step
+    sample: Sample
+
+
+class _Call(NamedTuple):
+    function: Callable
+    args: Tuple
+    kwargs: Dict[str, Any]
+
+
+class _Wait(NamedTuple):
+    seconds: float
+
+
+class _Measure(NamedTuple):
+    label: str
+    formats: Tuple[str, ...]
+    heads: Tuple[int, ...]
+    samples: int
+    period: float
+
+
+class MeasurementPlan:
+    """
+    Validated list of plan steps.
+    """
+
+    actions = ("call", "wait", "measure", "repeat")
+
+    def __init__(self, steps: List[Dict[str, Any]]) -> None:
+        """__init__
+
+        Args:
+            steps (List[Dict[str, Any]]): plan steps
+
+        Raises:
+            ValueError: when a step is invalid.
+        """
+        self._validate(steps)
+        self.steps = steps
+
+    @classmethod
+    def from_dict(cls, plan: Union[Dict[str, Any], List[Dict[str, Any]]]) -> "MeasurementPlan":
+        """from_dict
+        Build a plan from {"steps": [...]} or from the list of steps.
+        """
+        steps = plan["steps"] if isinstance(plan, dict) else plan
+        return cls(steps)
+
+    @classmethod
+    def from_yaml(cls, path: Union[str, Path]) -> "MeasurementPlan":
+        """from_yaml
+        Load a plan from a YAML file. Requires PyYAML.
+
+        Raises:
+            ImportError: when PyYAML is not installed.
+        """
+        try:
+            import yaml  # pylint: disable=import-outside-toplevel
+        except ImportError as exc:
+            raise ImportError("Loading YAML plans requires PyYAML: pip install pyyaml") from exc
+
+        with open(path, encoding="utf-8") as file:
+            return cls.from_dict(yaml.safe_load(file))
+
+    @classmethod
+    def _validate(cls, steps: List[Dict[str, Any]]) -> None:
+        for step in steps:
+            action = step.get("action")
+            if action not in cls.actions:
+                raise ValueError(f"Unknown plan action: {action}")
+            if action == "call" and "name" not in step:
+                raise ValueError("A call step needs a name")
+            if action == "wait" and float(step.get("seconds", -1)) < 0:
+                raise ValueError("A wait step needs seconds >= 0")
+            if action == "measure":
+                for measurement_format in step.get("formats", ["ev_x_y"]):
+                    for head in step.get("heads", [0]):
+                        CL200Utils.read_frame(measurement_format, head)
+                if int(step.get("samples", 1)) < 1:
+                    raise ValueError("A measure step needs samples >= 1")
+            if action == "repeat":
+                if int(step.get("times", -1)) < 0:
+                    raise ValueError("A repeat step needs times >= 0")
+                cls._validate(step.get("steps", []))
+
+
+class PlanRunner:
+    """
+    Runs measurement plans on a CL200A.
+    """
+
+    def __init__(self, luxmeter: CL200A, functions: Optional[Dict[str, Callable]] = None) -> None:
+        """__init__
+
+        Args:
+            luxmeter (CL200A): meter to measure with
+            functions (Optional[Dict[str, Callable]], optional): functions that call steps
+            refer to by name, e.g. {"set_lamp": lamp.set_level}. Defaults to None.
+        """
+        self.luxmeter = luxmeter
+        self.functions = functions or {}
+
+    def compile(self, plan: MeasurementPlan) -> List[Union[_Call, _Wait, _Measure]]:
+        """compile
+        Flatten a plan into operations. Repeats are unrolled and consecutive waits merged.
+
+        Args:
+            plan (MeasurementPlan): plan
+
+        Raises:
+            KeyError: when a call step refers to an unknown function.
+
+        Returns:
+            List[Union[_Call, _Wait, _Measure]]: operations
+        """
+        operations: List[Union[_Call, _Wait, _Measure]] = []
+        self._compile_steps(plan.steps, operations)
+        return operations
+
+    def _compile_steps(
+        self, steps: List[Dict[str, Any]], operations: List[Union[_Call, _Wait, _Measure]]
+    ) -> None:
+        for step in steps:
+            action = step["action"]
+            if action == "call":
+                operations.append(
+                    _Call(
+                        self.functions[step["name"]],
+                        tuple(step.get("args", ())),
+                        dict(step.get("kwargs", {})),
+                    )
+                )
+            elif action == "wait":
+                seconds = float(step["seconds"])
+                if operations and isinstance(operations[-1], _Wait):
+                    operations[-1] = _Wait(operations[-1].seconds + seconds)
+                elif seconds > 0:
+                    operations.append(_Wait(seconds))
+            elif action == "measure":
+                formats = tuple(step.get("formats", ["ev_x_y"]))
+                heads = tuple(int(head) for head in step.get("heads", [0]))
+                operations.append(
+                    _Measure(
+                        label=str(step.get("label", f"step{len(operations)}")),
+                        formats=formats,
+                        heads=heads,
+                        samples=int(step.get("samples", 1)),
+                        period=float(step.get("period", 0)),
+                    )
+                )
+            elif action == "repeat":
+                for _ in range(int(step["times"])):
+                    self._compile_steps(step.get("steps", []), operations)
+
+    def run(self, plan: MeasurementPlan) -> List[PlanSample]:
+        """run
+        Run a plan and return all samples as one batch.
+
+        Args:
+            plan (MeasurementPlan): plan
+
+        Returns:
+            List[PlanSample]: samples in the order they were measured
+        """
+        results: List[PlanSample] = []
+        for operation in self.compile(plan):
+            if isinstance(operation, _Call):
+                operation.function(*operation.args, **operation.kwargs)
+            elif isinstance(operation, _Wait):
+                time.sleep(operation.seconds)
+            else:
+                next_at = time.monotonic()
+                for repetition in range(operation.samples):
+                    if repetition > 0 and operation.period > 0:
+                        next_at += operation.period
+                        delay = next_at - time.monotonic()
+                        if delay > 0:
+                            time.sleep(delay)
+                    for sample in self.luxmeter.measure(operation.formats, operation.heads):
+                        results.append(PlanSample(operation.label, repetition, sample))
+        return results
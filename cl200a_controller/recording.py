@@ -0,0 +1,297 @@
+"""
+Time-indexed recordings.
+
+A recording is a data file of compact sample blocks (see compact) and a sparse index
+sidecar ("<data file>.idx") with one fixed-size entry per block: its position, sample
+count, time range, meter and the heads and formats it contains.
+
+    with RecordingWriter("run.cl2") as writer:
+        for sample in writer(luxmeter.stream("ev_x_y"), meter=3):
+            ...
+
+    with RecordingReader("run.cl2") as reader:
+        samples = reader.query(start, end, meter=3, head=0)
+
+A query looks up the blocks that overlap the time range in the index and decodes only
+those from a memory map of the data file, so it touches a few blocks no matter how
+large the recording is.
+"""
+
+import bisect
+import mmap
+import struct
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Union
+
+from cl200a_controller import compact
+from cl200a_controller.cl200a import Sample
+
+INDEX_MAGIC = b"CL2I"
+INDEX_VERSION = 1
+_INDEX_HEADER = struct.Struct("<4sB3x")
+# offset, size, sample count, first and last time in us, head mask, meter, format mask
+_INDEX_ENTRY = struct.Struct("<QIIqqIHBx")
+
+
+class IndexEntry(NamedTuple):
+    """one block of a recording"""
+
+    offset: int
+    size: int
+    samples: int
+    start_us: int
+    end_us: int
+    head_mask: int  # bit n is set when head n has samples in the block
+    meter: int
+    format_mask: int  # bit n is set when compact.FORMATS[n] has samples in the block
+
+
+def _whole_entries(size: int) -> int:
+    """size of the header and the complete entries of an index of size bytes"""
+    entries = max(size - _INDEX_HEADER.size, 0) // _INDEX_ENTRY.size
+    return min(size, _INDEX_HEADER.size + entries * _INDEX_ENTRY.size)
+
+
+def index_path(path: Union[str, Path]) -> Path:
+    """index_path
+    Path of the index sidecar of a data file.
+    """
+    path = Path(path)
+    return path.with_name(path.name + ".idx")
+
+
+class RecordingWriter:
+    """
+    Appends samples to a recording. Samples are buffered per meter and written as one
+    block every block_size samples. Also a pipeline stage that passes the samples on.
+    """
+
+    def __init__(self, path: Union[str, Path], block_size: int = 4096) -> None:
+        """__init__
+
+        Args:
+            path (Union[str, Path]): data file. Appended to when it exists.
+            block_size (int, optional): samples per block. Defaults to 4096.
+        """
+        if block_size < 1:
+            raise ValueError("block_size must be at least 1")
+        self.path = Path(path)
+        self.block_size = block_size
+        self._buffers: Dict[int, List[Sample]] = {}
+        # pylint: disable=consider-using-with
+        self._data = open(self.path, "ab")
+        index_file = index_path(self.path)
+        new_index = not index_file.exists() or index_file.stat().st_size == 0
+        self._index = open(index_file, "ab")
+        if new_index:
+            self._index.write(_INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION))
+        else:
+            # drop an entry torn by a crash, so the appended entries stay aligned
+            self._index.truncate(_whole_entries(self._index.seek(0, 2)))
+
+    def write(self, sample: Sample, meter: int = 0) -> None:
+        """write
+
+        Args:
+            sample (Sample): sample
+            meter (int, optional): meter number, 0 to 65535. Defaults to 0.
+        """
+        buffer = self._buffers.setdefault(meter, [])
+        buffer.append(sample)
+        if len(buffer) >= self.block_size:
+            self._write_block(meter, buffer)
+            self._buffers[meter] = []
+
+    def __call__(self, samples: Iterable[Sample], meter: int = 0) -> Iterator[Sample]:
+        for sample in samples:
+            self.write(sample, meter)
+            yield sample
+
+    def _write_block(self, meter: int, samples: List[Sample]) -> None:
+        block = compact.encode(samples)
+        offset = self._data.tell()
+        self._data.write(block)
+        # the block is on disk before the index refers to it
+        self._data.flush()
+
+        times = [compact.to_microseconds(sample.measured_time) for sample in samples]
+        head_mask = 0
+        format_mask = 0
+        for sample in samples:
+            head_mask |= 1 << sample.head
+            format_mask |= 1 << compact.FORMATS.index(sample.measurement_format)
+        self._index.write(
+            _INDEX_ENTRY.pack(
+                offset,
+                len(block),
+                len(samples),
+                min(times),
+                max(times),
+                head_mask,
+                meter,
+                format_mask,
+            )
+        )
+        self._index.flush()
+
+    def flush(self) -> None:
+        """flush
+        Write the buffered samples of every meter as blocks.
+        """
+        for meter, buffer in self._buffers.items():
+            if buffer:
+                self._write_block(meter, buffer)
+        self._buffers = {}
+
+    def close(self) -> None:
+        """close
+        Flush and close the files.
+        """
+        self.flush()
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self) -> "RecordingWriter":
+        return self
+
+    def __exit__(self, *_exc_info) -> None:
+        self.close()
+
+
+def _matches(
+    sample: Sample,
+    head: Optional[int],
+    measurement_format: Optional[str],
+    start: Optional[datetime],
+    end: Optional[datetime],
+) -> bool:
+    """whether a sample of a selected block matches the query"""
+    return (
+        (head is None or sample.head == head)
+        and (measurement_format is None or sample.measurement_format == measurement_format)
+        and (start is None or sample.measured_time >= start)
+        and (end is None or sample.measured_time <= end)
+    )
+
+
+class RecordingReader:
+    """
+    Range queries on a recording. Blocks written after the reader was opened are not seen.
+    """
+
+    def __init__(self, path: Union[str, Path]) -> None:
+        """__init__
+
+        Args:
+            path (Union[str, Path]): data file
+
+        Raises:
+            ValueError: when the index is not a recording index.
+        """
+        self.path = Path(path)
+        index = index_path(self.path).read_bytes()
+        magic, version = _INDEX_HEADER.unpack_from(index, 0)
+        if magic != INDEX_MAGIC or version != INDEX_VERSION:
+            raise ValueError(f"{index_path(self.path)} is not a recording index")
+        # an entry torn by a crash of the writer is ignored
+        entries = index[_INDEX_HEADER.size : _whole_entries(len(index))]
+        self.entries = sorted(
+            (IndexEntry(*entry) for entry in _INDEX_ENTRY.iter_unpack(entries)),
+            key=lambda entry: entry.start_us,
+        )
+        self._starts = [entry.start_us for entry in self.entries]
+        self._longest = max((entry.end_us - entry.start_us for entry in self.entries), default=0)
+
+        # pylint: disable=consider-using-with
+        self._file = open(self.path, "rb")
+        size = self._file.seek(0, 2)
+        self._map: Optional[mmap.mmap] = (
+            mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+        )
+
+    def __len__(self) -> int:
+        return sum(entry.samples for entry in self.entries)
+
+    def blocks(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        meter: Optional[int] = None,
+        head: Optional[int] = None,
+        measurement_format: Optional[str] = None,
+    ) -> List[IndexEntry]:
+        """blocks
+        Index entries of the blocks that may contain matching samples.
+
+        Args:
+            start (Optional[datetime], optional): first time, inclusive. Defaults to None.
+            end (Optional[datetime], optional): last time, inclusive. Defaults to None.
+            meter (Optional[int], optional): meter number. Defaults to None (all).
+            head (Optional[int], optional): receptor head. Defaults to None (all).
+            measurement_format (Optional[str], optional): format. Defaults to None (all).
+
+        Returns:
+            List[IndexEntry]: entries ordered by time
+        """
+        start_us = None if start is None else compact.to_microseconds(start)
+        end_us = None if end is None else compact.to_microseconds(end)
+        head_bit = 0 if head is None else 1 << head
+        format_bit = (
+            0 if measurement_format is None else 1 << compact.FORMATS.index(measurement_format)
+        )
+
+        # no block that starts before this can reach the start of the range
+        first = (
+            0 if start_us is None else bisect.bisect_left(self._starts, start_us - self._longest)
+        )
+        selected = []
+        for entry in self.entries[first:]:
+            if end_us is not None and entry.start_us > end_us:
+                break
+            if start_us is not None and entry.end_us < start_us:
+                continue
+            if meter is not None and entry.meter != meter:
+                continue
+            if head_bit and not entry.head_mask & head_bit:
+                continue
+            if format_bit and not entry.format_mask & format_bit:
+                continue
+            selected.append(entry)
+        return selected
+
+    def query(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        meter: Optional[int] = None,
+        head: Optional[int] = None,
+        measurement_format: Optional[str] = None,
+    ) -> List[Sample]:
+        """query
+        Samples in a time range, optionally of one meter, head and format. See blocks.
+
+        Returns:
+            List[Sample]: samples ordered by block, within a block in recording order
+        """
+        if self._map is None:
+            return []
+
+        samples = []
+        for entry in self.blocks(start, end, meter, head, measurement_format):
+            for sample in compact.decode(self._map, entry.offset):
+                if _matches(sample, head, measurement_format, start, end):
+                    samples.append(sample)
+        return samples
+
+    def close(self) -> None:
+        """close"""
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self) -> "RecordingReader":
+        return self
+
+    def __exit__(self, *_exc_info) -> None:
+        self.close()
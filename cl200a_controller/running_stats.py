@@ -0,0 +1,56 @@
+import math
+
+
+class RunningStats:
+    """
+    Running count, mean, variance, min and max of a stream of values.
+    Uses Welford's algorithm, so memory is O(1) and the variance is numerically stable.
+    """
+
+    __slots__ = ("count", "mean", "min", "max", "_m2")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self._m2 = 0.0
+
+    def add(self, value: float) -> None:
+        """add
+        Add one value.
+
+        Args:
+            value (float): new value
+        """
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    @property
+    def variance(self) -> float:
+        """sample variance (n - 1 in the denominator). 0 with fewer than 2 values."""
+        if self.count < 2:
+            return 0.0
+        return self._m2 / (self.count - 1)
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    @property
+    def stderr(self) -> float:
+        """standard error of the mean."""
+        if self.count == 0:
+            return math.inf
+        return math.sqrt(self.variance / self.count)
+
+    @property
+    def rel_stderr(self) -> float:
+        """standard error relative to the absolute mean. inf when the mean is 0 and values vary."""
+        if self.mean == 0:
+            return 0.0 if self.stderr == 0 else math.inf
+        return self.stderr / abs(self.mean)
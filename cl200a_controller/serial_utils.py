@@ -1,6 +1,5 @@
-from typing import List, Union
+from typing import List, Optional, Union
 
-import serial.tools.list_ports as serial_list_ports
 from serial import SerialException
 
 
@@ -15,6 +14,10 @@ class SerialUtils:
         Returns:
             Union[List, List[dict]]: list of serial ports.
         """
+        # port enumeration is imported here to keep it out of the package import
+        # pylint: disable=import-outside-toplevel
+        import serial.tools.list_ports as serial_list_ports
+
         ports = serial_list_ports.comports()
         serial_port_list: list = []
 
@@ -62,3 +65,25 @@ class SerialUtils:
             return result
 
         raise SerialException("No port found")
+
+    @classmethod
+    def find_serial_number(cls, port: str) -> Optional[str]:
+        """find_serial_number
+        Serial number of the USB adapter of a port. It identifies a meter even when
+        the port name changes between sessions.
+
+        Args:
+            port (str): port name, e.g. "/dev/ttyUSB0"
+
+        Returns:
+            Optional[str]: serial number, None when the port has none or is not found.
+        """
+        try:
+            found_ports = cls.list_ports()
+        except SerialException:
+            return None
+
+        for found_port in found_ports:
+            if found_port.get("device") == port:
+                return found_port.get("serial_number") or None
+        return None
@@ -0,0 +1,221 @@
+"""
+Per-meter settle times.
+
+After some commands the CL-200A ignores further commands for a while. CL200A waits
+a fixed settle time after them; the defaults are worst-case values. A meter can be
+calibrated once to find the shortest reliable settle times, which are persisted and
+loaded by later sessions:
+
+    store = SettleProfileStore()
+    settle_times = store.load(port)
+    luxmeter = CL200A(port=port, settle_times=settle_times)
+    if settle_times is None:
+        store.save(port, luxmeter.calibrate_settle_times())
+
+Settle times are keyed by the step they follow: "connect" (command 54), "hold"
+(command 55), "ext" (command 40 on head 00) and "trigger" (command 40 broadcast).
+
+The settle time of "trigger" is the time the meter takes to measure. A read that comes
+too early is still answered, with the previous measurement, and the reply does not tell
+the two apart, so calibration does not shorten it below MIN_SETTLE_TIMES.
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from cl200a_controller.cl200a_utils import CL200Utils
+
+DEFAULT_SETTLE_TIMES: Dict[str, float] = {
+    "connect": 0.5,
+    "hold": 0.5,
+    "ext": 0.125,
+    "trigger": 0.5,
+}
+
+# settle times calibration can not verify, so they keep their worst-case value
+MIN_SETTLE_TIMES: Dict[str, float] = {
+    "trigger": DEFAULT_SETTLE_TIMES["trigger"],
+}
+
+DEFAULT_PROFILE_PATH = Path("~/.cl200a_controller/settle_profiles.json")
+
+
+def _command(step: str) -> str:
+    cmd_dict = CL200Utils.cl200a_cmd_dict
+    if step == "connect":
+        return "00541   "
+    if step == "hold":
+        return cmd_dict["command_55"]
+    if step == "ext":
+        return cmd_dict["command_40"]
+    return cmd_dict["command_40r"]
+
+
+def _reply(ser: Any, command_number: str) -> str:
+    """first reply to command_number, skipping late replies to other commands"""
+    for _ in range(3):
+        reply = ser.readline().decode("ascii", errors="replace")
+        if not reply.endswith("\n"):
+            return ""
+        if reply[3:5] == command_number:
+            return reply
+    return ""
+
+
+def _probe(step: str) -> Tuple[str, str, Callable[[str], bool]]:
+    """formatted command that must be accepted after the step, its number and the reply check"""
+    if step == "hold":
+        # EXT mode is refused with ERR byte "4" while hold mode is not completed
+        ext = CL200Utils.cmd_formatter(CL200Utils.cl200a_cmd_dict["command_40"])
+        return ext, "40", lambda reply: reply[6:7] != "4"
+    # any reply: whether it is a new measurement can not be told (see MIN_SETTLE_TIMES)
+    return CL200Utils.read_frame("ev_x_y"), "02", lambda reply: True
+
+
+def calibrate_settle_times(
+    ser: Any,
+    steps: Tuple[str, ...] = ("connect", "hold", "ext"),
+    upper: Optional[Dict[str, float]] = None,
+    trials: int = 3,
+    resolution: float = 0.005,
+    safety_factor: float = 1.5,
+    probe_timeout: float = 0.2,
+) -> Dict[str, float]:
+    """calibrate_settle_times
+    Find the shortest reliable settle time of each step by bisection. A settle time is
+    reliable when the command after it is accepted in all trials. The result is the
+    shortest reliable settle time times safety_factor, but never more than the upper
+    bound. The search starts at MIN_SETTLE_TIMES (or the upper bound, if lower), so
+    "trigger" is only calibrated on request and only below a lower upper bound. The
+    meter must be connected; it is left in EXT mode when "ext" or "trigger" is
+    calibrated last, as in the default order.
+
+    Args:
+        ser (Any): serial port of a connected CL-200A
+        steps (Tuple[str, ...], optional): steps to calibrate.
+        Defaults to ("connect", "hold", "ext").
+        upper (Optional[Dict[str, float]], optional): known safe settle times.
+        Defaults to None (DEFAULT_SETTLE_TIMES).
+        trials (int, optional): trials per candidate settle time. Defaults to 3.
+        resolution (float, optional): bisection stops at this width in seconds.
+        Defaults to 0.005.
+        safety_factor (float, optional): margin on the shortest reliable settle time.
+        Defaults to 1.5.
+        probe_timeout (float, optional): read timeout of the probe replies in seconds.
+        Defaults to 0.2.
+
+    Raises:
+        ValueError: when a step is unknown.
+
+    Returns:
+        Dict[str, float]: settle times keyed by step
+    """
+    upper = {**DEFAULT_SETTLE_TIMES, **(upper or {})}
+    for step in steps:
+        if step not in DEFAULT_SETTLE_TIMES:
+            raise ValueError(f"Unknown settle step: {step}")
+
+    def reliable(step: str, settle_time: float, recovery: float) -> bool:
+        command = CL200Utils.cmd_formatter(_command(step))
+        probe, probe_number, check = _probe(step)
+        for _ in range(trials):
+            # start every trial from an idle meter
+            time.sleep(recovery)
+            ser.reset_input_buffer()
+            ser.write(command.encode())
+            time.sleep(settle_time)
+            ser.reset_input_buffer()
+            ser.write(probe.encode())
+            reply = _reply(ser, probe_number)
+            if not reply or not check(reply):
+                return False
+        return True
+
+    timeout = ser.timeout
+    ser.timeout = probe_timeout
+    settle_times: Dict[str, float] = {}
+    try:
+        for step in steps:
+            low, high = min(MIN_SETTLE_TIMES.get(step, 0.0), upper[step]), upper[step]
+            if reliable(step, low, high):
+                high = low
+            while high - low > resolution:
+                middle = (low + high) / 2
+                if reliable(step, middle, high):
+                    high = middle
+                else:
+                    low = middle
+            settle_times[step] = round(min(high * safety_factor, upper[step]), 4)
+    finally:
+        ser.timeout = timeout
+    return settle_times
+
+
+class SettleProfileStore:
+    """
+    JSON file of settle times keyed by meter, e.g. the port or the serial number of
+    the USB adapter (see SerialUtils.find_serial_number).
+    """
+
+    # serializes the read-modify-write of save within the process
+    _lock = threading.Lock()
+
+    def __init__(self, path: Path = DEFAULT_PROFILE_PATH) -> None:
+        """__init__
+
+        Args:
+            path (Path, optional): profile file.
+            Defaults to ~/.cl200a_controller/settle_profiles.json.
+        """
+        self.path = Path(path).expanduser()
+
+    def _read(self) -> Dict[str, Dict[str, float]]:
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return {}
+
+    def load(self, meter_id: str) -> Optional[Dict[str, float]]:
+        """load
+
+        Args:
+            meter_id (str): port or serial number
+
+        Returns:
+            Optional[Dict[str, float]]: settle times, None when the meter was not calibrated.
+        """
+        return self._read().get(meter_id)
+
+    def save(self, meter_id: str, settle_times: Dict[str, float]) -> None:
+        """save
+        Store the settle times of a meter. Profiles of other meters are kept.
+
+        Args:
+            meter_id (str): port or serial number
+            settle_times (Dict[str, float]): settle times keyed by step
+        """
+        with self._lock:
+            profiles = self._read()
+            profiles[meter_id] = dict(settle_times)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                "w",
+                encoding="utf-8",
+                dir=self.path.parent,
+                prefix=f".{self.path.name}.",
+                suffix=".tmp",
+                delete=False,
+            ) as file:
+                json.dump(profiles, file, indent=2, sort_keys=True)
+            try:
+                # replace atomically, so a concurrent load never sees a partial file
+                os.replace(file.name, self.path)
+            except OSError:
+                os.unlink(file.name)
+                raise
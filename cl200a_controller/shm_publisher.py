@@ -0,0 +1,300 @@
+"""
+Latest-value publication through shared memory.
+
+The acquisition process publishes every sample into a ``multiprocessing.shared_memory``
+block; local readers (GUIs, controllers, loggers) read the newest sample or the last few
+without a socket round trip, serialisation or a lock:
+
+    # acquisition process
+    publisher = ShmPublisher("cl200a_0")
+    for sample in publisher(luxmeter.stream("ev_x_y")):
+        ...
+
+    # any process on the same host
+    reader = ShmReader("cl200a_0")
+    sample = reader.latest()
+
+Layout (little-endian): a header with the magic, the version, the ring size, the slot
+size and the number of published samples, followed by a ring of slots. Every slot starts
+with a sequence number that is odd while the publisher writes the slot (seqlock); a
+reader retries when the number was odd or changed while it copied the slot, and gives
+up with TimeoutError when a publisher died in the middle of a write. There must be only
+one publishing process per block.
+"""
+
+import os
+import struct
+import threading
+import time
+from datetime import datetime, timedelta
+from multiprocessing import shared_memory
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from cl200a_controller.cl200a import Sample
+from cl200a_controller.cl200a_utils import CL200Utils, MeasurementStatus
+
+MAGIC = b"CL2S"
+VERSION = 2
+
+# magic, version, ring size, slot size, published samples
+_HEADER = struct.Struct("<4sB3xIIQ")
+_COUNT = struct.Struct("<Q")
+_COUNT_OFFSET = 16
+_SEQUENCE = struct.Struct("<Q")
+# index, format, head, status, values, measured time in us, trigger ns, receive ns,
+# raw mantissas, raw exponents, whether the raw values are known
+_RECORD = struct.Struct("<QBBHdddqqq3h3bB2x")
+_NO_RAW = ((0, 0), (0, 0), (0, 0))
+_SLOT_SIZE = _SEQUENCE.size + _RECORD.size
+
+FORMATS = tuple(CL200Utils.measurement_format_dict)
+_FORMAT_CODES = {measurement_format: code for code, measurement_format in enumerate(FORMATS)}
+
+
+def _to_microseconds(measured_time: datetime) -> int:
+    return round(measured_time.timestamp() * 1e6)
+
+
+def _from_microseconds(microseconds: int) -> datetime:
+    seconds, remainder = divmod(microseconds, 10**6)
+    return datetime.fromtimestamp(seconds) + timedelta(microseconds=remainder)
+
+
+def _buffer_of(shm: shared_memory.SharedMemory) -> memoryview:
+    """the memory of an open block"""
+    buffer = shm.buf
+    if buffer is None:
+        raise ValueError(f"{shm.name} is closed")
+    return buffer
+
+
+class ShmPublisher:
+    """
+    Publishes samples into a shared-memory ring. Also a pipeline stage that passes the
+    samples on.
+    """
+
+    def __init__(self, name: Optional[str] = None, ring_size: int = 64) -> None:
+        """__init__
+
+        Args:
+            name (Optional[str], optional): name of the shared-memory block.
+            Defaults to None (a random name, see the name attribute).
+            ring_size (int, optional): number of recent samples kept. Defaults to 64.
+        """
+        if ring_size < 1:
+            raise ValueError("ring_size must be at least 1")
+        self.ring_size = ring_size
+        self._shm = shared_memory.SharedMemory(
+            name=name, create=True, size=_HEADER.size + ring_size * _SLOT_SIZE
+        )
+        self.name = self._shm.name
+        self._buffer = _buffer_of(self._shm)
+        self._lock = threading.Lock()
+        self._count = 0
+        _HEADER.pack_into(self._buffer, 0, MAGIC, VERSION, ring_size, _SLOT_SIZE, 0)
+
+    def publish(self, sample: Sample) -> None:
+        """publish
+        Write a sample into the next slot of the ring.
+
+        Args:
+            sample (Sample): sample
+        """
+        value1, value2, value3 = sample.values
+        (mantissa1, exponent1), (mantissa2, exponent2), (mantissa3, exponent3) = (
+            sample.raw or _NO_RAW
+        )
+        with self._lock:
+            index = self._count
+            offset = _HEADER.size + (index % self.ring_size) * _SLOT_SIZE
+            (sequence,) = _SEQUENCE.unpack_from(self._buffer, offset)
+            _SEQUENCE.pack_into(self._buffer, offset, sequence + 1)
+            _RECORD.pack_into(
+                self._buffer,
+                offset + _SEQUENCE.size,
+                index,
+                _FORMAT_CODES[sample.measurement_format],
+                sample.head,
+                int(sample.status),
+                value1,
+                value2,
+                value3,
+                _to_microseconds(sample.measured_time),
+                sample.trigger_ns,
+                sample.receive_ns,
+                mantissa1,
+                mantissa2,
+                mantissa3,
+                exponent1,
+                exponent2,
+                exponent3,
+                sample.raw is not None,
+            )
+            _SEQUENCE.pack_into(self._buffer, offset, sequence + 2)
+            self._count = index + 1
+            _COUNT.pack_into(self._buffer, _COUNT_OFFSET, self._count)
+
+    def __call__(self, samples: Iterable[Sample]) -> Iterator[Sample]:
+        for sample in samples:
+            self.publish(sample)
+            yield sample
+
+    def close(self, unlink: bool = True) -> None:
+        """close
+        Detach from the block and, by default, remove it.
+        """
+        self._buffer.release()
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+
+    def __enter__(self) -> "ShmPublisher":
+        return self
+
+    def __exit__(self, *_exc_info) -> None:
+        self.close()
+
+
+class ShmReader:
+    """
+    Reads samples published by a ShmPublisher, possibly in another process.
+    """
+
+    def __init__(self, name: str, timeout: float = 1.0) -> None:
+        """__init__
+
+        Args:
+            name (str): name of the shared-memory block
+            timeout (float, optional): seconds a slot may stay locked by the publisher
+            before reading it raises TimeoutError. Defaults to 1.0.
+
+        Raises:
+            FileNotFoundError: when the block does not exist.
+            ValueError: when the block is not a sample ring.
+        """
+        self.name = name
+        self.timeout = timeout
+        self._shm = _attach(name)
+        self._buffer = _buffer_of(self._shm)
+        magic, version, self.ring_size, slot_size, _ = _HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC or version != VERSION or slot_size != _SLOT_SIZE:
+            self.close()
+            raise ValueError(f"{name} is not a CL-200A sample ring")
+
+    @property
+    def published(self) -> int:
+        """number of samples published so far"""
+        return _COUNT.unpack_from(self._buffer, _COUNT_OFFSET)[0]
+
+    def _read(self, index: int) -> Optional[Sample]:
+        """consistent copy of the sample with this index, None when it was overwritten"""
+        offset = _HEADER.size + (index % self.ring_size) * _SLOT_SIZE
+        deadline = None
+        while True:
+            (before,) = _SEQUENCE.unpack_from(self._buffer, offset)
+            if not before % 2:
+                record = _RECORD.unpack_from(self._buffer, offset + _SEQUENCE.size)
+                (after,) = _SEQUENCE.unpack_from(self._buffer, offset)
+                if before == after:
+                    break
+            if deadline is None:
+                deadline = time.monotonic() + self.timeout
+            elif time.monotonic() > deadline:
+                raise TimeoutError(
+                    f"Slot {index % self.ring_size} of {self.name} stayed locked, "
+                    "the publisher probably stopped while writing it."
+                )
+
+        if record[0] != index:
+            return None
+        return _to_sample(record)
+
+    def latest(self) -> Optional[Sample]:
+        """latest
+        The newest sample.
+
+        Returns:
+            Optional[Sample]: sample, None before the first publication
+        """
+        while True:
+            published = self.published
+            if published == 0:
+                return None
+            sample = self._read(published - 1)
+            if sample is not None:
+                return sample
+
+    def recent(self, count: Optional[int] = None) -> List[Sample]:
+        """recent
+        The newest samples still in the ring, oldest first.
+
+        Args:
+            count (Optional[int], optional): maximum number of samples.
+            Defaults to None (the whole ring).
+
+        Returns:
+            List[Sample]: samples
+        """
+        published = self.published
+        kept = self.ring_size if count is None else min(count, self.ring_size)
+        samples = []
+        for index in range(max(published - kept, 0), published):
+            sample = self._read(index)
+            # samples overwritten while reading are skipped
+            if sample is not None:
+                samples.append(sample)
+        return samples
+
+    def close(self) -> None:
+        """close
+        Detach from the block. The block stays for the publisher and other readers.
+        """
+        self._buffer.release()
+        self._shm.close()
+
+    def __enter__(self) -> "ShmReader":
+        return self
+
+    def __exit__(self, *_exc_info) -> None:
+        self.close()
+
+
+def _to_sample(record: Tuple) -> Sample:
+    """sample of an unpacked _RECORD"""
+    _, format_code, head, status, value1, value2, value3 = record[:7]
+    microseconds, trigger_ns, receive_ns = record[7:10]
+    # raw mantissas at 10 to 12, raw exponents at 13 to 15
+    raw = (
+        ((record[10], record[13]), (record[11], record[14]), (record[12], record[15]))
+        if record[16]
+        else None
+    )
+    return Sample(
+        FORMATS[format_code],
+        (value1, value2, value3),
+        _from_microseconds(microseconds),
+        MeasurementStatus(status),
+        head,
+        trigger_ns,
+        receive_ns,
+        raw,
+    )
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """attach to a block without letting the resource tracker remove it at exit"""
+    try:
+        # pylint: disable=unexpected-keyword-arg
+        return shared_memory.SharedMemory(name=name, track=False)  # type: ignore[call-arg]
+    except TypeError:
+        # before Python 3.13 attaching registers the block with the resource tracker of
+        # this process on POSIX, which would unlink it when the reader exits
+        # pylint: disable=import-outside-toplevel
+        from multiprocessing import resource_tracker
+
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name == "posix":
+            # the tracker knows the block by its name with the leading slash
+            resource_tracker.unregister(f"/{shm.name}", "shared_memory")
+        return shm
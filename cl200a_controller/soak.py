@@ -0,0 +1,267 @@
+"""
+Soak test for slow memory leaks.
+
+``run_soak_test`` drives a CL200A against an in-memory VirtualCL200A without settle
+times, so a week of acquisition is compressed into minutes. After a warm-up it traces
+allocations with tracemalloc, samples the RSS at checkpoints and reports the memory
+retained per sample and the source lines that grew most:
+
+    report = run_soak_test(samples=1_000_000, max_growth=2**20)
+    print(report.format())
+    assert report.passed
+
+The run stops at the first checkpoint that exceeds a threshold.
+"""
+
+import gc
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+from cl200a_controller.cl200a import CL200A, Sample
+from cl200a_controller.emulator import VirtualCL200A
+from cl200a_controller.loadtest import resident_set_size
+
+
+class Checkpoint(NamedTuple):
+    """memory use after a number of samples"""
+
+    samples: int
+    traced: int  # bytes allocated through Python and still alive
+    blocks: int  # memory blocks allocated through Python and still alive
+    rss: int  # resident set size in bytes
+
+
+class SoakReport(NamedTuple):
+    """result of run_soak_test"""
+
+    samples: int
+    seconds: float
+    checkpoints: Tuple[Checkpoint, ...]  # the first one is taken after the warm-up
+    top_growth: Tuple[str, ...]  # source lines that retained the most memory
+    max_growth: int
+    max_rss_growth: Optional[int]
+
+    @property
+    def growth(self) -> int:
+        """bytes retained since the warm-up"""
+        return self.checkpoints[-1].traced - self.checkpoints[0].traced
+
+    @property
+    def rss_growth(self) -> int:
+        """growth of the resident set size since the warm-up in bytes"""
+        return self.checkpoints[-1].rss - self.checkpoints[0].rss
+
+    @property
+    def bytes_per_sample(self) -> float:
+        """bytes retained per sample since the warm-up"""
+        measured = self.checkpoints[-1].samples - self.checkpoints[0].samples
+        return self.growth / measured if measured else 0.0
+
+    @property
+    def blocks_per_sample(self) -> float:
+        """memory blocks retained per sample since the warm-up"""
+        measured = self.checkpoints[-1].samples - self.checkpoints[0].samples
+        blocks = self.checkpoints[-1].blocks - self.checkpoints[0].blocks
+        return blocks / measured if measured else 0.0
+
+    @property
+    def passed(self) -> bool:
+        """whether the memory stayed within the thresholds"""
+        return self.growth <= self.max_growth and (
+            self.max_rss_growth is None or self.rss_growth <= self.max_rss_growth
+        )
+
+    def format(self) -> str:
+        """format
+        Human-readable report.
+        """
+        lines = [
+            f"samples             {self.samples} in {self.seconds:.1f} s "
+            f"({self.samples / self.seconds if self.seconds else 0.0:.0f}/s)",
+            f"retained            {self.growth / 1024:.1f} KiB "
+            f"(limit {self.max_growth / 1024:.1f} KiB), "
+            f"{self.bytes_per_sample:.2f} B and {self.blocks_per_sample:.4f} blocks per sample",
+            f"rss growth          {self.rss_growth / 2**20:.1f} MiB",
+            "checkpoints         samples, traced KiB, rss MiB",
+        ]
+        lines += [
+            f"                    {checkpoint.samples}, {checkpoint.traced / 1024:.1f}, "
+            f"{checkpoint.rss / 2**20:.1f}"
+            for checkpoint in self.checkpoints
+        ]
+        if self.top_growth:
+            lines.append("top growth")
+            lines += [f"  {line}" for line in self.top_growth]
+        lines.append("PASSED" if self.passed else "FAILED: memory grew past the threshold")
+        return "\n".join(lines)
+
+
+# allocations of the soak test itself (snapshots, checkpoints) are not growth
+_IGNORED = (tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__))
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces(_IGNORED)
+
+
+def _checkpoint(samples: int) -> Checkpoint:
+    gc.collect()
+    traces = _snapshot().traces
+    return Checkpoint(
+        samples, sum(trace.size for trace in traces), len(traces), resident_set_size()
+    )
+
+
+def _read_formats(measurement_formats: Sequence[str]) -> Callable[[CL200A], List[Sample]]:
+    def step(luxmeter: CL200A) -> List[Sample]:
+        return [
+            luxmeter.read_sample(measurement_format) for measurement_format in measurement_formats
+        ]
+
+    return step
+
+
+class _Acquisition:
+    """runs the acquisition step of a meter and counts the samples"""
+
+    def __init__(
+        self,
+        luxmeter: CL200A,
+        step: Callable[[CL200A], Sequence[Sample]],
+        sink: Optional[Callable[[Sample], None]],
+    ) -> None:
+        self.luxmeter = luxmeter
+        self.step = step
+        self.sink = sink
+        self.taken = 0
+
+    def __call__(self, until: int) -> None:
+        while self.taken < until:
+            for sample in self.step(self.luxmeter):
+                self.taken += 1
+                if self.sink is not None:
+                    self.sink(sample)
+
+
+def _soak(
+    acquire: _Acquisition,
+    samples: int,
+    duration: Optional[float],
+    warmup: int,
+    checkpoints: int,
+    top: int,
+    limits: SoakReport,
+) -> SoakReport:
+    """trace the acquisition and fill in the report; limits holds the thresholds"""
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    try:
+        # under tracing, so lazily allocated caches are in the baseline
+        acquire(warmup)
+        # and so are the first allocations of taking a checkpoint
+        _checkpoint(acquire.taken)
+        baseline = _snapshot()
+        report = limits._replace(checkpoints=(_checkpoint(acquire.taken),))
+        started = time.perf_counter()
+        for index in range(1, checkpoints + 1):
+            acquire(report.checkpoints[0].samples + samples * index // checkpoints)
+            report = report._replace(
+                checkpoints=report.checkpoints + (_checkpoint(acquire.taken),)
+            )
+            if not report.passed:
+                break
+            if duration is not None and time.perf_counter() - started >= duration:
+                break
+        report = report._replace(
+            samples=report.checkpoints[-1].samples - report.checkpoints[0].samples,
+            seconds=time.perf_counter() - started,
+        )
+
+        growth = _snapshot().compare_to(baseline, "lineno")
+        return report._replace(
+            top_growth=tuple(
+                str(statistic) for statistic in growth[:top] if statistic.size_diff > 0
+            )
+        )
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+
+def run_soak_test(
+    samples: int = 100000,
+    duration: Optional[float] = None,
+    measurement_formats: Sequence[str] = ("ev_x_y",),
+    step: Optional[Callable[[CL200A], Sequence[Sample]]] = None,
+    sink: Optional[Callable[[Sample], None]] = None,
+    warmup: int = 1000,
+    checkpoints: int = 10,
+    max_growth: int = 2**20,
+    max_rss_growth: Optional[int] = None,
+    top: int = 10,
+    luxmeter: Optional[CL200A] = None,
+    log_file_path: Path = Path("./cl200a_soak.log"),
+) -> SoakReport:
+    """run_soak_test
+    Acquire many samples from an emulated meter and watch the memory.
+
+    Args:
+        samples (int, optional): samples after the warm-up. Defaults to 100000.
+        duration (Optional[float], optional): stop earlier after this many seconds.
+        Defaults to None.
+        measurement_formats (Sequence[str], optional): formats read with read_sample in
+        every step. Defaults to ("ev_x_y",).
+        step (Optional[Callable[[CL200A], Sequence[Sample]]], optional): acquisition step
+        instead of reading the formats, e.g. lambda luxmeter: luxmeter.measure(formats).
+        Defaults to None.
+        sink (Optional[Callable[[Sample], None]], optional): called with every sample,
+        to soak a sink as well. Defaults to None.
+        warmup (int, optional): samples before the first checkpoint, so caches and
+        lazily created objects are not counted as growth. Defaults to 1000.
+        checkpoints (int, optional): number of checkpoints after the warm-up.
+        Defaults to 10.
+        max_growth (int, optional): bytes allocated through Python that may be retained
+        since the warm-up. Defaults to 2**20.
+        max_rss_growth (Optional[int], optional): bytes the RSS may grow since the warm-up.
+        Also catches leaks outside Python, but is noisy. Defaults to None (not checked).
+        top (int, optional): number of source lines in top_growth. Defaults to 10.
+        luxmeter (Optional[CL200A], optional): meter to soak. Defaults to None
+        (a CL200A on a VirtualCL200A that replies at once, without settle times,
+        closed at the end).
+        log_file_path (Path, optional): log file of the default meter.
+        Defaults to Path("./cl200a_soak.log").
+
+    Returns:
+        SoakReport: report
+    """
+    created = luxmeter is None
+    if luxmeter is None:
+        luxmeter = CL200A(
+            log_file_path=log_file_path,
+            transport=VirtualCL200A(noise=0.001, seed=0, realtime=False),
+            settle_times=dict.fromkeys(("connect", "hold", "ext", "trigger"), 0.0),
+        )
+    try:
+        return _soak(
+            _Acquisition(luxmeter, step or _read_formats(measurement_formats), sink),
+            samples,
+            duration,
+            warmup,
+            checkpoints,
+            top,
+            SoakReport(
+                samples=0,
+                seconds=0.0,
+                checkpoints=(),
+                top_growth=(),
+                max_growth=max_growth,
+                max_rss_growth=max_rss_growth,
+            ),
+        )
+    finally:
+        if created:
+            # closes the VirtualCL200A transport as well
+            luxmeter.close()
@@ -0,0 +1,227 @@
+"""
+SQLite sink for sample streams.
+
+    with SqliteSink("readings.db", meter="line-3") as sink:
+        for sample in sink(luxmeter.stream("ev_x_y", period=1)):
+            ...
+
+Samples are queued and inserted by a writer thread in batched transactions, so the
+acquisition loop never waits on the disk. The database uses WAL mode, so other
+processes can query it while it is written:
+
+    SELECT time_ns, value1 FROM samples WHERE meter = 'line-3' AND time_ns >= ?
+"""
+
+import queue
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from cl200a_controller.cl200a import Sample
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    id INTEGER PRIMARY KEY,
+    meter TEXT NOT NULL,
+    head INTEGER NOT NULL,
+    format TEXT NOT NULL,
+    time_ns INTEGER NOT NULL,
+    status INTEGER NOT NULL,
+    value1 REAL,
+    value2 REAL,
+    value3 REAL,
+    trigger_ns INTEGER,
+    receive_ns INTEGER
+);
+CREATE INDEX IF NOT EXISTS samples_meter_time ON samples (meter, time_ns);
+"""
+
+INSERT = (
+    "INSERT INTO samples (meter, head, format, time_ns, status, value1, value2, value3,"
+    " trigger_ns, receive_ns) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+Row = Tuple[str, int, str, int, int, float, float, float, Optional[int], Optional[int]]
+
+
+def _row(sample: Sample, meter: str) -> Row:
+    value1, value2, value3 = sample.values
+    return (
+        meter,
+        sample.head,
+        sample.measurement_format,
+        round(sample.measured_time.timestamp() * 1e6) * 1000,
+        int(sample.status),
+        value1,
+        value2,
+        value3,
+        sample.trigger_ns or None,
+        sample.receive_ns or None,
+    )
+
+
+class SqliteSink:
+    """
+    Writes samples into the samples table of an SQLite database from a writer thread.
+    A batch is committed when it has batch_size samples or when flush_interval seconds
+    passed since its first sample. Also a pipeline stage that passes the samples on.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        meter: str = "default",
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_queued: int = 100000,
+    ) -> None:
+        """__init__
+
+        Args:
+            path (Union[str, Path]): database file. Created when missing.
+            meter (str, optional): meter name of the samples. Defaults to "default".
+            batch_size (int, optional): samples per transaction. Defaults to 500.
+            flush_interval (float, optional): maximum seconds a sample waits for its
+            transaction. Defaults to 1.0.
+            max_queued (int, optional): queued samples before write blocks.
+            Defaults to 100000.
+        """
+        self.path = Path(path)
+        self.meter = meter
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.transactions = 0
+        self._queue: "queue.Queue[Optional[Row]]" = queue.Queue(max_queued)
+        self._error: Optional[BaseException] = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sqlite-sink", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        self._raise_error()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(str(self.path), isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # with WAL, NORMAL only syncs at checkpoints and is still safe against corruption
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(SCHEMA)
+        return connection
+
+    def _run(self) -> None:
+        # pylint: disable=broad-except
+        # any failure is kept for the caller; a dead thread would leave flush, close and
+        # the constructor waiting forever
+        try:
+            connection = self._connect()
+        except Exception as exc:
+            self._error = exc
+            self._ready.set()
+            return
+        self._ready.set()
+
+        stopping = False
+        try:
+            while not stopping:
+                row = self._queue.get()
+                taken = 1
+                try:
+                    if row is None:
+                        stopping = True
+                        break
+                    batch: List[Row] = [row]
+                    deadline = time.monotonic() + self.flush_interval
+                    while len(batch) < self.batch_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        try:
+                            row = self._queue.get(timeout=remaining)
+                        except queue.Empty:
+                            break
+                        taken += 1
+                        if row is None:
+                            stopping = True
+                            break
+                        batch.append(row)
+
+                    self._commit(connection, batch)
+                finally:
+                    # also for a failed batch, or flush and close would wait forever
+                    for _ in range(taken):
+                        self._queue.task_done()
+        except Exception as exc:
+            self._error = exc
+        finally:
+            connection.close()
+
+        # after a failure, discard the samples queued until close, so flush and close return
+        while not stopping:
+            stopping = self._queue.get() is None
+            self._queue.task_done()
+
+    def _commit(self, connection: sqlite3.Connection, batch: List[Row]) -> None:
+        connection.execute("BEGIN")
+        try:
+            # one statement, prepared once and run for every row of the batch
+            connection.executemany(INSERT, batch)
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        self.written += len(batch)
+        self.transactions += 1
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise self._error
+
+    def write(self, sample: Sample, meter: Optional[str] = None) -> None:
+        """write
+        Queue a sample.
+
+        Args:
+            sample (Sample): sample
+            meter (Optional[str], optional): meter name. Defaults to None (the meter of the
+            sink).
+
+        Raises:
+            Exception: the error the writer thread failed with, e.g. sqlite3.Error.
+        """
+        self._raise_error()
+        self._queue.put(_row(sample, self.meter if meter is None else meter))
+
+    def __call__(self, samples: Iterable[Sample], meter: Optional[str] = None) -> Iterator[Sample]:
+        for sample in samples:
+            self.write(sample, meter)
+            yield sample
+
+    def flush(self) -> None:
+        """flush
+        Wait until every queued sample is committed.
+
+        Raises:
+            Exception: the error the writer thread failed with, e.g. sqlite3.Error.
+        """
+        self._queue.join()
+        self._raise_error()
+
+    def close(self) -> None:
+        """close
+        Commit the queued samples and stop the writer thread.
+
+        Raises:
+            Exception: the error the writer thread failed with, e.g. sqlite3.Error.
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
+
+    def __enter__(self) -> "SqliteSink":
+        return self
+
+    def __exit__(self, *_exc_info) -> None:
+        self.close()
@@ -0,0 +1,218 @@
+"""
+Raw serial traffic recorder and replay transport.
+
+``WireRecorder`` wraps a serial port and stores every frame written to (TX) or
+read from (RX) the CL-200A in a compact binary log. ``ReplaySerial`` reads such
+a log and behaves like the serial port, so ``CL200A`` can run without hardware.
+
+Log layout (little endian):
+
+    header: magic b"CL2W", version (uint8), wall clock at start in ns (uint64)
+    frame:  direction (uint8, 0 = TX, 1 = RX), ns since start (uint64),
+            payload length (uint16), payload
+"""
+
+import struct
+import time
+from pathlib import Path
+from typing import Any, BinaryIO, Iterator, List, NamedTuple, Optional, Union
+
+MAGIC = b"CL2W"
+VERSION = 1
+TX = 0
+RX = 1
+
+_HEADER = struct.Struct("<4sBQ")
+_FRAME = struct.Struct("<BQH")
+
+
+class WireFrame(NamedTuple):
+    direction: int
+    offset_ns: int
+    payload: bytes
+
+
+class ReplayMismatchError(Exception):
+    """raised when the replayed session writes a frame that differs from the log."""
+
+
+def read_wire_log(path: Union[str, Path]) -> Iterator[WireFrame]:
+    """read_wire_log
+    Iterate over the frames of a wire log.
+
+    Args:
+        path (Union[str, Path]): log file
+
+    Raises:
+        ValueError: when the file is not a wire log.
+
+    Yields:
+        WireFrame: recorded frames in order
+    """
+    with open(path, "rb") as file:
+        header = file.read(_HEADER.size)
+        if len(header) < _HEADER.size:
+            raise ValueError(f"{path} is not a wire log")
+        magic, version, _ = _HEADER.unpack(header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a wire log")
+
+        while True:
+            frame_header = file.read(_FRAME.size)
+            if len(frame_header) < _FRAME.size:
+                return
+            direction, offset_ns, length = _FRAME.unpack(frame_header)
+            yield WireFrame(direction, offset_ns, file.read(length))
+
+
+class WireRecorder:
+    """
+    Serial port wrapper that records all traffic into a wire log.
+    Every attribute that is not overridden here is taken from and set on the wrapped port,
+    e.g. timeout.
+    """
+
+    def __init__(self, ser: Any, path: Union[str, Path]) -> None:
+        """__init__
+
+        Args:
+            ser (Any): serial port object to wrap
+            path (Union[str, Path]): log file to create
+        """
+        self._ser = ser
+        self._file: BinaryIO = open(path, "wb")  # pylint: disable=consider-using-with
+        self._start_ns = time.monotonic_ns()
+        self._file.write(_HEADER.pack(MAGIC, VERSION, time.time_ns()))
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._ser, name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name.startswith("_"):
+            super().__setattr__(name, value)
+        else:
+            setattr(self._ser, name, value)
+
+    def _record(self, direction: int, payload: bytes) -> None:
+        offset_ns = time.monotonic_ns() - self._start_ns
+        self._file.write(_FRAME.pack(direction, offset_ns, len(payload)) + payload)
+
+    def write(self, data: bytes) -> Optional[int]:
+        self._record(TX, data)
+        return self._ser.write(data)
+
+    def readline(self, *args, **kwargs) -> bytes:
+        data = self._ser.readline(*args, **kwargs)
+        if data:
+            self._record(RX, data)
+        return data
+
+    def read_until(self, *args, **kwargs) -> bytes:
+        data = self._ser.read_until(*args, **kwargs)
+        if data:
+            self._record(RX, data)
+        return data
+
+    def read(self, size: int = 1) -> bytes:
+        data = self._ser.read(size)
+        if data:
+            self._record(RX, data)
+        return data
+
+    def flush_log(self) -> None:
+        self._file.flush()
+
+    def close_log(self) -> None:
+        self._file.close()
+
+    def close(self) -> None:
+        self.close_log()
+        self._ser.close()
+
+
+class ReplaySerial:
+    """
+    Serial port stand-in that replays the RX frames of a wire log.
+
+    Every write moves the replay to the next TX frame of the log, and reads return
+    the RX frames that followed it. With ``realtime=True`` replies are delayed by the
+    recorded TX to RX latency, otherwise they are returned immediately.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        realtime: bool = False,
+        strict: bool = False,
+        loop: bool = False,
+    ) -> None:
+        """__init__
+
+        Args:
+            path (Union[str, Path]): wire log to replay
+            realtime (bool, optional): reproduce the recorded reply latency. Defaults to False.
+            strict (bool, optional): raise ReplayMismatchError when a written frame
+            differs from the recorded one. Defaults to False.
+            loop (bool, optional): start over when the log is exhausted. Defaults to False.
+        """
+        self.port = str(path)
+        self.realtime = realtime
+        self.strict = strict
+        self.loop = loop
+        self.timeout: Optional[float] = None
+        self.is_open = True
+        self._frames: List[WireFrame] = list(read_wire_log(path))
+        self._index = 0
+        self._last_tx: Optional[WireFrame] = None
+        self._last_tx_at = 0
+
+    def write(self, data: bytes) -> int:
+        while True:
+            while self._index < len(self._frames) and self._frames[self._index].direction != TX:
+                self._index += 1
+            if self._index < len(self._frames):
+                break
+            if not self.loop or self._last_tx is None:
+                raise EOFError("End of the wire log")
+            self._index = 0
+
+        frame = self._frames[self._index]
+        if self.strict and frame.payload != data:
+            raise ReplayMismatchError(f"Expected {frame.payload!r}, got {data!r}")
+        self._index += 1
+        self._last_tx = frame
+        self._last_tx_at = time.monotonic_ns()
+        return len(data)
+
+    def readline(self, *_args, **_kwargs) -> bytes:
+        if self._index >= len(self._frames) or self._frames[self._index].direction != RX:
+            return b""
+
+        frame = self._frames[self._index]
+        self._index += 1
+        if self.realtime and self._last_tx is not None:
+            latency_ns = frame.offset_ns - self._last_tx.offset_ns
+            remaining_ns = latency_ns - (time.monotonic_ns() - self._last_tx_at)
+            if remaining_ns > 0:
+                time.sleep(remaining_ns / 1e9)
+        return frame.payload
+
+    read_until = readline
+
+    def reset_input_buffer(self) -> None:
+        pass
+
+    def reset_output_buffer(self) -> None:
+        pass
+
+    flushInput = reset_input_buffer
+    flushOutput = reset_output_buffer
+
+    def open(self) -> None:
+        self.is_open = True
+
+    def isOpen(self) -> bool:  # pylint: disable=invalid-name
+        return self.is_open
+
+    def close(self) -> None:
+        self.is_open = False
@@ -0,0 +1,45 @@
+"""
+Import-time benchmark.
+
+    python experiments/exp_import_time.py
+    python experiments/exp_import_time.py --statement "from cl200a_controller import CL200A"
+
+Each run uses a fresh interpreter, so nothing is cached in sys.modules.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+
+def measure_import_time(statement: str, runs: int) -> list:
+    baseline = []
+    results = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        baseline.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        subprocess.run([sys.executable, "-c", statement], check=True)
+        results.append(time.perf_counter() - started)
+    interpreter = statistics.median(baseline)
+    return [result - interpreter for result in results]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--statement", default="import cl200a_controller")
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    results = measure_import_time(args.statement, args.runs)
+    print(f"{args.statement}")
+    print(f"median: {statistics.median(results) * 1000:.2f} ms over the bare interpreter")
+    print(f"min:    {min(results) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
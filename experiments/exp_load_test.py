@@ -0,0 +1,45 @@
+"""
+Scale test with many emulated meters.
+
+    python experiments/exp_load_test.py --meters 200 --duration 60
+    python experiments/exp_load_test.py --meters 100 --drop-rate 0.001 --sqlite /tmp/load.db
+
+Reports throughput, reply latency percentiles, CPU use and memory growth.
+"""
+
+import argparse
+
+from cl200a_controller.loadtest import run_load_test
+from cl200a_controller.sqlite_sink import SqliteSink
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--meters", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--formats", nargs="+", default=["ev_x_y"])
+    parser.add_argument("--latency", type=float, default=0.01)
+    parser.add_argument("--settle-time", type=float, default=0.02)
+    parser.add_argument("--drop-rate", type=float, default=0.0)
+    parser.add_argument("--sqlite", default=None, help="also write every sample to this database")
+    args = parser.parse_args()
+
+    sink = SqliteSink(args.sqlite, meter="load-test") if args.sqlite else None
+    try:
+        report = run_load_test(
+            meters=args.meters,
+            duration=args.duration,
+            measurement_formats=args.formats,
+            latency=args.latency,
+            settle_time=args.settle_time,
+            drop_rate=args.drop_rate,
+            sink=sink.write if sink else None,
+        )
+    finally:
+        if sink:
+            sink.close()
+    print(report.format())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Soak test for slow memory leaks.
+
+    python experiments/exp_soak_test.py --samples 1000000
+    python experiments/exp_soak_test.py --samples 200000 --sqlite /tmp/soak.db
+
+Exits with status 1 when the memory grew past the threshold.
+"""
+
+import argparse
+import sys
+
+from cl200a_controller.soak import run_soak_test
+from cl200a_controller.sqlite_sink import SqliteSink
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--samples", type=int, default=100000)
+    parser.add_argument("--duration", type=float, default=None)
+    parser.add_argument("--formats", nargs="+", default=["ev_x_y"])
+    parser.add_argument("--max-growth", type=int, default=2**20, help="bytes")
+    parser.add_argument("--max-rss-growth", type=int, default=None, help="bytes")
+    parser.add_argument("--sqlite", default=None, help="also write every sample to this database")
+    args = parser.parse_args()
+
+    sink = SqliteSink(args.sqlite, meter="soak-test") if args.sqlite else None
+    try:
+        report = run_soak_test(
+            samples=args.samples,
+            duration=args.duration,
+            measurement_formats=args.formats,
+            sink=sink.write if sink else None,
+            max_growth=args.max_growth,
+            max_rss_growth=args.max_rss_growth,
+        )
+    finally:
+        if sink:
+            sink.close()
+    print(report.format())
+    sys.exit(0 if report.passed else 1)
+
+
+if __name__ == "__main__":
+    main()
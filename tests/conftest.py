@@ -1,6 +1,33 @@
+from datetime import datetime, timedelta
+
 import pytest
 
+from cl200a_controller.cl200a import Sample
+
+START = datetime(2022, 8, 1, 12, 0, 0)
+
+
+def make_sample(ev=500.0, index=0, step=timedelta(seconds=1), **fields):
+    """
+    ev_x_y sample of a D65 light with illuminance ev, taken index steps after START.
+    Keyword arguments replace the other fields, e.g. head, status or values.
+    """
+    fields.setdefault("measurement_format", "ev_x_y")
+    fields.setdefault("values", (ev, 0.3127, 0.329))
+    fields.setdefault("measured_time", START + index * step)
+    return Sample(**fields)
+
+
+def make_samples(evs, step=timedelta(seconds=1), **fields):
+    """one sample of make_sample per illuminance, step apart"""
+    return [make_sample(ev, index, step, **fields) for index, ev in enumerate(evs)]
+
 
 @pytest.fixture(scope="session")
 def log_file_path(tmp_path_factory):
     return tmp_path_factory.mktemp("test") / "test.log"
+
+
+@pytest.fixture()
+def no_sleep(mocker):
+    mocker.patch("cl200a_controller.cl200a_utils.sleep", return_value=None)
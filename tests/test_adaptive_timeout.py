@@ -0,0 +1,115 @@
+import time
+
+import pytest
+
+from cl200a_controller import CL200A
+from cl200a_controller.adaptive_timeout import AdaptiveTimeout
+from cl200a_controller.emulator import VirtualCL200A
+
+
+class TimeoutTrackingEmulator(VirtualCL200A):
+    """emulator that records every timeout set on the port"""
+
+    def __init__(self, *args, **kwargs):
+        self.timeouts_set = []
+        super().__init__(*args, **kwargs)
+
+    def __setattr__(self, name, value):
+        if name == "timeout":
+            self.timeouts_set.append(value)
+        super().__setattr__(name, value)
+
+
+# pylint: disable=unused-argument
+class TestAdaptiveTimeout:
+    def test_initial_timeout(self):
+        assert AdaptiveTimeout(ceiling=3.0).timeout == 3.0
+        assert AdaptiveTimeout(initial=0.5).timeout == 0.5
+
+    def test_adapts_to_latency(self):
+        read_timeout = AdaptiveTimeout(floor=0.01, ceiling=3.0, min_observations=10)
+        for i in range(100):
+            read_timeout.observe(0.030 if i < 99 else 0.050)
+        assert read_timeout.latency_percentile() == 0.030
+        assert read_timeout.timeout == pytest.approx(0.060)
+
+        read_timeout.percentile = 1.0
+        assert read_timeout.timeout == pytest.approx(0.100)
+
+    def test_window(self):
+        read_timeout = AdaptiveTimeout(percentile=1.0, window=3)
+        for latency in (0.5, 0.1, 0.2, 0.3):
+            read_timeout.observe(latency)
+        assert read_timeout.latency_percentile() == 0.3
+        read_timeout.observe(0.1)
+        read_timeout.observe(0.1)
+        assert read_timeout.latency_percentile() == 0.3
+        read_timeout.observe(0.1)
+        assert read_timeout.latency_percentile() == 0.1
+
+    def test_floor_and_ceiling(self):
+        read_timeout = AdaptiveTimeout(floor=0.05, ceiling=0.2, min_observations=1)
+        read_timeout.observe(0.001)
+        assert read_timeout.timeout == 0.05
+        read_timeout.observe(10)
+        read_timeout.percentile = 1.0
+        assert read_timeout.timeout == 0.2
+
+    def test_timeouts_back_off(self):
+        read_timeout = AdaptiveTimeout(floor=0.01, ceiling=1.0, min_observations=1)
+        read_timeout.observe(0.05)
+        read_timeout.timed_out()
+        assert read_timeout.timeout == pytest.approx(0.2)
+        read_timeout.timed_out()
+        assert read_timeout.timeout == pytest.approx(0.4)
+        read_timeout.observe(0.05)
+        assert read_timeout.timeout == pytest.approx(0.1)
+        assert read_timeout.timeouts == 2
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            AdaptiveTimeout(floor=2, ceiling=1)
+        with pytest.raises(ValueError):
+            AdaptiveTimeout(percentile=0)
+
+    @pytest.mark.parametrize("recorded", [False, True])
+    def test_hung_link_is_detected_quickly(self, log_file_path, no_sleep, tmp_path, recorded):
+        emulator = VirtualCL200A(latency=0.005)
+        read_timeout = AdaptiveTimeout(floor=0.02, ceiling=3.0, min_observations=5)
+        cl200a = CL200A(
+            log_file_path=log_file_path,
+            transport=emulator,
+            read_timeout=read_timeout,
+            record_path=tmp_path / "session.cl2w" if recorded else None,
+        )
+        for _ in range(5):
+            cl200a.get_ev_x_y()
+        assert read_timeout.timeout < 0.2
+
+        emulator.faults.drop_rate = 1.0
+        emulator.faults.hang_on_empty = True
+        started = time.monotonic()
+        with pytest.raises(ConnectionAbortedError):
+            cl200a.get_ev_x_y()
+        assert time.monotonic() - started < 0.5
+        assert read_timeout.timeouts == 1
+
+    def test_deadline_stays_on_the_port(self, log_file_path, no_sleep, mocker):
+        emulator = TimeoutTrackingEmulator(realtime=False)
+        read_timeout = AdaptiveTimeout(floor=0.02, ceiling=3.0, min_observations=5)
+        cl200a = CL200A(log_file_path=log_file_path, transport=emulator, read_timeout=read_timeout)
+        emulator.timeouts_set.clear()
+        for _ in range(100):
+            cl200a.get_ev_x_y()
+        # the deadline is learned once and then kept between reads
+        assert emulator.timeouts_set == [0.02]
+
+        port_timeouts = []
+        mocker.patch(
+            "cl200a_controller.cl200a.calibrate_settle_times",
+            side_effect=lambda ser, **kwargs: port_timeouts.append(ser.timeout) or {},
+        )
+        cl200a.calibrate_settle_times()
+        # the handshake runs with the timeout of the port
+        assert port_timeouts == [3]
+        assert emulator.timeout == 0.02
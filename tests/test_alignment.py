@@ -0,0 +1,143 @@
+import math
+import threading
+from datetime import datetime
+
+import pytest
+
+from cl200a_controller import CL200A
+from cl200a_controller.alignment import (
+    FleetSynchronizer,
+    LatencyEstimator,
+    align,
+    resample,
+    trigger_transmission_time,
+)
+from cl200a_controller.cl200a_utils import LowLuminanceError
+from cl200a_controller.emulator import VirtualCL200A
+from tests.conftest import make_sample
+
+START_NS = 1_660_000_000 * 10**9
+
+
+# pylint: disable=unused-argument
+class TestLatencyEstimator:
+    def test_acquisition_time(self):
+        estimator = LatencyEstimator(acquisition_offset=0.01)
+        sample = make_sample(500, trigger_ns=START_NS, receive_ns=START_NS + 80 * 10**6)
+        estimator.observe(sample)
+        assert estimator.acquisition_ns(sample) == START_NS + 10**7
+        assert estimator.reply_latency.mean == pytest.approx(0.08)
+
+        # without a trigger time, the mean reply latency is subtracted from the receive time
+        late = make_sample(500, receive_ns=START_NS + 10**9)
+        assert estimator.acquisition_ns(late) == START_NS + 10**9 - 8 * 10**7 + 10**7
+
+        unknown = make_sample(500)
+        assert estimator.acquisition_ns(unknown) == pytest.approx(
+            unknown.measured_time.timestamp() * 1e9, abs=1e3
+        )
+
+    def test_default_offset(self):
+        assert trigger_transmission_time(9600) == pytest.approx(14 * 10 / 9600)
+        assert LatencyEstimator().acquisition_offset_ns == round(14 * 10 / 9600 * 1e9)
+
+    def test_samples_have_timestamps(self, log_file_path, no_sleep):
+        cl200a = CL200A(log_file_path=log_file_path, transport=VirtualCL200A(latency=0.01))
+        samples = cl200a.measure()
+        assert len(samples) == 1
+        sample = samples[0]
+        assert 0 < sample.trigger_ns < sample.receive_ns
+        assert cl200a.read_sample("ev_x_y").receive_ns > sample.receive_ns
+
+        (corrected,) = list(LatencyEstimator(acquisition_offset=0)([sample]))
+        assert corrected.measured_time == datetime.fromtimestamp(sample.trigger_ns / 1e9)
+
+
+class TestResample:
+    def test_resample(self):
+        numpy = pytest.importorskip("numpy")
+        times_ns = numpy.array([0, 10, 20]) + START_NS
+        values = numpy.array([[0.0, 1.0], [10.0, numpy.nan], [20.0, 3.0]])
+        grid_ns = numpy.array([-5, 0, 5, 15, 20, 25]) + START_NS
+        result = resample(times_ns, values, grid_ns)
+        assert numpy.isnan(result[0]).all() and numpy.isnan(result[5]).all()
+        assert result[1:5, 0].tolist() == [0.0, 5.0, 15.0, 20.0]
+        assert result[1:5, 1].tolist() == [1.0, 1.5, 2.5, 3.0]
+
+    def test_align(self):
+        numpy = pytest.importorskip("numpy")
+        samples = [
+            make_sample(
+                float(i), trigger_ns=START_NS + i * 10**9, receive_ns=START_NS + i * 10**9 + 1
+            )
+            for i in range(10)
+        ]
+        power = (numpy.arange(2, 20) * 5 * 10**8 + START_NS, numpy.arange(2, 20) * 0.5)
+        grid_ns, values = align(
+            {"meter": samples, "power": power},
+            period=1.0,
+            estimator=LatencyEstimator(acquisition_offset=0),
+        )
+        assert grid_ns.tolist() == [START_NS + i * 10**9 for i in range(1, 10)]
+        assert values["meter"][:, 0].tolist() == list(range(1, 10))
+        assert values["power"].tolist() == list(range(1, 10))
+        assert not math.isnan(values["meter"][0, 1])
+
+
+class TestFleetSynchronizer:
+    def test_measure(self, log_file_path, no_sleep):
+        meters = {
+            name: CL200A(log_file_path=log_file_path, transport=VirtualCL200A(ev=ev))
+            for name, ev in (("a", 100), ("b", 200), ("c", 300))
+        }
+        with FleetSynchronizer(meters, measurement_formats=("ev_x_y", "x_y_z")) as fleet:
+            for _ in range(3):
+                cycle = fleet.measure()
+                assert sorted(cycle) == ["a", "b", "c"]
+                assert [cycle[name][0].values[0] for name in "abc"] == [100, 200, 300]
+                assert len(cycle["a"]) == 2
+                assert fleet.last_skew_ns < 10**8
+
+    def test_errors(self, log_file_path, no_sleep):
+        emulator = VirtualCL200A()
+        meters = {"a": CL200A(log_file_path=log_file_path, transport=emulator)}
+        emulator.faults.drop_rate = 1.0
+        with FleetSynchronizer(meters) as fleet:
+            with pytest.raises(ConnectionAbortedError):
+                fleet.measure()
+            emulator.faults.drop_rate = 0.0
+            assert fleet.measure()["a"][0].values[0] == 500
+
+    def test_measurement_error(self, log_file_path, no_sleep):
+        flagged = VirtualCL200A()
+        meters = {
+            "a": CL200A(log_file_path=log_file_path, transport=flagged),
+            "b": CL200A(log_file_path=log_file_path, transport=VirtualCL200A(ev=200)),
+        }
+        flagged.faults.error_byte = "6"
+        with FleetSynchronizer(meters, timeout=5.0, raise_errors=False) as fleet:
+            cycle = fleet.measure()
+            assert sorted(cycle) == ["b"]
+            assert isinstance(fleet.last_errors["a"], LowLuminanceError)
+            flagged.faults.error_byte = " "
+            cycle = fleet.measure()
+            assert sorted(cycle) == ["a", "b"]
+            assert not fleet.last_errors
+            fleet.raise_errors = True
+            flagged.faults.error_byte = "6"
+            with pytest.raises(LowLuminanceError):
+                fleet.measure()
+
+    def test_timeout_recovers(self, log_file_path, no_sleep):
+        slow = VirtualCL200A(latency=0.3)
+        meters = {
+            "fast": CL200A(log_file_path=log_file_path, transport=VirtualCL200A()),
+            "slow": CL200A(log_file_path=log_file_path, transport=slow),
+        }
+        with FleetSynchronizer(meters, timeout=0.1) as fleet:
+            with pytest.raises(threading.BrokenBarrierError):
+                fleet.measure()
+            slow.timing.latency = 0.0
+            fleet.timeout = 5.0
+            for _ in range(2):
+                assert sorted(fleet.measure()) == ["fast", "slow"]
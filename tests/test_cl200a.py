@@ -1,4 +1,6 @@
 import logging
+import math
+import threading
 from datetime import datetime
 
 import pytest
@@ -6,6 +8,13 @@ from serial import SerialException
 from testfixtures import LogCapture
 
 from cl200a_controller import CL200A
+from cl200a_controller.cl200a_utils import (
+    LowBatteryError,
+    LowLuminanceError,
+    MeasurementStatus,
+    MeasurementValueOverError,
+)
+from cl200a_controller.emulator import VirtualCL200A
 from cl200a_controller.logger import Logger
 
 
@@ -145,6 +154,24 @@ class TestCL200A:
             return_value=None,
         )
 
+    def test_init_explicit_port(self, log_file_path, mocker):
+        find_all_luxmeters = mocker.patch(
+            "cl200a_controller.serial_utils.SerialUtils.find_all_luxmeters",
+            return_value=["/dev/ttyUSB0"],
+        )
+        connect_serial_port = mocker.patch(
+            "cl200a_controller.cl200a_utils.CL200Utils.connect_serial_port",
+            return_value=None,
+        )
+        mocker.patch("cl200a_controller.cl200a.CL200A._connection", return_value=None)
+        mocker.patch("cl200a_controller.cl200a.CL200A._hold_mode", return_value=None)
+        mocker.patch("cl200a_controller.cl200a.CL200A._ext_mode", return_value=None)
+
+        cl200a = CL200A(log_file_path=log_file_path, port="socket://localhost:4001")
+        assert cl200a.port == "socket://localhost:4001"
+        assert find_all_luxmeters.called is False
+        assert connect_serial_port.call_args[0][0] == "socket://localhost:4001"
+
     def test_connect(self, log_file_path, mocker):
         mocker.patch(
             "cl200a_controller.serial_utils.SerialUtils.find_all_luxmeters",
@@ -418,3 +445,245 @@ class TestCL200A:
         _ = cl200a_debug.get_ev_tcp_delta_uv()
         assert mock_logger.records[0].levelname == "DEBUG"
         mock_logger.clear()
+
+    def test_get_measurement(self, cl200a_init_mock, mocker):
+        mocker.patch(
+            "cl200a_controller.cl200a.CL200A._perform_measurement",
+            return_value=("\x0200031 10+ 2723+24270+54070\x031A\r\n", datetime.now()),
+        )
+        ev, u, v, measured_time = cl200a_init_mock.get_measurement("ev_u_v")
+        assert (ev, u, v) == (27.2, 0.243, 0.541)
+        assert isinstance(measured_time, datetime)
+
+        with pytest.raises(ValueError):
+            cl200a_init_mock.get_measurement("unknown")
+
+    @pytest.mark.usefixtures("no_sleep")
+    def test_measure_averaged(self, log_file_path):
+        stable = CL200A(log_file_path=log_file_path, transport=VirtualCL200A(ev=500))
+        result = stable.measure_averaged("ev_x_y", max_samples=20, min_samples=3)
+        assert result.samples == 3
+        assert result.values[0] == 500
+        assert result.variances[0] == 0
+
+        noisy = CL200A(
+            log_file_path=log_file_path, transport=VirtualCL200A(ev=500, noise=0.05, seed=1)
+        )
+        result = noisy.measure_averaged(
+            "ev_x_y", max_samples=20, target_rel_stderr=0.001, check_values=(0,)
+        )
+        assert result.samples == 20
+        assert result.values[0] == pytest.approx(500, rel=0.05)
+        assert result.variances[0] > 0
+
+    def test_measure_averaged_low_luminance(self, cl200a_init_mock, mocker):
+        mocker.patch(
+            "cl200a_controller.cl200a.CL200A.get_measurement",
+            side_effect=[LowLuminanceError(), (1.0, 0.3, 0.3, datetime.now())]
+            + [LowLuminanceError()] * 2,
+        )
+        result = cl200a_init_mock.measure_averaged(max_samples=4)
+        assert result.samples == 1
+        assert result.rejected == 3
+
+        mocker.patch(
+            "cl200a_controller.cl200a.CL200A.get_measurement",
+            side_effect=LowLuminanceError(),
+        )
+        with pytest.raises(LowLuminanceError):
+            cl200a_init_mock.measure_averaged(max_samples=2)
+
+    @pytest.mark.usefixtures("no_sleep")
+    def test_measure_averaged_rejects_flagged_samples(self, log_file_path, mocker):
+        emulator = VirtualCL200A(ev=500)
+        cl200a = CL200A(log_file_path=log_file_path, transport=emulator, raise_on_error=False)
+        error_bytes = iter(["5", "7", "6"])
+        measure = emulator._measure  # pylint: disable=protected-access
+
+        def flagged_measure():
+            emulator.faults.error_byte = next(error_bytes, " ")
+            measure()
+
+        mocker.patch.object(emulator, "_measure", side_effect=flagged_measure)
+        result = cl200a.measure_averaged("ev_x_y", max_samples=10, min_samples=3)
+        assert (result.samples, result.rejected) == (3, 3)
+        assert result.values[0] == 500
+
+    def test_measure_averaged_rejects_undecodable_values(self, cl200a_init_mock, mocker):
+        mocker.patch(
+            "cl200a_controller.cl200a.CL200A.get_measurement",
+            side_effect=[(math.nan, 0.3, 0.3, datetime.now())]
+            + [(1.0, 0.3, 0.3, datetime.now())] * 3,
+        )
+        result = cl200a_init_mock.measure_averaged(max_samples=4, min_samples=3)
+        assert (result.samples, result.rejected) == (3, 1)
+        assert result.values[0] == 1.0
+
+    @pytest.mark.usefixtures("no_sleep")
+    def test_read_sample_status_flags(self, log_file_path):
+        emulator = VirtualCL200A(ev=500)
+        cl200a = CL200A(log_file_path=log_file_path, transport=emulator, raise_on_error=False)
+
+        sample = cl200a.read_sample("ev_x_y")
+        assert sample.measurement_format == "ev_x_y"
+        assert sample.values[0] == 500
+        assert sample.status == MeasurementStatus.OK
+
+        emulator.faults.error_byte = "6"
+        emulator.faults.battery_byte = "1"
+        sample = cl200a.read_sample("ev_u_v")
+        assert sample.status == MeasurementStatus.LOW_LUMINANCE | MeasurementStatus.LOW_BATTERY
+        assert cl200a.get_ev_x_y()[0] == 500
+        assert cl200a.last_status & MeasurementStatus.LOW_BATTERY
+
+        cl200a.raise_on_error = True
+        with pytest.raises(LowLuminanceError):
+            cl200a.read_sample("ev_x_y")
+
+        emulator.faults.error_byte = " "
+        with pytest.raises(LowBatteryError):
+            cl200a.get_ev_x_y()
+
+    def test_read_sample_device_error(self, cl200a_init_mock, mocker):
+        cl200a_init_mock.raise_on_error = False
+        mocker.patch.object(cl200a_init_mock, "ser")
+        cl200a_init_mock.ser.readline.return_value = b"\x0200021210+ 2733+45450+44990\x031F\r\n"
+        mocker.patch("cl200a_controller.cl200a_utils.CL200Utils.write_serial_port")
+        with pytest.raises(ConnectionResetError):
+            cl200a_init_mock.read_sample("ev_x_y")
+
+    def test_read_sample_undecodable_values(self, cl200a_init_mock, mocker):
+        cl200a_init_mock.raise_on_error = False
+        mocker.patch.object(cl200a_init_mock, "ser")
+        cl200a_init_mock.ser.readline.return_value = b"\x0200021510+    +    +    \x031F\r\n"
+        mocker.patch("cl200a_controller.cl200a_utils.CL200Utils.write_serial_port")
+        sample = cl200a_init_mock.read_sample("ev_x_y")
+        assert sample.status == MeasurementStatus.VALUE_OVER
+        assert all(math.isnan(value) for value in sample.values)
+
+    @pytest.mark.parametrize(
+        "getter",
+        [
+            lambda cl200a: cl200a.get_ev_x_y(),
+            lambda cl200a: cl200a.get_x_y_z(),
+            lambda cl200a: cl200a.get_ev_u_v(),
+            lambda cl200a: cl200a.get_ev_tcp_delta_uv(),
+            lambda cl200a: cl200a.get_measurement("ev_x_y"),
+        ],
+    )
+    def test_getters_undecodable_values(self, cl200a_init_mock, mocker, getter):
+        cl200a_init_mock.raise_on_error = False
+        mocker.patch.object(cl200a_init_mock, "ser")
+        cl200a_init_mock.ser.readline.return_value = b"\x0200021510+    +    +    \x031F\r\n"
+        mocker.patch("cl200a_controller.cl200a_utils.CL200Utils.write_serial_port")
+        *values, _ = getter(cl200a_init_mock)
+        assert all(math.isnan(value) for value in values)
+        assert cl200a_init_mock.last_status == MeasurementStatus.VALUE_OVER
+
+        cl200a_init_mock.raise_on_error = True
+        with pytest.raises(MeasurementValueOverError):
+            getter(cl200a_init_mock)
+
+    @pytest.mark.usefixtures("no_sleep")
+    def test_last_status_is_per_thread(self, log_file_path):
+        emulator = VirtualCL200A()
+        cl200a = CL200A(log_file_path=log_file_path, transport=emulator, raise_on_error=False)
+        emulator.faults.error_byte = "6"
+        assert cl200a.read_sample("ev_x_y").status == MeasurementStatus.LOW_LUMINANCE
+
+        emulator.faults.error_byte = " "
+        other = threading.Thread(target=cl200a.read_sample, args=("ev_x_y",))
+        other.start()
+        other.join()
+        # the OK reading of the other thread does not replace the status of this one
+        assert cl200a.last_status == MeasurementStatus.LOW_LUMINANCE
+
+    @pytest.mark.usefixtures("no_sleep")
+    def test_measure(self, log_file_path):
+        emulator = VirtualCL200A(ev=500, heads=2)
+        cl200a = CL200A(log_file_path=log_file_path, transport=emulator)
+        received = emulator.commands_received
+
+        samples = cl200a.measure(("ev_x_y", "ev_u_v"), heads=(0, 1))
+        assert [(sample.head, sample.measurement_format) for sample in samples] == [
+            (0, "ev_x_y"),
+            (0, "ev_u_v"),
+            (1, "ev_x_y"),
+            (1, "ev_u_v"),
+        ]
+        assert all(sample.values[0] == 500 for sample in samples)
+        assert emulator.commands_received - received == 1 + 4
+
+        with pytest.raises(ValueError):
+            cl200a.measure(("unknown",))
+
+    @pytest.mark.usefixtures("no_sleep")
+    def test_max_age(self, log_file_path):
+        emulator = VirtualCL200A(ev=500)
+        cl200a = CL200A(log_file_path=log_file_path, transport=emulator)
+        first = cl200a.get_ev_x_y()
+        received = emulator.commands_received
+
+        emulator.set_light(600)
+        assert cl200a.get_ev_x_y(max_age=60) == first
+        assert cl200a.get_measurement("ev_x_y", max_age=60) == first
+        assert cl200a.read_sample("ev_x_y", max_age=60).values == first[:3]
+        assert emulator.commands_received == received
+
+        assert cl200a.get_ev_x_y(max_age=0)[0] == 600
+        assert cl200a.get_ev_x_y()[0] == 600
+        assert emulator.commands_received == received + 4
+
+    @pytest.mark.usefixtures("no_sleep")
+    def test_measure_max_age_fetches_missing_formats(self, log_file_path):
+        emulator = VirtualCL200A(ev=500)
+        cl200a = CL200A(log_file_path=log_file_path, transport=emulator)
+        cl200a.measure(("ev_x_y",))
+        received = emulator.commands_received
+
+        samples = cl200a.measure(("ev_x_y", "x_y_z", "ev_u_v"), max_age=60)
+        assert [sample.measurement_format for sample in samples] == ["ev_x_y", "x_y_z", "ev_u_v"]
+        # one trigger and two reads: ev_x_y came from the cache
+        assert emulator.commands_received - received == 3
+
+        received = emulator.commands_received
+        cl200a.measure(("ev_x_y", "x_y_z", "ev_u_v"), max_age=60)
+        assert cl200a.get_ev_u_v(max_age=60) == (*samples[2].values, samples[2].measured_time)
+        assert emulator.commands_received == received
+
+    @pytest.mark.usefixtures("no_sleep")
+    def test_stream_interleaved_spreads_slow_formats(self, log_file_path):
+        emulator = VirtualCL200A(ev=500)
+        cl200a = CL200A(log_file_path=log_file_path, transport=emulator)
+        received = emulator.commands_received
+
+        samples = list(
+            cl200a.stream_interleaved({"ev_x_y": math.inf, "x_y_z": 1e-3, "ev_u_v": 1e-3}, count=3)
+        )
+        assert [sample.measurement_format for sample in samples] == [
+            "ev_x_y",
+            "x_y_z",
+            "ev_x_y",
+            "ev_u_v",
+            "ev_x_y",
+        ]
+        # one trigger per cycle
+        assert emulator.commands_received - received == 3 + 5
+
+    @pytest.mark.usefixtures("no_sleep")
+    def test_stream_interleaved_rates(self, log_file_path):
+        emulator = VirtualCL200A(ev=500, realtime=False)
+        cl200a = CL200A(log_file_path=log_file_path, transport=emulator)
+
+        samples = list(cl200a.stream_interleaved({"ev_x_y": 200, "x_y_z": 40}, duration=0.5))
+        fast = sum(sample.measurement_format == "ev_x_y" for sample in samples)
+        slow = sum(sample.measurement_format == "x_y_z" for sample in samples)
+        assert 60 <= fast <= 101
+        assert 3 <= fast / slow <= 7
+
+    @pytest.mark.usefixtures("no_sleep")
+    def test_stream_interleaved_invalid(self, log_file_path):
+        cl200a = CL200A(log_file_path=log_file_path, transport=VirtualCL200A())
+        for rates in ({}, {"unknown": 1}, {"ev_x_y": 0}):
+            with pytest.raises(ValueError):
+                next(cl200a.stream_interleaved(rates))
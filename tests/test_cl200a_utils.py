@@ -5,6 +5,7 @@ from cl200a_controller.cl200a_utils import (
     CL200Utils,
     LowBatteryError,
     LowLuminanceError,
+    MeasurementStatus,
     MeasurementValueOverError,
     ValueOutOfRangeError,
 )
@@ -49,9 +50,7 @@ class TestCL200Utils:
             CL200Utils.connect_luxmeter(ser=mock_connect_serial_port)
 
     def test_connect_serial_port(self, mock_connect_serial_port, mocker):
-        mocker.patch(
-            "cl200a_controller.cl200a_utils.Serial", return_value=mock_connect_serial_port
-        )
+        mocker.patch("serial.Serial", return_value=mock_connect_serial_port)
         ser = CL200Utils.connect_serial_port(port="COM1")
         assert isinstance(ser, mocker.Mock)
 
@@ -136,3 +135,45 @@ class TestCL200Utils:
 
         CL200Utils._clean_obj_port(obj_port=mock_connect_serial_port)
         assert mock_connect_serial_port.open.called is True
+
+    def test_connect_serial_port_url(self, mock_connect_serial_port, mocker):
+        serial_for_url = mocker.patch(
+            "serial.serial_for_url", return_value=mock_connect_serial_port
+        )
+        ser = CL200Utils.connect_serial_port(port="socket://localhost:4001")
+        assert ser is mock_connect_serial_port
+        assert serial_for_url.call_args[0][0] == "socket://localhost:4001"
+        assert mock_connect_serial_port.close.called is False
+
+    def test_extract_values(self):
+        result = "\x0200021 10+ 2733+45450+44990\x031F\r\n"
+        assert CL200Utils.extract_values(result, "ev_x_y") == (27.3, 0.455, 0.45)
+
+        with pytest.raises(ValueError):
+            CL200Utils.extract_values(result, "x_y_z")
+        with pytest.raises(ValueError):
+            CL200Utils.extract_values(result, "unknown")
+
+    @pytest.mark.parametrize(
+        "result, status",
+        [
+            ("xxxxxx xxxxxx", MeasurementStatus.OK),
+            ("xxxxxx4xxxxxx", MeasurementStatus.OK),
+            ("xxxxxx2xxxxxx", MeasurementStatus.DEVICE_ERROR),
+            ("xxxxxx5xxxxxx", MeasurementStatus.VALUE_OVER),
+            ("xxxxxx6xxxxxx", MeasurementStatus.LOW_LUMINANCE),
+            ("xxxxxx7x1xxxx", MeasurementStatus.OUT_OF_RANGE | MeasurementStatus.LOW_BATTERY),
+        ],
+    )
+    def test_decode_status(self, result, status):
+        assert CL200Utils.decode_status(result) == status
+
+    def test_read_frame(self):
+        assert CL200Utils.read_frame("ev_x_y") == CL200Utils.cmd_formatter("00021200")
+        assert CL200Utils.read_frame("x_y_z", head=12) == CL200Utils.cmd_formatter("12011200")
+        assert CL200Utils.read_frame("x_y_z", head=12) is CL200Utils.read_frame("x_y_z", head=12)
+
+        with pytest.raises(ValueError):
+            CL200Utils.read_frame("unknown")
+        with pytest.raises(ValueError):
+            CL200Utils.read_frame("ev_x_y", head=30)
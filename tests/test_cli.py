@@ -0,0 +1,99 @@
+import csv
+import io
+import json
+
+import pytest
+from serial import SerialException
+
+from cl200a_controller import CL200A
+from cl200a_controller.cl200a_utils import MeasurementStatus
+from cl200a_controller.cli import main
+from cl200a_controller.emulator import VirtualCL200A
+
+
+@pytest.fixture()
+def emulated_cl200a(log_file_path, mocker):
+    emulator = VirtualCL200A(ev=500, heads=2)
+    mocker.patch(
+        "cl200a_controller.cli.CL200A",
+        side_effect=lambda **kwargs: CL200A(
+            **{**kwargs, "log_file_path": log_file_path, "transport": emulator}
+        ),
+    )
+    return emulator
+
+
+# pylint: disable=redefined-outer-name,unused-argument
+# to use the fixture, outer name must be used
+@pytest.mark.usefixtures("no_sleep")
+class TestCli:
+    def test_jsonl(self, emulated_cl200a, capsys):
+        assert main(["--port", "loop://", "--count", "2", "--formats", "ev_x_y", "x_y_z"]) == 0
+        lines = capsys.readouterr().out.splitlines()
+        assert len(lines) == 4
+        row = json.loads(lines[0])
+        assert row["format"] == "ev_x_y"
+        assert row["value1"] == 500
+        assert row["status"] == 0
+
+    def test_jsonl_undecodable_values(self, emulated_cl200a, capsys, mocker):
+        emulated_cl200a.faults.error_byte = "5"
+        mocker.patch(
+            "cl200a_controller.cl200a.CL200Utils.extract_values", side_effect=ValueError("bad")
+        )
+        assert main(["--port", "loop://", "--count", "1"]) == 0
+        row = json.loads(capsys.readouterr().out)
+        assert (row["value1"], row["value2"], row["value3"]) == (None, None, None)
+        assert row["status"] == int(MeasurementStatus.VALUE_OVER)
+
+    def test_csv_file(self, emulated_cl200a, tmp_path):
+        output = tmp_path / "out.csv"
+        argv = ["--port", "loop://", "--count", "3", "--heads", "0", "1"]
+        assert main(argv + ["--output-format", "csv", "--output", str(output)]) == 0
+        rows = list(csv.DictReader(io.StringIO(output.read_text())))
+        assert len(rows) == 6
+        assert [row["head"] for row in rows[:2]] == ["0", "1"]
+
+    def test_parquet(self, emulated_cl200a, tmp_path, mocker):
+        parquet = pytest.importorskip("pyarrow.parquet")
+        mocker.patch("cl200a_controller.cli.PARQUET_ROW_GROUP_SIZE", 2)
+        output = tmp_path / "out.parquet"
+        argv = ["--port", "loop://", "--count", "5", "--output-format", "parquet"]
+        assert main(argv + ["--output", str(output)]) == 0
+        metadata = parquet.ParquetFile(str(output)).metadata
+        assert (metadata.num_rows, metadata.num_row_groups) == (5, 3)
+
+    def test_invalid_arguments(self, emulated_cl200a):
+        with pytest.raises(SystemExit):
+            main(["--port", "loop://", "--formats", "unknown"])
+        with pytest.raises(SystemExit):
+            main(["--port", "loop://", "--heads", "30"])
+        with pytest.raises(SystemExit):
+            main(["--port", "loop://", "--output-format", "parquet"])
+
+    def test_output_is_closed_on_error(self, emulated_cl200a, tmp_path, mocker):
+        output = tmp_path / "out.jsonl"
+        files = []
+        builtin_open = open
+
+        def tracked_open(*args, **kwargs):
+            # pylint: disable=consider-using-with
+            # the test checks that main closes the file
+            files.append(builtin_open(*args, **kwargs))
+            return files[-1]
+
+        mocker.patch("builtins.open", side_effect=tracked_open)
+        emulated_cl200a.faults.drop_rate = 1.0
+        with pytest.raises(ConnectionAbortedError):
+            main(["--port", "loop://", "--count", "1", "--output", str(output)])
+        assert [file.closed for file in files if file.name == str(output)] == [True]
+
+    @pytest.mark.parametrize(
+        "found", [[], SerialException("luxmeter not found")], ids=["empty", "none"]
+    )
+    def test_no_meter_found(self, emulated_cl200a, mocker, found):
+        mocker.patch(
+            "cl200a_controller.serial_utils.SerialUtils.find_all_luxmeters", side_effect=[found]
+        )
+        with pytest.raises(SystemExit, match="No CL-200A"):
+            main(["--count", "1"])
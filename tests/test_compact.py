@@ -0,0 +1,103 @@
+import math
+from datetime import timedelta
+
+import pytest
+
+from cl200a_controller import CL200A
+from cl200a_controller.cl200a_utils import CL200Utils, MeasurementStatus
+from cl200a_controller.compact import (
+    BYTES_PER_SAMPLE,
+    MISSING_EXPONENT,
+    block_size,
+    decode,
+    decode_all,
+    decode_arrays,
+    encode,
+    from_raw,
+    to_raw,
+)
+from cl200a_controller.emulator import VirtualCL200A
+from tests.conftest import START, make_sample
+
+RAW = ((2731, -2), (3127, -4), (-1234, 1))
+
+
+def raw_sample(index, raw=RAW, step=timedelta(milliseconds=250)):
+    """sample with raw values, alternating status flags and heads"""
+    return make_sample(
+        index=index,
+        step=step,
+        values=tuple(from_raw(mantissa, exponent) for mantissa, exponent in raw),
+        status=MeasurementStatus.LOW_BATTERY if index % 2 else MeasurementStatus.OK,
+        head=index % 3,
+        raw=raw,
+    )
+
+
+# pylint: disable=unused-argument
+class TestCompact:
+    def test_extract_raw(self):
+        result = "\x0200021 10+27312+31270-12345\x0306\r\n"
+        assert CL200Utils.extract_raw(result) == RAW
+        assert CL200Utils.extract_raw("\x0200021 10      +31270-12345") is None
+        padded = "\x0200021 10+   00+ 3124-   12\x0306\r\n"
+        assert CL200Utils.extract_raw(padded) == ((0, -4), (312, 0), (-1, -2))
+
+    @pytest.mark.parametrize(
+        "value, raw",
+        [(27.31, (2731, -2)), (0.3127, (3127, -4)), (-12340.0, (-1234, 1)), (0.0, (0, -4))],
+    )
+    def test_raw_round_trip(self, value, raw):
+        assert to_raw(value) == raw
+        assert from_raw(*raw) == value
+        assert to_raw(math.nan)[1] == MISSING_EXPONENT
+
+    def test_round_trip(self):
+        samples = [raw_sample(index) for index in range(100)]
+        data = encode(samples)
+        assert len(data) == block_size(data) == 20 + 100 * BYTES_PER_SAMPLE
+        assert decode(data) == samples
+
+    def test_missing_values_and_wide_deltas(self):
+        samples = [
+            raw_sample(0),
+            raw_sample(1, step=timedelta(days=1))._replace(
+                values=(math.nan, math.nan, math.nan), raw=None
+            ),
+        ]
+        decoded = decode(encode(samples))
+        assert decoded[0] == samples[0]
+        assert decoded[1].raw is None and math.isnan(decoded[1].values[0])
+        assert decoded[1].measured_time == START + timedelta(days=1)
+
+    def test_concatenated_blocks(self):
+        first = [raw_sample(index) for index in range(3)]
+        second = [raw_sample(index) for index in range(3, 5)]
+        assert decode_all(encode(first) + encode(second) + encode([])) == first + second
+
+    def test_not_a_block(self):
+        with pytest.raises(ValueError):
+            decode(b"\x00" * 32)
+
+    def test_decode_arrays(self):
+        numpy = pytest.importorskip("numpy")
+        samples = [raw_sample(index) for index in range(10)]
+        samples[3] = samples[3]._replace(values=(math.nan, 1.0, 2.0), raw=None)
+        arrays = decode_arrays(encode(samples))
+        assert arrays["values"].shape == (10, 3)
+        assert numpy.isnan(arrays["values"][3, 0])
+        for index in (0, 1, 9):
+            assert arrays["values"][index].tolist() == list(samples[index].values)
+        assert arrays["time_us"][1] - arrays["time_us"][0] == 250000
+        assert arrays["head"].tolist() == [index % 3 for index in range(10)]
+
+    def test_samples_of_cl200a(self, log_file_path, no_sleep):
+        cl200a = CL200A(log_file_path=log_file_path, transport=VirtualCL200A(ev=500))
+        samples = cl200a.measure()
+        assert len(samples) == 1
+        sample = samples[0]
+        assert sample.raw == ((5000, -1), (3127, -4), (3290, -4))
+        assert sample.values[1] == 0.313
+        decoded = decode(encode([sample]))[0]
+        assert decoded.values[1] == 0.3127
+        assert decoded.raw == sample.raw
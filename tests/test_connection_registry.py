@@ -0,0 +1,167 @@
+import threading
+import time
+
+import pytest
+
+from cl200a_controller import CL200A
+from cl200a_controller.cl200a_utils import CL200Utils
+from cl200a_controller.connection_registry import ConnectionRegistry
+from cl200a_controller.emulator import VirtualCL200A
+
+
+@pytest.fixture()
+def emulators(mocker):
+    opened = []
+
+    def connect_serial_port(port, **_kwargs):
+        emulator = VirtualCL200A(port=port)
+        opened.append(emulator)
+        return emulator
+
+    mocker.patch.object(CL200Utils, "connect_serial_port", side_effect=connect_serial_port)
+    yield opened
+    ConnectionRegistry.close_all()
+
+
+# pylint: disable=unused-argument, redefined-outer-name
+class TestConnectionRegistry:
+    def test_instances_share_one_connection(self, log_file_path, no_sleep, emulators):
+        first = CL200A(log_file_path=log_file_path, port="meter-a", shared=True)
+        received = emulators[0].commands_received
+        second = CL200A(log_file_path=log_file_path, port="meter-a", shared=True)
+
+        assert len(emulators) == 1
+        assert second.ser is first.ser
+        assert second._lock is first._lock  # pylint: disable=protected-access
+        # no handshake for the second instance
+        assert emulators[0].commands_received == received
+        assert second.is_connected
+        assert ConnectionRegistry.get("meter-a").references == 2
+        assert second.get_ev_x_y()[0] == 500
+
+    def test_connection_stays_open_after_close(self, log_file_path, no_sleep, emulators):
+        CL200A(log_file_path=log_file_path, port="meter-a", shared=True).close()
+        connection = ConnectionRegistry.get("meter-a")
+        assert connection.references == 0
+        assert emulators[0].is_open
+
+        # without a port, the shared port is used and discovery is skipped
+        luxmeter = CL200A(log_file_path=log_file_path, shared=True)
+        assert luxmeter.port == "meter-a"
+        assert len(emulators) == 1
+        luxmeter.close()
+        luxmeter.close()
+        assert connection.references == 0
+
+        ConnectionRegistry.close_all()
+        assert not emulators[0].is_open
+        assert ConnectionRegistry.ports() == []
+
+    def test_ports_are_separate(self, log_file_path, no_sleep, emulators):
+        first = CL200A(log_file_path=log_file_path, port="meter-a", shared=True)
+        second = CL200A(log_file_path=log_file_path, port="meter-b", shared=True)
+        assert first.ser is not second.ser
+        assert ConnectionRegistry.ports() == ["meter-a", "meter-b"]
+
+    def test_closed_port_is_reopened(self, log_file_path, no_sleep, emulators):
+        CL200A(log_file_path=log_file_path, port="meter-a", shared=True)
+        emulators[0].close()
+        luxmeter = CL200A(log_file_path=log_file_path, port="meter-a", shared=True)
+        assert len(emulators) == 2
+        assert luxmeter.ser is emulators[1]
+
+    def test_idle_connection_is_probed(self, log_file_path, no_sleep, emulators, mocker):
+        mocker.patch.object(ConnectionRegistry, "health_check_interval", 0)
+        CL200A(log_file_path=log_file_path, port="meter-a", shared=True).close()
+
+        received = emulators[0].commands_received
+        CL200A(log_file_path=log_file_path, port="meter-a", shared=True).close()
+        # the probe is one read command, then the connection is reused
+        assert emulators[0].commands_received == received + 1
+        assert len(emulators) == 1
+
+        # a meter that does not answer any more is opened and initialized again
+        emulators[0].faults.drop_rate = 1.0
+        emulators[0].timeout = 0.01
+        luxmeter = CL200A(log_file_path=log_file_path, port="meter-a", shared=True)
+        assert len(emulators) == 2
+        assert not emulators[0].is_open
+        assert luxmeter.get_ev_x_y()[0] == 500
+
+    def test_probe_does_not_block_other_ports(self, log_file_path, no_sleep, emulators, mocker):
+        mocker.patch.object(ConnectionRegistry, "health_check_interval", 0)
+        CL200A(log_file_path=log_file_path, port="meter-a", shared=True).close()
+        CL200A(log_file_path=log_file_path, port="meter-b", shared=True).close()
+        probing = threading.Event()
+
+        def silent_readline(*_args, **_kwargs):
+            probing.set()
+            time.sleep(1)
+            return b""
+
+        mocker.patch.object(emulators[0], "readline", side_effect=silent_readline)
+
+        thread = threading.Thread(
+            target=CL200A,
+            kwargs={"log_file_path": log_file_path, "port": "meter-a", "shared": True},
+        )
+        thread.start()
+        assert probing.wait(5)
+        started = time.monotonic()
+        assert ConnectionRegistry.ports() == ["meter-a", "meter-b"]
+        CL200A(log_file_path=log_file_path, port="meter-b", shared=True).close()
+        assert time.monotonic() - started < 0.5
+        thread.join()
+
+    def test_open_does_not_block_other_ports(self, log_file_path, no_sleep, emulators, mocker):
+        opening = threading.Event()
+        proceed = threading.Event()
+
+        def slow_open():
+            opening.set()
+            assert proceed.wait(5)
+            return VirtualCL200A(port="meter-a")
+
+        results = []
+
+        def acquire():
+            connection, initialize = ConnectionRegistry.acquire("meter-a", slow_open)
+            if initialize:
+                connection.lock.release()
+            results.append((connection, initialize))
+
+        threads = [threading.Thread(target=acquire) for _ in range(2)]
+        threads[0].start()
+        assert opening.wait(5)
+        threads[1].start()
+        started = time.monotonic()
+        CL200A(log_file_path=log_file_path, port="meter-b", shared=True).close()
+        assert time.monotonic() - started < 0.5
+
+        proceed.set()
+        for thread in threads:
+            thread.join()
+        # opened once, the second thread takes the connection of the first
+        assert sorted(initialize for _, initialize in results) == [False, True]
+        assert results[0][0] is results[1][0]
+        assert results[0][0].references == 2
+
+    def test_failed_open_is_not_shared(self, log_file_path, no_sleep, emulators, mocker):
+        mocker.patch.object(CL200Utils, "connect_serial_port", side_effect=ConnectionRefusedError)
+        with pytest.raises(ConnectionRefusedError):
+            CL200A(log_file_path=log_file_path, port="meter-a", shared=True)
+        assert ConnectionRegistry.ports() == []
+
+    def test_failed_handshake_is_not_shared(self, log_file_path, no_sleep, emulators, mocker):
+        mocker.patch.object(CL200A, "_ext_mode", side_effect=ConnectionError)
+        with pytest.raises(ConnectionError):
+            CL200A(log_file_path=log_file_path, port="meter-a", shared=True)
+        assert ConnectionRegistry.ports() == []
+        assert not emulators[0].is_open
+
+    def test_lost_connection_is_invalidated(self, log_file_path, no_sleep, emulators):
+        luxmeter = CL200A(log_file_path=log_file_path, port="meter-a", shared=True)
+        emulators[0].faults.drop_rate = 1.0
+        with pytest.raises(ConnectionAbortedError):
+            luxmeter.get_ev_x_y()
+        assert ConnectionRegistry.ports() == []
@@ -0,0 +1,134 @@
+import math
+import time
+
+import pytest
+
+from cl200a_controller import CL200A
+from cl200a_controller.cl200a_utils import MeasurementStatus
+from cl200a_controller.compact import from_raw
+from cl200a_controller.control_loop import ControlLoop
+from cl200a_controller.emulator import VirtualCL200A
+from cl200a_controller.wire_log import ReplaySerial
+
+
+def make_luxmeter(log_file_path, **emulator_options):
+    emulator = VirtualCL200A(realtime=False, **emulator_options)
+    return CL200A(log_file_path=log_file_path, transport=emulator, settle_times={"trigger": 0})
+
+
+# pylint: disable=unused-argument
+class TestControlLoop:
+    @pytest.mark.parametrize(
+        "measurement_format", ["ev_x_y", "x_y_z", "ev_u_v", "ev_tcp_delta_uv"]
+    )
+    def test_readings_match_samples(self, log_file_path, no_sleep, measurement_format):
+        luxmeter = make_luxmeter(log_file_path, ev=1234.5, x=0.4476, y=0.4074)
+        readings = []
+
+        def callback(reading):
+            readings.append((reading.value1, reading.value2, reading.value3, reading.status))
+
+        loop = ControlLoop(luxmeter, callback, measurement_format)
+        assert loop.run(count=3) == 3
+        sample = luxmeter.read_sample(measurement_format)
+        # the values as sent, without the rounding of the getters
+        expected = tuple(from_raw(mantissa, exponent) for mantissa, exponent in sample.raw)
+        assert readings == [(*expected, MeasurementStatus.OK)] * 3
+        assert loop.stats.readings == 3
+        assert loop.reading.sequence == 3
+        assert loop.stats.missed == 0
+
+    def test_exact_values_and_status(self, log_file_path, no_sleep):
+        luxmeter = make_luxmeter(log_file_path, ev=0, x=0.3127, y=0.329)
+        luxmeter.ser.faults.battery_byte = "1"
+        loop = ControlLoop(luxmeter, lambda reading: None)
+        loop.run(count=1)
+        reading = loop.reading
+        # padded mantissa and full precision, unlike the getters that round to 3 decimals
+        assert (reading.value1, reading.value2, reading.value3) == (0.0, 0.3127, 0.329)
+        assert reading.status == MeasurementStatus.LOW_BATTERY
+        assert 0 < reading.trigger_ns <= reading.receive_ns
+        assert 0 < reading.reply_latency <= reading.latency
+
+    def test_budget_overruns(self, log_file_path, no_sleep):
+        luxmeter = make_luxmeter(log_file_path)
+        alerts = []
+        slow = {"sequence": 2}
+
+        def callback(reading):
+            if reading.sequence == slow["sequence"]:
+                time.sleep(0.05)
+
+        loop = ControlLoop(
+            luxmeter,
+            callback,
+            budget=0.02,
+            on_overrun=lambda reading: alerts.append(reading.latency),
+        )
+        loop.run(count=4)
+        assert loop.stats.overruns == 1
+        assert len(alerts) == 1 and alerts[0] > 0.02
+        assert loop.stats.worst_latency == alerts[0]
+        assert loop.latency_percentile(0.5) < 0.02
+        assert loop.latency_percentile(1.0) == alerts[0]
+
+    def test_missed_replies_do_not_raise(self, log_file_path, no_sleep):
+        luxmeter = make_luxmeter(log_file_path)
+        luxmeter.ser.faults.drop_rate = 1.0
+        called = []
+        loop = ControlLoop(luxmeter, called.append, read_timeout=0.01)
+        assert loop.run(count=5) == 5
+        assert loop.stats.missed == 5
+        assert not called
+        assert math.isnan(loop.latency_percentile(0.5))
+        # the timeout of the port is restored
+        assert luxmeter.ser.timeout == 3
+
+    def test_read_timeout_applies_while_recording(self, log_file_path, no_sleep, tmp_path):
+        emulator = VirtualCL200A(realtime=False)
+        luxmeter = CL200A(
+            log_file_path=log_file_path,
+            transport=emulator,
+            settle_times={"trigger": 0},
+            record_path=tmp_path / "session.cl2w",
+        )
+        timeouts = []
+        loop = ControlLoop(luxmeter, lambda reading: timeouts.append(emulator.timeout), budget=0.2)
+        assert loop.run(count=2) == 2
+        assert timeouts == [0.2, 0.2]
+        assert emulator.timeout == 3
+
+    def test_replayed_recording(self, log_file_path, no_sleep, tmp_path):
+        record_path = tmp_path / "session.cl2w"
+        luxmeter = CL200A(
+            log_file_path=log_file_path,
+            transport=VirtualCL200A(ev=321, realtime=False),
+            settle_times={"trigger": 0},
+            record_path=record_path,
+        )
+        ControlLoop(luxmeter, lambda reading: None).run(count=3)
+        luxmeter.ser.close_log()
+
+        replayed = CL200A(
+            log_file_path=log_file_path,
+            transport=ReplaySerial(record_path, strict=True),
+            settle_times={"trigger": 0},
+        )
+        values = []
+        loop = ControlLoop(replayed, lambda reading: values.append(reading.value1))
+        assert loop.run(count=3) == 3
+        assert values == [321.0] * 3
+
+    def test_stop_from_callback(self, log_file_path, no_sleep):
+        luxmeter = make_luxmeter(log_file_path)
+
+        def callback(reading):
+            if reading.sequence == 3:
+                loop.stop()
+
+        loop = ControlLoop(luxmeter, callback)
+        assert loop.run() == 3
+
+    def test_invalid_format(self, log_file_path, no_sleep):
+        with pytest.raises(ValueError):
+            ControlLoop(make_luxmeter(log_file_path), lambda reading: None, "unknown")
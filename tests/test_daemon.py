@@ -0,0 +1,109 @@
+import json
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from cl200a_controller.cl200a_utils import LowLuminanceError
+from cl200a_controller.daemon import (
+    REPLY_MARGIN,
+    DaemonError,
+    MeasurementClient,
+    MeasurementServer,
+)
+
+
+# pylint: disable=redefined-outer-name
+# to use the fixture, outer name must be used
+@pytest.fixture()
+def mock_luxmeter(mocker):
+    luxmeter = mocker.Mock()
+
+    def get_ev_x_y():
+        time.sleep(0.1)
+        return 27.3, 0.455, 0.45, datetime.now()
+
+    luxmeter.get_ev_x_y = mocker.Mock(side_effect=get_ev_x_y)
+    luxmeter.get_x_y_z = mocker.Mock(side_effect=LowLuminanceError("low"))
+    return luxmeter
+
+
+@pytest.fixture()
+def server(mock_luxmeter):
+    measurement_server = MeasurementServer({"default": mock_luxmeter}, address=("127.0.0.1", 0))
+    measurement_server.start()
+    yield measurement_server
+    measurement_server.shutdown()
+
+
+# pylint: disable=invalid-name
+# the names ev, x, y are used in the documentation
+class TestMeasurementServer:
+    def test_get_ev_x_y(self, server):
+        with MeasurementClient(server.address) as client:
+            ev, x, y, measured_time = client.get_ev_x_y()
+        assert (ev, x, y) == (27.3, 0.455, 0.45)
+        assert isinstance(measured_time, datetime)
+
+    def test_concurrent_requests_share_one_read(self, server, mock_luxmeter):
+        results = []
+
+        def request():
+            with MeasurementClient(server.address) as client:
+                results.append(client.get_ev_x_y())
+
+        threads = [threading.Thread(target=request) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(results) == 4
+        assert mock_luxmeter.get_ev_x_y.call_count == 1
+
+    def test_measurement_error(self, server):
+        with MeasurementClient(server.address) as client:
+            with pytest.raises(DaemonError, match="LowLuminanceError"):
+                client.get_x_y_z()
+
+    def test_busy_meter_times_out(self, server, mock_luxmeter):
+        mock_luxmeter.get_ev_u_v.side_effect = lambda: time.sleep(0.5)
+        busy = threading.Thread(target=server.dispatch, args=(b'{"method": "get_ev_u_v"}',))
+        busy.start()
+        time.sleep(0.05)
+        with MeasurementClient(server.address, timeout=0.1) as client:
+            # pylint: disable=protected-access
+            assert client._sock.gettimeout() == 0.1 + REPLY_MARGIN
+            started = time.monotonic()
+            with pytest.raises(DaemonError, match="TimeoutError"):
+                client.get_ev_u_v()
+            assert time.monotonic() - started < 0.4
+        busy.join()
+
+    def test_unknown_meter(self, server):
+        with MeasurementClient(server.address, meter="missing") as client:
+            with pytest.raises(DaemonError, match="KeyError"):
+                client.get_ev_x_y()
+            assert client.list_meters() == ["default"]
+
+    @pytest.mark.parametrize("line", [b"[1]", b'"x"', b"42", b"null"])
+    def test_request_is_not_an_object(self, server, line):
+        with MeasurementClient(server.address) as client:
+            # pylint: disable=protected-access
+            client._file.write(line + b"\n")
+            client._file.flush()
+            assert json.loads(client._file.readline())["error"] == "TypeError"
+            # the handler is still alive
+            assert client.get_ev_x_y()[0] == 27.3
+
+    def test_unix_socket(self, mock_luxmeter, tmp_path):
+        address = tmp_path / "cl200a.sock"
+        measurement_server = MeasurementServer({"default": mock_luxmeter}, address=address)
+        measurement_server.start()
+        try:
+            with MeasurementClient(address) as client:
+                assert client.get_ev_x_y()[0] == 27.3
+        finally:
+            measurement_server.shutdown()
+        assert not address.exists()
@@ -0,0 +1,70 @@
+import pytest
+
+from cl200a_controller import CL200A
+from cl200a_controller.cl200a_utils import CL200Utils
+from cl200a_controller.emulator import VirtualCL200A, _encode_value, light_to_values
+
+
+# pylint: disable=redefined-outer-name,unused-argument
+# to use the fixture, outer name must be used
+# pylint: disable=invalid-name
+# the names ev, x, y, z, u, v, tcp, delta_uv are used in the documentation
+# pylint: disable=protected-access
+class TestVirtualCL200A:
+    @pytest.mark.parametrize("value", [27.3, 0.455, 0.0, -12.5, 3000.0, 123456.0])
+    def test_encode_value(self, value):
+        result = "\x0200021 10" + _encode_value(value)
+        assert CL200Utils._extract_one_data_from_result(result, start_index=9) == pytest.approx(
+            value, rel=1e-3
+        )
+
+    def test_cl200a_getters(self, log_file_path, no_sleep):
+        emulator = VirtualCL200A(ev=500, x=0.3127, y=0.329)
+        cl200a = CL200A(log_file_path=log_file_path, transport=emulator)
+        assert cl200a.is_connected is True
+        assert cl200a.port == "virtual"
+
+        ev, x, y, _ = cl200a.get_ev_x_y()
+        assert (ev, x, y) == pytest.approx((500, 0.313, 0.329), abs=1e-3)
+
+        X, Y, Z, _ = cl200a.get_x_y_z()
+        assert (X, Y, Z) == pytest.approx(light_to_values(500, 0.3127, 0.329)["01"], rel=1e-3)
+
+        ev, tcp, delta_uv, _ = cl200a.get_ev_tcp_delta_uv()
+        assert tcp == pytest.approx(6500, abs=50)
+        assert delta_uv == 0
+
+        emulator.set_light(20)
+        assert cl200a.get_ev_u_v()[0] == 20
+
+    def test_busy_commands_are_ignored(self):
+        emulator = VirtualCL200A(settle_times={"40": 10})
+        emulator.write(
+            CL200Utils.cmd_formatter(CL200Utils.cl200a_cmd_dict["command_40r"]).encode()
+        )
+        emulator.write(CL200Utils.cmd_formatter(CL200Utils.cl200a_cmd_dict["command_02"]).encode())
+        assert emulator.readline() == b""
+        assert emulator.commands_ignored == 1
+
+    def test_heads(self):
+        emulator = VirtualCL200A(heads=2)
+        emulator.write(CL200Utils.cmd_formatter("01021200").encode())
+        assert emulator.readline()[1:5] == b"0102"
+        emulator.write(CL200Utils.cmd_formatter("02021200").encode())
+        assert emulator.readline() == b""
+
+    def test_hang_on_empty(self):
+        emulator = VirtualCL200A()
+        emulator.timeout = 0.01
+        emulator.faults.hang_on_empty = True
+        assert emulator.readline() == b""
+
+    def test_not_realtime(self):
+        emulator = VirtualCL200A(latency=10, realtime=False)
+        emulator.write(CL200Utils.cmd_formatter(CL200Utils.cl200a_cmd_dict["command_02"]).encode())
+        emulator.write(CL200Utils.cmd_formatter(CL200Utils.cl200a_cmd_dict["command_02"]).encode())
+        # the reply to the first command is stale, the one to the last command survives
+        emulator.reset_input_buffer()
+        assert emulator.in_waiting > 0
+        assert emulator.readline()[1:5] == b"0002"
+        assert emulator.readline() == b""
@@ -0,0 +1,91 @@
+import sqlite3
+
+import pytest
+
+from cl200a_controller import CL200A
+from cl200a_controller.loadtest import EmulatorFleet, run_load_test
+from cl200a_controller.sqlite_sink import SqliteSink
+
+
+# pylint: disable=unused-argument
+class TestEmulatorFleet:
+    def test_meters_on_fleet_ports(self, log_file_path):
+        with EmulatorFleet(3, latency=0.001) as fleet:
+            assert len(set(fleet.ports)) == 3
+            luxmeters = [
+                CL200A(
+                    log_file_path=log_file_path,
+                    port=port,
+                    settle_times=dict.fromkeys(("connect", "hold", "ext", "trigger"), 0.0),
+                )
+                for port in fleet.ports
+            ]
+            try:
+                for luxmeter in luxmeters:
+                    ev, _, _, _ = luxmeter.get_ev_x_y()
+                    assert ev > 0
+            finally:
+                for luxmeter in luxmeters:
+                    luxmeter.close()
+
+    def test_unknown_transport(self):
+        with pytest.raises(ValueError):
+            EmulatorFleet(1, transport="usb")
+
+
+class TestRunLoadTest:
+    def test_report(self, log_file_path):
+        report = run_load_test(
+            meters=5, duration=0.5, latency=0.002, settle_time=0.005, log_file_path=log_file_path
+        )
+        assert report.meters == 5
+        assert report.cycles > 0
+        assert report.samples == 5 * report.cycles
+        assert report.errors == 0
+        assert 0 < report.latency_p50 <= report.latency_p99
+        assert "reply latency" in report.format()
+
+    def test_drops_are_counted(self, log_file_path):
+        report = run_load_test(
+            meters=4,
+            duration=0.5,
+            latency=0.002,
+            settle_time=0.005,
+            drop_rate=0.5,
+            log_file_path=log_file_path,
+        )
+        assert report.errors > 0
+        assert report.samples < 4 * report.cycles
+
+    def test_sink(self, log_file_path, tmp_path):
+        path = tmp_path / "load.db"
+        with SqliteSink(path, meter="load") as sink:
+            report = run_load_test(
+                meters=3,
+                duration=0.3,
+                latency=0.002,
+                settle_time=0.005,
+                sink=sink.write,
+                log_file_path=log_file_path,
+            )
+        with sqlite3.connect(str(path)) as connection:
+            assert (
+                connection.execute("SELECT COUNT(*) FROM samples").fetchone()[0] == report.samples
+            )
+
+    def test_opened_meters_closed_on_open_failure(self, log_file_path, mocker):
+        opened = []
+
+        def open_meter(**kwargs):
+            if len(opened) == 2:
+                raise ConnectionError("no reply")
+            luxmeter = mocker.Mock()
+            opened.append(luxmeter)
+            return luxmeter
+
+        mocker.patch("cl200a_controller.loadtest.CL200A", side_effect=open_meter)
+        with pytest.raises(ConnectionError):
+            run_load_test(meters=4, duration=0.1, log_file_path=log_file_path, open_workers=1)
+        assert len(opened) == 2
+        for luxmeter in opened:
+            luxmeter.close.assert_called_once_with()
@@ -0,0 +1,71 @@
+import logging
+import logging.handlers
+
+import pytest
+
+from cl200a_controller import CL200A
+from cl200a_controller.emulator import VirtualCL200A
+from cl200a_controller.logger import Logger
+
+
+@pytest.fixture()
+def clean_logger():
+    Logger.reset_logger()
+    yield
+    Logger.reset_logger()
+
+
+# pylint: disable=redefined-outer-name,unused-argument
+# to use the fixture, outer name must be used
+class TestLogger:
+    def test_queue_mode(self, clean_logger, tmp_path):
+        log_file_path = tmp_path / "queue.log"
+        logger = Logger.logger(
+            logger_name="test queue", log_file_path=log_file_path, use_queue=True
+        )
+        assert [type(handler) for handler in logger.handlers] == [logging.handlers.QueueHandler]
+        assert Logger.listener_obj is not None
+
+        logger.info("value: %s", 1.5)
+        Logger.stop_listener()
+        assert "value: 1.5" in log_file_path.read_text()
+
+    def test_rotation(self, clean_logger, tmp_path):
+        log_file_path = tmp_path / "rotate.log"
+        logger = Logger.logger(
+            logger_name="test rotate", log_file_path=log_file_path, max_bytes=200, backup_count=1
+        )
+        for i in range(20):
+            logger.info("message %d", i)
+        assert (tmp_path / "rotate.log.1").exists()
+
+    def test_rotation_through_cl200a(self, clean_logger, tmp_path, no_sleep):
+        log_file_path = tmp_path / "cl200a.log"
+        CL200A(
+            log_file_path=log_file_path,
+            transport=VirtualCL200A(),
+            log_max_bytes=1000,
+            log_backup_count=2,
+        )
+        (handler,) = [
+            handler
+            for handler in Logger.logger().handlers
+            if isinstance(handler, logging.handlers.RotatingFileHandler)
+        ]
+        assert (handler.maxBytes, handler.backupCount) == (1000, 2)
+
+    def test_reset_does_not_pile_up_handlers(self, clean_logger, tmp_path):
+        for _ in range(3):
+            Logger.reset_logger()
+            logger = Logger.logger(logger_name="test reset", log_file_path=tmp_path / "a.log")
+        assert len(logger.handlers) == 2
+
+    def test_listener_stopped_at_exit_once(self, clean_logger, tmp_path, mocker):
+        mocker.patch.object(Logger, "_atexit_registered", False)
+        register = mocker.patch("cl200a_controller.logger.atexit.register")
+        for _ in range(3):
+            Logger.reset_logger()
+            Logger.logger(
+                logger_name="test atexit", log_file_path=tmp_path / "a.log", use_queue=True
+            )
+        register.assert_called_once_with(Logger.stop_listener)
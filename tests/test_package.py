@@ -0,0 +1,40 @@
+import subprocess
+import sys
+
+import pytest
+
+import cl200a_controller
+
+
+class TestPackage:
+    def test_import_is_lazy(self):
+        code = (
+            "import sys, cl200a_controller; "
+            "print(sorted(name for name in ('serial', 'serial.tools.list_ports', "
+            "'logging.handlers', 'cl200a_controller.cl200a') if name in sys.modules))"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code], check=True, capture_output=True, text=True
+        ).stdout
+        assert output.strip() == "[]"
+
+    def test_parsers_without_serial(self):
+        code = (
+            "import sys; from cl200a_controller.cl200a_utils import CL200Utils; "
+            "print(CL200Utils.read_frame('ev_x_y').strip(), 'serial' in sys.modules)"
+        )
+        output = subprocess.run(
+            [sys.executable, "-c", code], check=True, capture_output=True, text=True
+        ).stdout
+        assert output.split()[-1] == "False"
+
+    def test_lazy_attribute(self):
+        # pylint: disable=import-outside-toplevel
+        from cl200a_controller.cl200a import CL200A
+
+        assert cl200a_controller.CL200A is CL200A
+        assert "CL200A" in dir(cl200a_controller)
+
+    def test_unknown_attribute(self):
+        with pytest.raises(AttributeError):
+            _ = cl200a_controller.not_there
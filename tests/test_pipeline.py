@@ -0,0 +1,177 @@
+import math
+from datetime import timedelta
+
+import pytest
+
+from cl200a_controller.cl200a import CL200A
+from cl200a_controller.cl200a_utils import MeasurementStatus
+from cl200a_controller.emulator import VirtualCL200A
+from cl200a_controller.pipeline import (
+    DeadbandFilter,
+    Drift,
+    LevelCrossing,
+    TriggeredCapture,
+    WindowAggregator,
+)
+from tests.conftest import START, make_sample, make_samples
+
+
+# pylint: disable=unused-argument
+class TestDeadbandFilter:
+    def test_constant_light_is_dropped(self):
+        deadband = DeadbandFilter(abs_deadband=1.0)
+        emitted = list(deadband(make_samples([500.0] * 1000)))
+        assert len(emitted) == 1
+        assert (deadband.emitted, deadband.dropped) == (1, 999)
+
+    def test_transitions_are_kept(self):
+        deadband = DeadbandFilter(abs_deadband=1.0, keep_edges=True)
+        samples = make_samples([500.0, 500.5, 500.2, 600.0, 600.3])
+        emitted = list(deadband(samples))
+        assert emitted == [samples[0], samples[2], samples[3]]
+
+        deadband = DeadbandFilter(abs_deadband=1.0, keep_edges=False)
+        assert list(deadband(samples)) == [samples[0], samples[3]]
+
+    def test_relative_deadband(self):
+        deadband = DeadbandFilter(rel_deadband=(0.01, 0, 0), keep_edges=False)
+        samples = make_samples([500.0, 504.0, 506.0, 510.0, 512.0])
+        assert list(deadband(samples)) == [samples[0], samples[2], samples[4]]
+
+    def test_heartbeat(self):
+        deadband = DeadbandFilter(abs_deadband=1.0, heartbeat=10, keep_edges=False)
+        emitted = list(deadband(make_samples([500.0] * 25)))
+        assert [sample.measured_time for sample in emitted] == [
+            START,
+            START + timedelta(seconds=10),
+            START + timedelta(seconds=20),
+        ]
+
+    def test_status_and_nan_changes(self):
+        deadband = DeadbandFilter(abs_deadband=1.0, keep_edges=False)
+        samples = make_samples([500.0, 500.0, math.nan, math.nan, 500.0])
+        samples[1] = samples[1]._replace(status=MeasurementStatus.LOW_BATTERY)
+        samples[4] = samples[4]._replace(status=MeasurementStatus.LOW_BATTERY)
+        assert list(deadband(samples)) == [samples[0], samples[1], samples[2], samples[4]]
+
+    def test_on_stream(self, log_file_path, no_sleep):
+        cl200a = CL200A(log_file_path=log_file_path, transport=VirtualCL200A(ev=500))
+        emitted = list(DeadbandFilter(abs_deadband=1.0)(cl200a.stream("ev_x_y", count=5)))
+        assert len(emitted) == 1
+
+    def test_mixed_stream(self, log_file_path, no_sleep):
+        cl200a = CL200A(log_file_path=log_file_path, transport=VirtualCL200A(ev=500, heads=2))
+        deadband = DeadbandFilter(abs_deadband=1.0)
+        samples = [
+            sample
+            for _ in range(5)
+            for sample in cl200a.measure(("ev_x_y", "x_y_z"), heads=(0, 1))
+        ]
+        emitted = list(deadband(samples))
+        assert [(sample.measurement_format, sample.head) for sample in emitted] == [
+            ("ev_x_y", 0),
+            ("x_y_z", 0),
+            ("ev_x_y", 1),
+            ("x_y_z", 1),
+        ]
+        assert deadband.dropped == 16
+
+        # a change of one format keeps the edge of that format only
+        changed = samples[0]._replace(values=(600.0, 0.3127, 0.329))
+        assert list(deadband([changed])) == [samples[16], changed]
+
+
+class TestTriggeredCapture:
+    def test_level_crossing(self):
+        samples = make_samples([10.0] * 10 + [200.0] * 10 + [10.0] * 10)
+        capture = TriggeredCapture(LevelCrossing(100.0), pre_trigger=3, post_trigger=2)
+        events = list(capture(samples))
+
+        assert len(events) == 2
+        assert events[0].trigger is samples[10]
+        assert events[0].samples == samples[7:13]
+        assert events[1].trigger is samples[20]
+        assert events[1].samples == samples[17:23]
+
+    def test_level_crossing_direction(self):
+        samples = make_samples([10.0, 200.0, 10.0, 200.0])
+        rising = TriggeredCapture(LevelCrossing(100.0, direction="rising"), post_trigger=0)
+        assert [event.trigger for event in rising(samples)] == [samples[1], samples[3]]
+
+        falling = TriggeredCapture(LevelCrossing(100.0, direction="falling"), post_trigger=0)
+        assert [event.trigger for event in falling(samples)] == [samples[2]]
+
+        with pytest.raises(ValueError):
+            LevelCrossing(100.0, direction="up")
+
+    def test_drift(self):
+        samples = [
+            make_sample(index=i, measurement_format="ev_tcp_delta_uv", values=(500.0, tcp, 0.0))
+            for i, tcp in enumerate([6500.0, 6550.0, 6650.0, 6700.0, 6900.0])
+        ]
+        capture = TriggeredCapture(Drift(100.0, index=1), pre_trigger=10, post_trigger=0)
+        events = list(capture(samples))
+        assert [event.trigger for event in events] == [samples[2], samples[4]]
+        assert events[1].samples == samples[3:5]
+
+    def test_stream_ends_in_post_trigger_window(self):
+        samples = make_samples([10.0, 200.0, 200.0])
+        capture = TriggeredCapture(LevelCrossing(100.0), post_trigger=10)
+        events = list(capture(samples))
+        assert len(events) == 1
+        assert events[0].samples == samples
+        assert capture.captures == 1
+
+
+class TestWindowAggregator:
+    def test_windows(self):
+        samples = make_samples([float(i) for i in range(25)])
+        summaries = list(WindowAggregator(window=10)(samples))
+
+        assert [summary.sample_count for summary in summaries] == [10, 10, 5]
+        assert [summary.start for summary in summaries] == [
+            START,
+            START + timedelta(seconds=10),
+            START + timedelta(seconds=20),
+        ]
+        first = summaries[0]
+        assert first.end == START + timedelta(seconds=10)
+        assert first.mean == pytest.approx((4.5, 0.3127, 0.329))
+        assert first.min[0] == 0 and first.max[0] == 9
+        assert first.std == pytest.approx((math.sqrt(55 / 6), 0, 0))
+        assert first.samples is None
+
+    def test_alignment(self):
+        samples = make_samples([1.0, 2.0, 3.0])
+        samples = [
+            sample._replace(measured_time=sample.measured_time + timedelta(seconds=7))
+            for sample in samples
+        ]
+        summaries = list(WindowAggregator(window=5)(samples))
+        assert [(summary.start, summary.sample_count) for summary in summaries] == [
+            (START + timedelta(seconds=5), 3),
+        ]
+
+    def test_formats_heads_status_and_nan(self):
+        samples = make_samples([1.0, math.nan, 3.0, 4.0])
+        samples[1] = samples[1]._replace(status=MeasurementStatus.LOW_LUMINANCE)
+        samples[3] = samples[3]._replace(head=1)
+        summaries = list(WindowAggregator(window=60, keep_raw=True)(samples))
+
+        assert [(summary.head, summary.sample_count) for summary in summaries] == [(0, 3), (1, 1)]
+        assert summaries[0].mean[0] == 2.0
+        assert summaries[0].status == MeasurementStatus.LOW_LUMINANCE
+        assert summaries[0].samples == samples[:3]
+
+        (summary,) = list(WindowAggregator(window=60)(samples[1:2]))
+        assert math.isnan(summary.mean[0]) and summary.sample_count == 1
+
+    def test_invalid_window(self):
+        with pytest.raises(ValueError):
+            WindowAggregator(window=0)
+
+    def test_on_stream(self, log_file_path, no_sleep):
+        cl200a = CL200A(log_file_path=log_file_path, transport=VirtualCL200A(ev=500))
+        (summary,) = list(WindowAggregator(window=1e9)(cl200a.stream("ev_x_y", count=5)))
+        assert summary.sample_count == 5
+        assert summary.mean[0] == 500
@@ -0,0 +1,96 @@
+import pytest
+
+from cl200a_controller import CL200A
+from cl200a_controller.emulator import VirtualCL200A
+from cl200a_controller.plan import MeasurementPlan, PlanRunner
+
+PLAN = {
+    "steps": [
+        {"action": "call", "name": "set_lamp", "args": [100]},
+        {"action": "wait", "seconds": 0},
+        {"action": "wait", "seconds": 0.01},
+        {
+            "action": "measure",
+            "label": "lamp_100",
+            "formats": ["ev_x_y", "x_y_z"],
+            "heads": [0, 1],
+            "samples": 2,
+        },
+        {
+            "action": "repeat",
+            "times": 2,
+            "steps": [
+                {"action": "call", "name": "set_lamp", "kwargs": {"ev": 200}},
+                {"action": "measure", "label": "lamp_200", "formats": ["ev_tcp_delta_uv"]},
+            ],
+        },
+    ]
+}
+
+
+# pylint: disable=redefined-outer-name,unused-argument,protected-access
+# to use the fixture, outer name must be used
+@pytest.fixture()
+def emulator():
+    return VirtualCL200A(ev=10, heads=2)
+
+
+@pytest.fixture()
+def runner(emulator, log_file_path, no_sleep):
+    luxmeter = CL200A(log_file_path=log_file_path, transport=emulator)
+    return PlanRunner(luxmeter, functions={"set_lamp": emulator.set_light})
+
+
+class TestPlan:
+    def test_compile(self, runner):
+        operations = runner.compile(MeasurementPlan.from_dict(PLAN))
+        assert [type(operation).__name__ for operation in operations] == [
+            "_Call",
+            "_Wait",
+            "_Measure",
+            "_Call",
+            "_Measure",
+            "_Call",
+            "_Measure",
+        ]
+        assert operations[1].seconds == 0.01
+
+    def test_run(self, runner, emulator):
+        results = runner.run(MeasurementPlan.from_dict(PLAN))
+
+        assert len(results) == 2 * 2 * 2 + 2
+        assert [(result.label, result.repetition) for result in results[:8]] == [
+            ("lamp_100", 0)
+        ] * 4 + [("lamp_100", 1)] * 4
+        assert [(sample.head, sample.measurement_format) for _, _, sample in results[:4]] == [
+            (0, "ev_x_y"),
+            (0, "x_y_z"),
+            (1, "ev_x_y"),
+            (1, "x_y_z"),
+        ]
+        assert results[0].sample.values[0] == 100
+        assert results[-1].sample.values[0] == 200
+        # one trigger per sample, then one read per head and format
+        assert emulator.commands_received == 3 + 2 * (1 + 4) + 2 * (1 + 1)
+
+    @pytest.mark.parametrize(
+        "steps",
+        [
+            [{"action": "jump"}],
+            [{"action": "call"}],
+            [{"action": "wait"}],
+            [{"action": "measure", "formats": ["unknown"]}],
+            [{"action": "measure", "heads": [30]}],
+            [{"action": "measure", "samples": 0}],
+            [{"action": "repeat", "times": 1, "steps": [{"action": "jump"}]}],
+        ],
+    )
+    def test_invalid_plan(self, steps):
+        with pytest.raises(ValueError):
+            MeasurementPlan(steps)
+
+    def test_from_yaml(self, tmp_path):
+        yaml = pytest.importorskip("yaml")
+        path = tmp_path / "plan.yaml"
+        path.write_text(yaml.safe_dump(PLAN))
+        assert MeasurementPlan.from_yaml(path).steps == PLAN["steps"]
@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from cl200a_controller import CL200A
+from cl200a_controller.emulator import VirtualCL200A
+from cl200a_controller.recording import RecordingReader, RecordingWriter, index_path
+from tests.conftest import make_sample
+
+START = datetime(2022, 8, 1, 14, 0, 0)
+
+
+def without_raw(samples):
+    return [sample._replace(raw=None) for sample in samples]
+
+
+# pylint: disable=unused-argument
+class TestRecording:
+    @pytest.fixture()
+    def recording(self, tmp_path):
+        path = tmp_path / "run.cl2"
+        # three heads, two formats
+        generated = [
+            make_sample(
+                float(index % 9000),
+                measurement_format="ev_x_y" if index % 4 else "x_y_z",
+                measured_time=START + timedelta(seconds=index // 3),
+                head=index % 3,
+            )
+            for index in range(6000)
+        ]
+        samples = {meter: generated for meter in (1, 3)}
+        with RecordingWriter(path, block_size=500) as writer:
+            for index in range(6000):
+                for meter, meter_samples in samples.items():
+                    writer.write(meter_samples[index], meter=meter)
+        return path, samples
+
+    def test_query(self, recording):
+        path, samples = recording
+        start, end = START + timedelta(minutes=2), START + timedelta(minutes=5)
+        expected = [
+            sample
+            for sample in samples[3]
+            if sample.head == 0 and start <= sample.measured_time <= end
+        ]
+        with RecordingReader(path) as reader:
+            assert len(reader) == 12000
+            assert len(reader.blocks()) == 24
+            assert len(reader.blocks(start, end, meter=3)) == 2
+            assert without_raw(reader.query(start, end, meter=3, head=0)) == expected
+            assert len(reader.query(start, end)) == 2 * 3 * 181
+
+            x_y_z = reader.query(start, end, meter=1, measurement_format="x_y_z")
+            assert x_y_z and all(sample.measurement_format == "x_y_z" for sample in x_y_z)
+            assert reader.query(START - timedelta(days=1), START - timedelta(hours=1)) == []
+            assert reader.query(meter=2) == []
+
+    def test_append(self, recording):
+        path, samples = recording
+        later = [
+            sample._replace(measured_time=sample.measured_time + timedelta(days=1))
+            for sample in samples[1][:10]
+        ]
+        with RecordingWriter(path) as writer:
+            for sample in later:
+                writer.write(sample, meter=1)
+        with RecordingReader(path) as reader:
+            assert without_raw(reader.query(START + timedelta(hours=12), meter=1)) == later
+
+    def test_torn_index(self, recording):
+        path, samples = recording
+        with index_path(path).open("ab") as index:
+            index.write(b"\x01" * 17)
+        with RecordingReader(path) as reader:
+            assert len(reader) == 12000
+
+        later = samples[1][0]._replace(measured_time=START + timedelta(days=1))
+        with RecordingWriter(path) as writer:
+            writer.write(later, meter=1)
+        with RecordingReader(path) as reader:
+            assert len(reader) == 12001
+            assert without_raw(reader.query(START + timedelta(hours=12))) == [later]
+
+    def test_empty(self, tmp_path):
+        path = tmp_path / "empty.cl2"
+        RecordingWriter(path).close()
+        assert index_path(path).exists()
+        with RecordingReader(path) as reader:
+            assert len(reader) == 0
+            assert reader.query() == []
+
+    def test_not_an_index(self, tmp_path):
+        path = tmp_path / "run.cl2"
+        path.write_bytes(b"")
+        index_path(path).write_bytes(b"\x00" * 8)
+        with pytest.raises(ValueError):
+            RecordingReader(path)
+
+    def test_stage(self, tmp_path, log_file_path, no_sleep):
+        cl200a = CL200A(log_file_path=log_file_path, transport=VirtualCL200A(ev=300))
+        path = tmp_path / "stream.cl2"
+        with RecordingWriter(path) as writer:
+            samples = list(writer(cl200a.stream("ev_x_y", count=5), meter=7))
+        with RecordingReader(path) as reader:
+            recorded = reader.query(meter=7)
+        assert [sample.raw for sample in recorded] == [sample.raw for sample in samples]
+        assert recorded[0].values[0] == 300
@@ -0,0 +1,35 @@
+import math
+import statistics
+
+import pytest
+
+from cl200a_controller.running_stats import RunningStats
+
+
+class TestRunningStats:
+    def test_matches_statistics(self):
+        values = [27.3, 27.5, 26.9, 27.1, 27.4, 27.0]
+        stats = RunningStats()
+        for value in values:
+            stats.add(value)
+
+        assert stats.count == len(values)
+        assert stats.mean == pytest.approx(statistics.mean(values))
+        assert stats.variance == pytest.approx(statistics.variance(values))
+        assert stats.std == pytest.approx(statistics.stdev(values))
+        assert stats.stderr == pytest.approx(statistics.stdev(values) / math.sqrt(len(values)))
+        assert (stats.min, stats.max) == (26.9, 27.5)
+
+    def test_empty(self):
+        stats = RunningStats()
+        assert stats.variance == 0
+        assert stats.stderr == math.inf
+
+    def test_rel_stderr_zero_mean(self):
+        stats = RunningStats()
+        stats.add(0.0)
+        stats.add(0.0)
+        assert stats.rel_stderr == 0
+        stats.add(1.0)
+        stats.add(-1.0)
+        assert stats.rel_stderr == math.inf
@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from cl200a_controller import CL200A
+from cl200a_controller.emulator import VirtualCL200A
+from cl200a_controller.serial_utils import SerialUtils
+from cl200a_controller.settle_profile import (
+    DEFAULT_SETTLE_TIMES,
+    SettleProfileStore,
+    calibrate_settle_times,
+)
+
+
+# pylint: disable=unused-argument
+class TestSettleProfile:
+    def test_calibrate(self):
+        emulator = VirtualCL200A(settle_times={"54": 0.01, "55": 0.02, "40": 0.03})
+        upper = {"connect": 0.06, "hold": 0.06, "ext": 0.06, "trigger": 0.06}
+        settle_times = calibrate_settle_times(
+            emulator,
+            steps=("connect", "hold", "ext", "trigger"),
+            upper=upper,
+            trials=2,
+            resolution=0.005,
+            safety_factor=1.0,
+        )
+        assert settle_times["connect"] == pytest.approx(0.01, abs=0.006)
+        assert settle_times["hold"] == pytest.approx(0.02, abs=0.006)
+        assert settle_times["ext"] == pytest.approx(0.03, abs=0.006)
+        # not shortened below MIN_SETTLE_TIMES, here the upper bound
+        assert settle_times["trigger"] == 0.06
+        assert emulator.timeout == 3
+
+    def test_calibrate_not_busy(self):
+        settle_times = calibrate_settle_times(VirtualCL200A(), trials=1, safety_factor=1.0)
+        # the trigger settle time can not be verified, so it is not calibrated by default
+        assert settle_times == {"connect": 0, "hold": 0, "ext": 0}
+
+    def test_calibrate_unknown_step(self):
+        with pytest.raises(ValueError):
+            calibrate_settle_times(VirtualCL200A(), steps=("unknown",))
+
+    def test_cl200a_settle_times(self, log_file_path, mocker):
+        sleep = mocker.patch("cl200a_controller.cl200a_utils.sleep", return_value=None)
+        cl200a = CL200A(
+            log_file_path=log_file_path,
+            transport=VirtualCL200A(),
+            settle_times={"trigger": 0.05},
+        )
+        assert cl200a.settle_times == {**DEFAULT_SETTLE_TIMES, "trigger": 0.05}
+        cl200a.get_ev_x_y()
+        assert mocker.call(0.05) in sleep.call_args_list
+
+        assert cl200a.calibrate_settle_times(steps=("connect", "hold", "ext"), trials=1) == {
+            "connect": 0,
+            "hold": 0,
+            "ext": 0,
+        }
+        assert cl200a.settle_times["trigger"] == 0.05
+        assert cl200a.get_ev_x_y()[0] == 500
+
+    def test_store(self, tmp_path):
+        store = SettleProfileStore(tmp_path / "profiles" / "settle.json")
+        assert store.load("/dev/ttyUSB0") is None
+        store.save("/dev/ttyUSB0", {"trigger": 0.1})
+        store.save("FT123456", {"trigger": 0.2})
+        assert store.load("/dev/ttyUSB0") == {"trigger": 0.1}
+        assert SettleProfileStore(store.path).load("FT123456") == {"trigger": 0.2}
+        assert [path.name for path in store.path.parent.iterdir()] == ["settle.json"]
+
+    def test_store_concurrent_saves(self, tmp_path):
+        store = SettleProfileStore(tmp_path / "settle.json")
+        with ThreadPoolExecutor(8) as executor:
+            for index in range(32):
+                executor.submit(store.save, f"meter{index}", {"trigger": index / 100})
+        assert all(store.load(f"meter{index}") == {"trigger": index / 100} for index in range(32))
+
+    def test_find_serial_number(self, mocker):
+        mocker.patch(
+            "cl200a_controller.serial_utils.SerialUtils.list_ports",
+            return_value=[
+                {"device": "/dev/ttyUSB0", "serial_number": "FT123456"},
+                {"device": "/dev/ttyUSB1", "serial_number": None},
+            ],
+        )
+        assert SerialUtils.find_serial_number("/dev/ttyUSB0") == "FT123456"
+        assert SerialUtils.find_serial_number("/dev/ttyUSB1") is None
+        assert SerialUtils.find_serial_number("/dev/ttyUSB2") is None
@@ -0,0 +1,100 @@
+import subprocess
+import sys
+import threading
+
+import pytest
+
+from cl200a_controller import CL200A
+from cl200a_controller.cl200a_utils import MeasurementStatus
+from cl200a_controller.emulator import VirtualCL200A
+from cl200a_controller.shm_publisher import ShmPublisher, ShmReader
+from tests.conftest import START, make_sample
+
+
+def published_sample(ev, head=0):
+    """sample with every field set, sub-second time and nanosecond timestamps"""
+    return make_sample(
+        measurement_format="ev_tcp_delta_uv",
+        values=(ev, 6500.0, 0.0),
+        measured_time=START.replace(microsecond=123456),
+        status=MeasurementStatus.LOW_BATTERY,
+        head=head,
+        trigger_ns=1_660_000_000_000_000_001,
+        receive_ns=1_660_000_000_050_000_002,
+    )
+
+
+# pylint: disable=unused-argument
+class TestShmPublisher:
+    def test_latest_and_recent(self):
+        with ShmPublisher(ring_size=4) as publisher, ShmReader(publisher.name) as reader:
+            assert reader.latest() is None
+            assert not reader.recent()
+
+            for ev in range(10):
+                publisher.publish(published_sample(float(ev), head=ev % 3))
+            assert reader.published == 10
+            assert reader.latest() == published_sample(9.0, head=0)
+            assert [sample.values[0] for sample in reader.recent()] == [6.0, 7.0, 8.0, 9.0]
+            assert [sample.values[0] for sample in reader.recent(2)] == [8.0, 9.0]
+
+    def test_not_a_ring(self):
+        from multiprocessing import shared_memory  # pylint: disable=import-outside-toplevel
+
+        shm = shared_memory.SharedMemory(create=True, size=64)
+        try:
+            with pytest.raises(ValueError):
+                ShmReader(shm.name)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    def test_stage(self, log_file_path, no_sleep):
+        cl200a = CL200A(log_file_path=log_file_path, transport=VirtualCL200A(ev=250))
+        with ShmPublisher() as publisher, ShmReader(publisher.name) as reader:
+            samples = list(publisher(cl200a.stream("ev_x_y", count=3)))
+            assert reader.latest() == samples[-1]
+            assert reader.recent() == samples
+
+    def test_other_process(self):
+        with ShmPublisher() as publisher:
+            publisher.publish(published_sample(42.0))
+            code = (
+                "from cl200a_controller.shm_publisher import ShmReader\n"
+                f"with ShmReader({publisher.name!r}) as reader:\n"
+                "    print(reader.latest().values[0])\n"
+            )
+            output = subprocess.run(
+                [sys.executable, "-c", code], capture_output=True, text=True, check=True
+            ).stdout
+            assert output.strip() == "42.0"
+            # the reader process must not have removed the block
+            with ShmReader(publisher.name) as reader:
+                assert reader.latest().values[0] == 42.0
+
+    def test_publisher_died_while_writing(self):
+        with ShmPublisher(ring_size=2) as publisher, ShmReader(
+            publisher.name, timeout=0.05
+        ) as reader:
+            publisher.publish(published_sample(1.0))
+            # pylint: disable=protected-access
+            # an odd sequence number: the publisher started to write the slot
+            publisher._buffer[24] = 1
+            with pytest.raises(TimeoutError):
+                reader.latest()
+
+    def test_concurrent_reads_are_consistent(self):
+        with ShmPublisher(ring_size=2) as publisher, ShmReader(publisher.name) as reader:
+
+            def publish():
+                for ev in range(20000):
+                    publisher.publish(published_sample(float(ev))._replace(values=(ev, ev, ev)))
+
+            thread = threading.Thread(target=publish)
+            thread.start()
+            while thread.is_alive():
+                sample = reader.latest()
+                if sample is not None:
+                    assert sample.values[0] == sample.values[1] == sample.values[2]
+            thread.join()
+            assert reader.latest().values[0] == 19999
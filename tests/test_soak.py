@@ -0,0 +1,60 @@
+from cl200a_controller import CL200A
+from cl200a_controller.emulator import VirtualCL200A
+from cl200a_controller.soak import run_soak_test
+
+
+# pylint: disable=unused-argument
+class TestSoak:
+    def test_no_growth(self, log_file_path):
+        report = run_soak_test(
+            samples=2000, warmup=200, checkpoints=4, log_file_path=log_file_path
+        )
+        assert report.passed
+        assert report.samples == 2000
+        assert len(report.checkpoints) == 5
+        assert report.bytes_per_sample < 10
+        assert "PASSED" in report.format()
+
+    def test_leak_fails(self, log_file_path):
+        kept = []
+        report = run_soak_test(
+            samples=2000,
+            warmup=200,
+            checkpoints=4,
+            sink=lambda sample: kept.append(sample.values),
+            max_growth=10000,
+            log_file_path=log_file_path,
+        )
+        assert not report.passed
+        # stopped at the first checkpoint past the threshold
+        assert report.samples == 500
+        assert report.blocks_per_sample > 0.9
+        assert any("test_soak.py" in line for line in report.top_growth)
+        assert "FAILED" in report.format()
+
+    def test_custom_step(self, log_file_path):
+        report = run_soak_test(
+            samples=300,
+            warmup=30,
+            checkpoints=2,
+            step=lambda luxmeter: luxmeter.measure(("ev_x_y", "x_y_z")),
+            log_file_path=log_file_path,
+        )
+        assert report.samples == 300
+
+    def test_default_meter_closed(self, log_file_path, mocker):
+        close = mocker.spy(CL200A, "close")
+        run_soak_test(samples=100, warmup=10, checkpoints=1, log_file_path=log_file_path)
+        close.assert_called_once()
+        (luxmeter,) = close.call_args.args
+        assert not luxmeter.ser.is_open
+
+    def test_given_meter_stays_open(self, log_file_path):
+        luxmeter = CL200A(
+            log_file_path=log_file_path,
+            transport=VirtualCL200A(realtime=False),
+            settle_times=dict.fromkeys(("connect", "hold", "ext", "trigger"), 0.0),
+        )
+        run_soak_test(samples=100, warmup=10, checkpoints=1, luxmeter=luxmeter)
+        assert luxmeter.is_connected
+        luxmeter.close()
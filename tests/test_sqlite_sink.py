@@ -0,0 +1,108 @@
+import sqlite3
+import time
+from datetime import timedelta
+
+import pytest
+
+from cl200a_controller import CL200A
+from cl200a_controller.cl200a_utils import MeasurementStatus
+from cl200a_controller.emulator import VirtualCL200A
+from cl200a_controller.sqlite_sink import SqliteSink
+from tests.conftest import START, make_sample
+
+
+def two_head_samples(count):
+    """count samples 1 ms apart on two heads"""
+    return [
+        make_sample(
+            float(index),
+            index,
+            timedelta(milliseconds=1),
+            status=MeasurementStatus.LOW_BATTERY,
+            head=index % 2,
+        )
+        for index in range(count)
+    ]
+
+
+def rows(path, query="SELECT meter, head, format, time_ns, status, value1 FROM samples"):
+    with sqlite3.connect(str(path)) as connection:
+        return connection.execute(query).fetchall()
+
+
+# pylint: disable=unused-argument
+class TestSqliteSink:
+    def test_batches_by_count(self, tmp_path):
+        path = tmp_path / "readings.db"
+        with SqliteSink(path, meter="a", batch_size=100, flush_interval=60) as sink:
+            for sample in two_head_samples(1000):
+                sink.write(sample)
+            sink.flush()
+            assert sink.written == 1000
+            assert sink.transactions == 10
+
+        result = rows(path)
+        assert len(result) == 1000
+        assert result[1] == (
+            "a",
+            1,
+            "ev_x_y",
+            round(START.timestamp()) * 10**9 + 10**6,
+            int(MeasurementStatus.LOW_BATTERY),
+            1.0,
+        )
+        assert rows(path, "PRAGMA journal_mode") == [("wal",)]
+
+    def test_batches_by_time(self, tmp_path):
+        path = tmp_path / "readings.db"
+        with SqliteSink(path, batch_size=1000, flush_interval=0.05) as sink:
+            sink.write(two_head_samples(1)[0])
+            deadline = time.monotonic() + 5
+            while sink.written == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert sink.written == 1
+            sink.write(two_head_samples(1)[0], meter="b")
+        assert [row[0] for row in rows(path)] == ["default", "b"]
+
+    def test_close_commits_queued_samples(self, tmp_path):
+        path = tmp_path / "readings.db"
+        sink = SqliteSink(path, batch_size=7, flush_interval=60)
+        for sample in two_head_samples(50):
+            sink.write(sample)
+        sink.close()
+        assert len(rows(path)) == 50
+
+    def test_invalid_database(self, tmp_path):
+        with pytest.raises(sqlite3.Error):
+            SqliteSink(tmp_path / "missing" / "readings.db")
+
+    def test_failing_commit(self, tmp_path, mocker):
+        sink = SqliteSink(tmp_path / "readings.db", batch_size=2, flush_interval=60)
+        mocker.patch.object(sink, "_commit", side_effect=sqlite3.OperationalError("disk I/O"))
+        for sample in two_head_samples(5):
+            sink.write(sample)
+        with pytest.raises(sqlite3.OperationalError):
+            sink.flush()
+        with pytest.raises(sqlite3.OperationalError):
+            sink.write(two_head_samples(1)[0])
+        with pytest.raises(sqlite3.OperationalError):
+            sink.close()
+        assert sink.written == 0
+
+    def test_failing_row(self, tmp_path):
+        sink = SqliteSink(tmp_path / "readings.db", batch_size=1)
+        # does not fit into an SQLite INTEGER
+        sink.write(two_head_samples(1)[0]._replace(trigger_ns=2**64))
+        with pytest.raises(OverflowError):
+            sink.flush()
+        with pytest.raises(OverflowError):
+            sink.close()
+        assert sink.written == 0
+
+    def test_stage(self, tmp_path, log_file_path, no_sleep):
+        cl200a = CL200A(log_file_path=log_file_path, transport=VirtualCL200A(ev=42))
+        path = tmp_path / "readings.db"
+        with SqliteSink(path, meter="bench") as sink:
+            samples = list(sink(cl200a.stream("ev_x_y", count=3)))
+        assert len(samples) == 3
+        assert rows(path, "SELECT value1, trigger_ns > 0 FROM samples") == [(42.0, 1)] * 3
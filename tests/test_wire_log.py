@@ -0,0 +1,88 @@
+import pytest
+
+from cl200a_controller import CL200A
+from cl200a_controller.wire_log import (
+    RX,
+    TX,
+    ReplayMismatchError,
+    ReplaySerial,
+    WireRecorder,
+    read_wire_log,
+)
+
+CONNECT_REPLY = b"\x0200541   \x0313\r\n"
+EXT_REPLY = b"\x0200401   \x0313\r\n"
+EV_X_Y_REPLY = b"\x0200021 10+ 2733+45450+44990\x031F\r\n"
+
+
+@pytest.fixture()
+def fake_serial(mocker):
+    ser = mocker.Mock()
+    ser.port = "/dev/ttyUSB0"
+    ser.readline = mocker.Mock(side_effect=[CONNECT_REPLY, EXT_REPLY, EV_X_Y_REPLY])
+    return ser
+
+
+# pylint: disable=redefined-outer-name,unused-argument
+# to use the fixture, outer name must be used
+# pylint: disable=invalid-name
+# the names ev, x, y are used in the documentation
+class TestWireLog:
+    def test_record(self, fake_serial, tmp_path):
+        path = tmp_path / "session.cl2w"
+        recorder = WireRecorder(fake_serial, path)
+        recorder.write(b"cmd")
+        assert recorder.readline() == CONNECT_REPLY
+        assert recorder.port == "/dev/ttyUSB0"
+        recorder.timeout = 0.5
+        assert fake_serial.timeout == 0.5
+        recorder.close()
+
+        frames = list(read_wire_log(path))
+        assert [(frame.direction, frame.payload) for frame in frames] == [
+            (TX, b"cmd"),
+            (RX, CONNECT_REPLY),
+        ]
+        assert frames[0].offset_ns <= frames[1].offset_ns
+
+    def test_not_a_wire_log(self, tmp_path):
+        path = tmp_path / "other.bin"
+        path.write_bytes(b"something else")
+        with pytest.raises(ValueError):
+            list(read_wire_log(path))
+
+    def test_record_and_replay_cl200a(self, fake_serial, tmp_path, log_file_path, no_sleep):
+        path = tmp_path / "session.cl2w"
+        cl200a = CL200A(log_file_path=log_file_path, transport=fake_serial, record_path=path)
+        recorded = cl200a.get_ev_x_y()
+        cl200a.ser.close()
+
+        replayed = CL200A(log_file_path=log_file_path, transport=ReplaySerial(path, strict=True))
+        assert replayed.is_connected is True
+        assert replayed.get_ev_x_y()[:3] == recorded[:3]
+
+        with pytest.raises(EOFError):
+            replayed.get_ev_x_y()
+
+    def test_replay_strict_mismatch(self, fake_serial, tmp_path):
+        path = tmp_path / "session.cl2w"
+        recorder = WireRecorder(fake_serial, path)
+        recorder.write(b"cmd")
+        recorder.close()
+
+        replay = ReplaySerial(path, strict=True)
+        with pytest.raises(ReplayMismatchError):
+            replay.write(b"other")
+
+    def test_replay_loop(self, fake_serial, tmp_path):
+        path = tmp_path / "session.cl2w"
+        recorder = WireRecorder(fake_serial, path)
+        recorder.write(b"cmd")
+        recorder.readline()
+        recorder.close()
+
+        replay = ReplaySerial(path, loop=True)
+        for _ in range(3):
+            replay.write(b"cmd")
+            assert replay.readline() == CONNECT_REPLY
+            assert replay.readline() == b""